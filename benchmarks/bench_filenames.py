@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+'''
+Compare parse_package_filename with likely_distro on synthetic package
+filenames.
+
+Usage::
+
+    $ python benchmarks/bench_filenames.py [--count 10000] [--repeat 4]
+
+Each filename is parsed *--repeat* times, like collect_packages,
+group_and_select_packages and format_requirements do during a freeze.
+'''
+import argparse
+import os.path as op
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, op.dirname(op.dirname(op.abspath(__file__))))
+
+from freezerequirements.filenames import parse_package_filename  # NOQA
+from freezerequirements.utils import likely_distro  # NOQA
+
+
+def make_filenames(count):
+    extensions = ['.tar.gz', '.zip', '.tar.bz2', '-py3-none-any.whl']
+    filenames = []
+    for i in range(count):
+        name = ['pkg%s' % i, 'some-pkg-%s' % i, 'Some_Pkg.%s' % i][i % 3]
+        version = ['1.%s.0' % i, '%s.0rc1' % i, '2014-01-%s' % i][i % 3]
+        ext = extensions[i % len(extensions)]
+        if ext.endswith('.whl'):
+            name = name.replace('-', '_')
+            version = version.replace('-', '_')
+        filenames.append('%s-%s%s' % (name, version, ext))
+    return filenames
+
+
+def import_time(module):
+    '''
+    Time importing *module* in a fresh interpreter.
+    '''
+    def run(code):
+        start = time.time()
+        subprocess.check_call([sys.executable, '-c', code])
+        return time.time() - start
+    return run('import %s' % module) - run('pass')
+
+
+def timed(func, filenames, repeat):
+    start = time.time()
+    for _ in range(repeat):
+        results = [(func(f).key, func(f).version) for f in filenames]
+    return time.time() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--count', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=4)
+    args = parser.parse_args()
+
+    filenames = make_filenames(args.count)
+    setuptools_import_time = import_time('setuptools.package_index')
+    # likely_distro only handles wheels compatible with the interpreter
+    sdists = [f for f in filenames if not f.endswith('.whl')]
+    slow_time, slow_results = timed(likely_distro, sdists, args.repeat)
+    parse_package_filename.cache_clear()
+    fast_time, _ = timed(parse_package_filename, filenames, args.repeat)
+    parse_package_filename.cache_clear()
+    _, fast_results = timed(parse_package_filename, sdists, 1)
+
+    print('%s filenames, parsed %s times each' % (args.count, args.repeat))
+    print('  likely_distro:          %8.3fs for %s sdists (+%.3fs to import '
+          'setuptools.package_index)' % (slow_time, len(sdists),
+                                         setuptools_import_time))
+    print('  parse_package_filename: %8.3fs for %s sdists and wheels' %
+          (fast_time, len(filenames)))
+    print('  speedup:                %8.1fx' %
+          (slow_time / len(sdists) / (fast_time / len(filenames))))
+    if fast_results != slow_results:
+        print('Results differ from likely_distro')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,479 @@
+#!/usr/bin/env python
+'''
+Time the freeze pipeline and its main stages against a synthetic package
+index served from localhost, so results don't depend on the network.
+
+Usage::
+
+    $ python benchmarks/bench_freeze.py [--scales 10,100,1000] [--fanout 3]
+        [--ext-packages 3] [--build-count 10] [--output bench_freeze.json]
+        [--compare previous.json]
+
+For each scale, a PEP 503 index of tiny source packages is generated: package
+``i`` depends on the *--fanout* next ones, and *--ext-packages* of them
+contain a C extension. The requirements file lists one package out of ten,
+which pulls all the others.
+
+Like most real packages, half of the pure packages are built by setuptools,
+and have mixed case and dotted names (e.g. ``Bench.Pkg_0001``), which
+setuptools keeps in wheel names. The other packages use a minimal in-tree PEP
+517 backend named like flit's, which normalizes names; packages with an
+extension also have a setup.py, used by the slow path of
+:func:`get_wheel_name`. Build isolation is disabled, so pip can get the
+metadata of packages and build them without downloading any build
+dependency.
+
+The following stages are timed at each scale:
+
+- ``freeze``: the ``freeze`` command, in a new process;
+- ``collect_packages``: downloading all packages to an output directory;
+- ``group_and_select_packages`` and ``write_outputs`` on the collected
+  packages (best of *--repeat* runs);
+- ``get_wheel_name`` on all the source packages;
+- ``build_wheel`` on the packages with an extension, and on pure packages up
+  to *--build-count* packages in total; the names of the built wheels are
+  checked against the ones given by ``get_wheel_name``.
+
+Results are written in JSON to *--output*; pass the results of a previous run
+to *--compare* to print the ratio of each timing to the previous one.
+'''
+import argparse
+import contextlib
+import functools
+import hashlib
+import io
+import json
+import os
+import os.path as op
+import shutil
+import subprocess
+import sys
+import sysconfig
+import tarfile
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+ROOT_DIR = op.dirname(op.dirname(op.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from freezerequirements.cli import collect_packages  # NOQA
+from freezerequirements.output import (FrozenRequirements,  # NOQA
+                                       RequirementsTarget, write_outputs)
+from freezerequirements.requirements import ExclusionIndex  # NOQA
+from freezerequirements.utils import (group_and_select_packages,  # NOQA
+                                      get_wheel_name, build_wheel)
+
+
+STAGES = ('freeze', 'collect_packages', 'group_and_select_packages',
+          'write_outputs', 'get_wheel_name', 'build_wheel')
+
+# A PEP 517 backend building wheels from the PKG-INFO and module of the
+# synthetic packages, compiling ext.c when there is one
+BACKEND = r'''
+import base64
+import hashlib
+import os
+import subprocess
+import sys
+import sysconfig
+import tempfile
+import zipfile
+
+
+def _dist_info():
+    with open('PKG-INFO') as fp:
+        metadata = fp.read()
+    fields = dict(line.split(': ', 1) for line in metadata.splitlines()
+                  if ': ' in line)
+    name = fields['Name'].replace('-', '_')
+    version = fields['Version']
+    return metadata, name, version, '%s-%s.dist-info' % (name, version)
+
+
+def _tag():
+    if not os.path.exists('ext.c'):
+        return 'py3-none-any'
+    impl = 'cp%s%s' % sys.version_info[:2]
+    platform = sysconfig.get_platform().replace('-', '_').replace('.', '_')
+    return '%s-%s-%s' % (impl, impl, platform)
+
+
+def _metadata_files(metadata):
+    return {
+        'METADATA': metadata.encode('utf-8'),
+        'WHEEL': ('Wheel-Version: 1.0\nGenerator: bench\n'
+                  'Root-Is-Purelib: %s\nTag: %s\n' %
+                  (str(_tag() == 'py3-none-any').lower(),
+                   _tag())).encode('utf-8'),
+    }
+
+
+def get_requires_for_build_wheel(config_settings=None):
+    return []
+
+
+def get_requires_for_build_sdist(config_settings=None):
+    return []
+
+
+def prepare_metadata_for_build_wheel(metadata_directory,
+                                     config_settings=None):
+    metadata, _, _, dist_info = _dist_info()
+    path = os.path.join(metadata_directory, dist_info)
+    os.makedirs(path)
+    for filename, contents in _metadata_files(metadata).items():
+        with open(os.path.join(path, filename), 'wb') as fp:
+            fp.write(contents)
+    return dist_info
+
+
+def build_wheel(wheel_directory, config_settings=None,
+                metadata_directory=None):
+    metadata, name, version, dist_info = _dist_info()
+    files = {}
+    with open(name + '.py', 'rb') as fp:
+        files[name + '.py'] = fp.read()
+    if os.path.exists('ext.c'):
+        ext_path = os.path.join(
+            tempfile.mkdtemp(),
+            name + '_ext' + sysconfig.get_config_var('EXT_SUFFIX'))
+        compiler = (sysconfig.get_config_var('CC') or 'cc').split()
+        subprocess.check_call(compiler + [
+            '-shared', '-fPIC', '-I', sysconfig.get_paths()['include'],
+            'ext.c', '-o', ext_path])
+        with open(ext_path, 'rb') as fp:
+            files[os.path.basename(ext_path)] = fp.read()
+    for filename, contents in _metadata_files(metadata).items():
+        files['%s/%s' % (dist_info, filename)] = contents
+    record = []
+    for path, contents in sorted(files.items()):
+        digest = base64.urlsafe_b64encode(
+            hashlib.sha256(contents).digest()).rstrip(b'=').decode('ascii')
+        record.append('%s,sha256=%s,%s' % (path, digest, len(contents)))
+    record.append('%s/RECORD,,' % dist_info)
+    files['%s/RECORD' % dist_info] = ('\n'.join(record) + '\n').encode()
+    wheel = '%s-%s-%s.whl' % (name, version, _tag())
+    with zipfile.ZipFile(os.path.join(wheel_directory, wheel), 'w') as zf:
+        for path, contents in sorted(files.items()):
+            zf.writestr(path, contents)
+    return wheel
+'''
+
+PYPROJECT = '''[build-system]
+requires = []
+build-backend = "flit_core.buildapi"
+backend-path = ["."]
+'''
+
+EXT_SOURCE = '''#include <Python.h>
+
+static struct PyModuleDef module = {
+    PyModuleDef_HEAD_INIT, "%(module)s", NULL, -1, NULL
+};
+
+PyMODINIT_FUNC PyInit_%(module)s(void)
+{
+    return PyModule_Create(&module);
+}
+'''
+
+EXT_SETUP_PY = '''from setuptools import setup, Extension
+setup(name=%(name)r, version=%(version)r, py_modules=[%(module)r],
+      ext_modules=[Extension(%(ext_module)r, ['ext.c'])])
+'''
+
+SETUPTOOLS_SETUP_PY = '''from setuptools import setup
+setup(name=%(name)r, version=%(version)r, py_modules=[%(module)r],
+      install_requires=%(dependencies)r)
+'''
+
+
+def package_name(index):
+    return 'bench-pkg-%04d' % index
+
+
+def make_sdist(directory, index, dependencies, has_ext):
+    module = package_name(index).replace('-', '_')
+    version = '1.0'
+    dependencies = [package_name(d) for d in dependencies]
+    uses_setuptools = index % 2 and not has_ext
+    if uses_setuptools:
+        name = 'Bench.Pkg_%04d' % index
+    else:
+        name = package_name(index)
+    metadata = ['Metadata-Version: 2.1', 'Name: %s' % name,
+                'Version: %s' % version]
+    metadata.extend('Requires-Dist: %s' % d for d in dependencies)
+    files = {
+        'PKG-INFO': '\n'.join(metadata) + '\n',
+        module + '.py': 'VALUE = %s\n' % index,
+    }
+    if uses_setuptools:
+        files['setup.py'] = SETUPTOOLS_SETUP_PY % {
+            'name': name, 'version': version, 'module': module,
+            'dependencies': dependencies}
+    else:
+        files['pyproject.toml'] = PYPROJECT
+        files['flit_core/__init__.py'] = ''
+        files['flit_core/buildapi.py'] = BACKEND
+    if has_ext:
+        # Makes get_pure_wheel_name give up on the package
+        files['pyproject.toml'] += '\n# ext-modules: %s_ext\n' % module
+        files['ext.c'] = EXT_SOURCE % {'module': module + '_ext'}
+        files['setup.py'] = EXT_SETUP_PY % {
+            'name': name, 'version': version, 'module': module,
+            'ext_module': module + '_ext'}
+    if uses_setuptools:
+        root = '%s-%s' % (name, version)
+    else:
+        root = '%s-%s' % (module, version)
+    path = op.join(directory, root + '.tar.gz')
+    with tarfile.open(path, 'w:gz') as tar:
+        for filename, contents in sorted(files.items()):
+            data = contents.encode('utf-8')
+            info = tarfile.TarInfo('%s/%s' % (root, filename))
+            info.size = len(data)
+            info.mtime = 1500000000
+            tar.addfile(info, io.BytesIO(data))
+    return path
+
+
+def make_index(directory, count, fanout, ext_packages):
+    '''
+    Generate a PEP 503 index of *count* packages in *directory*, and return
+    the list of their source packages paths, and the list of those having an
+    extension.
+    '''
+    packages_dir = op.join(directory, 'packages')
+    simple_dir = op.join(directory, 'simple')
+    os.makedirs(packages_dir)
+    os.makedirs(simple_dir)
+    ext_step = max(count // max(ext_packages, 1), 1)
+    ext_indices = set(range(0, count, ext_step)[:ext_packages])
+    sdists = []
+    ext_sdists = []
+    links = []
+    for i in range(count):
+        dependencies = [d for d in range(i + 1, i + fanout + 1) if d < count]
+        sdist = make_sdist(packages_dir, i, dependencies, i in ext_indices)
+        sdists.append(sdist)
+        if i in ext_indices:
+            ext_sdists.append(sdist)
+        with open(sdist, 'rb') as fp:
+            digest = hashlib.sha256(fp.read()).hexdigest()
+        project_dir = op.join(simple_dir, package_name(i))
+        os.makedirs(project_dir)
+        with open(op.join(project_dir, 'index.html'), 'w') as fp:
+            fp.write('<!DOCTYPE html>\n<html><body>\n'
+                     '<a href="../../packages/%s#sha256=%s">%s</a>\n'
+                     '</body></html>\n' % (op.basename(sdist), digest,
+                                           op.basename(sdist)))
+        links.append('<a href="%s/">%s</a>' % (package_name(i),
+                                               package_name(i)))
+    with open(op.join(simple_dir, 'index.html'), 'w') as fp:
+        fp.write('<!DOCTYPE html>\n<html><body>\n%s\n</body></html>\n' %
+                 '\n'.join(links))
+    return sdists, ext_sdists
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+@contextlib.contextmanager
+def serve_directory(directory):
+    '''
+    Serve *directory* over HTTP on localhost, yielding the server URL.
+    '''
+    server = ThreadingHTTPServer(
+        ('127.0.0.1', 0), functools.partial(QuietHandler,
+                                             directory=directory))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        yield 'http://127.0.0.1:%s' % server.server_address[1]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@contextlib.contextmanager
+def pip_environment(index_url, cache_dir):
+    '''
+    Point pip and freeze-requirements to *index_url*, with fresh caches in
+    *cache_dir*.
+    '''
+    variables = {
+        'PIP_INDEX_URL': index_url,
+        'PIP_CACHE_DIR': op.join(cache_dir, 'pip'),
+        'PIP_DISABLE_PIP_VERSION_CHECK': '1',
+        'PIP_NO_INPUT': '1',
+        # The index has no build dependencies; pip's double negative
+        # disables build isolation
+        'PIP_NO_BUILD_ISOLATION': '0',
+        'XDG_CACHE_HOME': cache_dir,
+        'PYTHONPATH': os.pathsep.join(
+            p for p in [ROOT_DIR, os.environ.get('PYTHONPATH')] if p),
+    }
+    previous = dict((k, os.environ.get(k)) for k in variables)
+    os.environ.update(variables)
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def timed(func, *args, **kwargs):
+    start = time.time()
+    result = func(*args, **kwargs)
+    return time.time() - start, result
+
+
+def best_of(repeat, func, *args):
+    return min(timed(func, *args)[0] for _ in range(repeat))
+
+
+def write_requirements(requirements_packages):
+    frozen_requirements = FrozenRequirements(
+        requirements_packages,
+        group_and_select_packages(requirements_packages),
+        ExclusionIndex(), {})
+    write_outputs(frozen_requirements, [RequirementsTarget(io.StringIO())])
+
+
+def run_scale(work_dir, count, args):
+    '''
+    Run all the benchmarks on an index of *count* packages in *work_dir*,
+    and return a dict mapping stages to their duration.
+    '''
+    index_dir = op.join(work_dir, 'index')
+    sdists, ext_sdists = make_index(index_dir, count, args.fanout,
+                                    args.ext_packages)
+    requirements = op.join(work_dir, 'requirements.txt')
+    with open(requirements, 'w') as fp:
+        for i in range(0, count, 10):
+            fp.write('%s\n' % package_name(i))
+    devnull = open(os.devnull, 'w')
+    results = {}
+    with serve_directory(index_dir) as url:
+        index_url = url + '/simple/'
+
+        output_dir = op.join(work_dir, 'freeze-output')
+        os.makedirs(output_dir)
+        with pip_environment(index_url, op.join(work_dir, 'freeze-cache')):
+            results['freeze'], _ = timed(
+                subprocess.check_call,
+                [sys.executable, '-c',
+                 'from freezerequirements.cli import main; main()',
+                 'freeze', '--pip', args.pip, '--jobs', str(args.jobs),
+                 '--output-dir', output_dir, '--merged-requirements',
+                 op.join(work_dir, 'requirements-frozen.txt'),
+                 requirements],
+                stderr=devnull)
+
+        output_dir = op.join(work_dir, 'collect-output')
+        os.makedirs(output_dir)
+        with pip_environment(index_url, op.join(work_dir, 'collect-cache')), \
+                contextlib.redirect_stderr(devnull):
+            results['collect_packages'], collected = timed(
+                collect_packages, [requirements], output_dir, None, False,
+                False, args.pip, False, args.jobs)
+        requirements_packages = collected[0]
+
+        results['group_and_select_packages'] = best_of(
+            args.repeat, group_and_select_packages, requirements_packages)
+        results['write_outputs'] = best_of(
+            args.repeat, write_requirements, requirements_packages)
+
+        with contextlib.redirect_stderr(devnull):
+            results['get_wheel_name'], _ = timed(
+                lambda: [get_wheel_name(sdist) for sdist in sdists])
+
+        pure_sdists = [s for s in sdists if s not in ext_sdists]
+        to_build = ext_sdists + pure_sdists[:max(args.build_count -
+                                                 len(ext_sdists), 0)]
+        build_dir = op.join(work_dir, 'build')
+        os.makedirs(build_dir)
+        with pip_environment(index_url, op.join(work_dir, 'build-cache')):
+            results['build_wheel'], wheels = timed(lambda: [
+                build_wheel(args.pip, sdist,
+                            op.join(build_dir, op.basename(sdist) + '.log'),
+                            tempfile.mkdtemp(dir=build_dir),
+                            tempfile.mkdtemp(dir=build_dir))
+                for sdist in to_build])
+        results['build_wheel_count'] = len(to_build)
+    devnull.close()
+    with contextlib.redirect_stderr(io.StringIO()):
+        results['wheel_name_mismatches'] = [
+            (get_wheel_name(sdist), op.basename(wheel))
+            for sdist, wheel in zip(to_build, wheels)
+            if get_wheel_name(sdist) != op.basename(wheel)]
+    return results
+
+
+def format_ratio(value, previous):
+    if not previous:
+        return ''
+    return ' (x%.2f)' % (value / previous)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--scales', default='10,100,1000')
+    parser.add_argument('--fanout', type=int, default=3)
+    parser.add_argument('--ext-packages', type=int, default=3)
+    parser.add_argument('--build-count', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--jobs', type=int, default=1)
+    parser.add_argument('--pip', default=shutil.which('pip') or 'pip')
+    parser.add_argument('--output', default='bench_freeze.json')
+    parser.add_argument('--compare', type=argparse.FileType('r'))
+    args = parser.parse_args()
+
+    previous = json.load(args.compare)['scales'] if args.compare else {}
+    report = {
+        'python': sys.version.split()[0],
+        'platform': sysconfig.get_platform(),
+        'pip': subprocess.check_output(
+            [args.pip, '--version'], universal_newlines=True).split()[1],
+        'fanout': args.fanout,
+        'ext_packages': args.ext_packages,
+        'jobs': args.jobs,
+        'scales': {},
+    }
+    for count in [int(s) for s in args.scales.split(',')]:
+        work_dir = tempfile.mkdtemp(prefix='bench-freeze-')
+        try:
+            results = run_scale(work_dir, count, args)
+        finally:
+            shutil.rmtree(work_dir, True)
+        report['scales'][str(count)] = results
+        previous_results = previous.get(str(count), {})
+        print('%s packages:' % count)
+        for stage in STAGES:
+            print('  %-26s %12.3fms%s' % (
+                stage, results[stage] * 1000,
+                format_ratio(results[stage], previous_results.get(stage))))
+        for expected, built in results['wheel_name_mismatches']:
+            print('  get_wheel_name gave %s, built %s' % (expected, built))
+        sys.stdout.flush()
+
+    with open(args.output, 'w') as fp:
+        json.dump(report, fp, indent=2, sort_keys=True)
+        fp.write('\n')
+    print('Wrote results in %s' % args.output)
+    if any(r['wheel_name_mismatches'] for r in report['scales'].values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+'''
+Measure how group_and_select_packages scales with the number of requirements
+files, compared to the previous LooseVersion/bisect implementation.
+
+Usage::
+
+    $ python benchmarks/bench_grouping.py [--files 100,300,1000,3000]
+        [--packages 100] [--legacy-max-files 1000]
+
+Each synthetic requirements file pins every package, picking its version among
+``files / 10`` distinct versions, like a merged monorepo freeze does.
+'''
+import argparse
+import bisect
+import os.path as op
+import random
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, op.dirname(op.dirname(op.abspath(__file__))))
+
+from freezerequirements.filenames import parse_package_filename  # NOQA
+from freezerequirements.utils import (group_and_select_packages,  # NOQA
+                                      version_sort_key)
+
+try:
+    from distutils.version import LooseVersion
+except ImportError:
+    LooseVersion = None
+
+
+def legacy_group_and_select_packages(packages_groups):
+    '''
+    group_and_select_packages before the PEP 440 rewrite.
+    '''
+    grouped_packages = defaultdict(
+        lambda: {'versions': [], 'reqs_files': defaultdict(list)}
+    )
+    for reqs_file, packages in packages_groups:
+        for package in packages:
+            distro = parse_package_filename(package)
+            entry = grouped_packages[distro.key]
+            version = LooseVersion(distro.version)
+            if version not in entry['versions']:
+                bisect.insort(entry['versions'], version)
+            entry['reqs_files'][str(version)].append(reqs_file)
+    ret = defaultdict(list)
+    for distro, entry in grouped_packages.items():
+        for version in entry['versions']:
+            version = str(version)
+            ret[distro].append((version, entry['reqs_files'][version]))
+    return dict(ret)
+
+
+def make_packages_groups(files_count, packages_count):
+    rng = random.Random(files_count)
+    versions_count = max(files_count // 10, 1)
+    return [
+        ('requirements%s.txt' % i, [
+            'package%s-%s.%s.tar.gz' %
+            (p, p % 3, rng.randrange(versions_count))
+            for p in range(packages_count)
+        ])
+        for i in range(files_count)
+    ]
+
+
+def timed(func, packages_groups):
+    # Parsing is memoized, only measure grouping
+    for _, packages in packages_groups:
+        for package in packages:
+            parse_package_filename(package)
+    version_sort_key.cache_clear()
+    start = time.time()
+    func(packages_groups)
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--files', default='100,300,1000,3000')
+    parser.add_argument('--packages', type=int, default=100)
+    parser.add_argument('--legacy-max-files', type=int, default=1000)
+    args = parser.parse_args()
+
+    print('%8s %10s %12s %12s' % ('files', 'filenames', 'new', 'legacy'))
+    for files_count in [int(f) for f in args.files.split(',')]:
+        packages_groups = make_packages_groups(files_count, args.packages)
+        occurrences = files_count * args.packages
+        new_time = timed(group_and_select_packages, packages_groups)
+        if LooseVersion is not None and files_count <= args.legacy_max_files:
+            legacy_time = '%11.3fs' % timed(legacy_group_and_select_packages,
+                                            packages_groups)
+        else:
+            legacy_time = '%12s' % 'skipped'
+        print('%8s %10s %11.3fs %s  (%.2fus per filename)' %
+              (files_count, occurrences, new_time, legacy_time,
+               new_time / occurrences * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+'''
+Measure the import time of the command line interface with python -X
+importtime, and list the slowest modules it imports.
+
+Usage::
+
+    $ python benchmarks/bench_startup.py [--runs 10] [--top 15]
+
+Each run imports freezerequirements.cli in a new interpreter; modules are
+reported with their median cumulative import time over all runs. This is not
+a test: import times depend too much on the machine to fail on them.
+'''
+import argparse
+import collections
+import os.path as op
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = op.dirname(op.dirname(op.abspath(__file__)))
+MODULE = 'freezerequirements.cli'
+# Lines of python -X importtime: self and cumulative times in microseconds,
+# and the module name indented by its nesting level
+_importtime_regex = re.compile(
+    r'^import time:\s+\d+ \|\s+(\d+) \|\s+(\S+)\s*$', re.MULTILINE)
+
+
+def import_times(module):
+    '''
+    Import *module* in a new interpreter, and return a dict mapping each
+    imported module to its cumulative import time in microseconds.
+    '''
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import %s' % module],
+        stderr=subprocess.PIPE, universal_newlines=True, check=True,
+        cwd=ROOT)
+    return dict((name, int(cumulative)) for cumulative, name
+                in _importtime_regex.findall(process.stderr))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    runs = collections.defaultdict(list)
+    for _ in range(args.runs):
+        for name, cumulative in import_times(MODULE).items():
+            runs[name].append(cumulative)
+    medians = dict((name, statistics.median(times))
+                   for name, times in runs.items())
+
+    print('%s: %.1fms (median of %s runs, %s modules imported)' %
+          (MODULE, medians[MODULE] / 1000.0, args.runs, len(medians)))
+    print('Slowest modules (cumulative):')
+    slowest = sorted(medians.items(), key=lambda item: -item[1])
+    for name, cumulative in slowest[:args.top]:
+        print('  %8.1fms  %s' % (cumulative / 1000.0, name))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+'''
+Compare the in-process wheel name computation with the setup.py subprocess
+one, on a directory of synthetic pure python source packages.
+
+Usage::
+
+    $ python benchmarks/bench_wheel_name.py [--count 500] [--slow-count 20]
+
+The slow path takes a few hundred milliseconds per package, so it is only run
+on the first *--slow-count* packages and extrapolated to *--count*.
+'''
+import argparse
+import io
+import os.path as op
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+
+sys.path.insert(0, op.dirname(op.dirname(op.abspath(__file__))))
+
+from freezerequirements.utils import (get_pure_wheel_name,  # NOQA
+                                      get_setup_wheel_name)
+
+
+def make_sdist(directory, index):
+    # setuptools keeps the case and dots of project names in wheel names
+    name = ('Bench.Package-%s' if index % 2 else 'bench-package-%s') % index
+    version = '1.%s.0' % index
+    root = '%s-%s' % (name, version)
+    files = {
+        'PKG-INFO': 'Metadata-Version: 1.1\nName: %s\nVersion: %s\n' %
+                    (name, version),
+        'setup.py': 'from setuptools import setup\n'
+                    'setup(name=%r, version=%r, py_modules=["mod%s"])\n' %
+                    (name, version, index),
+        'setup.cfg': '[egg_info]\ntag_build =\n',
+        'mod%s.py' % index: 'VALUE = %s\n' % index,
+        'README.rst': 'Benchmark package\n' * 200,
+    }
+    path = op.join(directory, '%s.tar.gz' % root)
+    with tarfile.open(path, 'w:gz') as archive:
+        for filename, contents in sorted(files.items()):
+            info = tarfile.TarInfo('%s/%s' % (root, filename))
+            contents = contents.encode('utf-8')
+            info.size = len(contents)
+            archive.addfile(info, io.BytesIO(contents))
+    return path
+
+
+def timed(func, packages):
+    start = time.time()
+    names = [func(p) for p in packages]
+    return time.time() - start, names
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--count', type=int, default=500)
+    parser.add_argument('--slow-count', type=int, default=20)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='bench-wheel-name-')
+    try:
+        packages = [make_sdist(directory, i) for i in range(args.count)]
+        fast_time, fast_names = timed(get_pure_wheel_name, packages)
+        slow_packages = packages[:args.slow_count]
+        slow_time, slow_names = timed(get_setup_wheel_name, slow_packages)
+    finally:
+        shutil.rmtree(directory)
+
+    assert None not in fast_names
+    mismatches = [(f, s) for f, s in zip(fast_names, slow_names) if f != s]
+    slow_estimate = slow_time / max(len(slow_packages), 1) * args.count
+    print('%s source packages' % args.count)
+    print('  in-process: %8.3fs (%.2fms per package)' %
+          (fast_time, fast_time / args.count * 1000))
+    print('  setup.py:   %8.3fs (estimated from %s packages, %.2fms per '
+          'package)' % (slow_estimate, len(slow_packages),
+                        slow_estimate / args.count * 1000))
+    print('  speedup:    %8.1fx' % (slow_estimate / fast_time))
+    if mismatches:
+        print('Mismatching names: %s' % mismatches)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
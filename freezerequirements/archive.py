@@ -1,31 +1,187 @@
+import os.path as op
+import posixpath
 import tarfile
 import zipfile
 
 
+# Supported archive extensions, with their type and tarfile open mode
+ARCHIVE_FORMATS = [
+    ('.tar.gz', 'tar', 'r:gz'),
+    ('.tgz', 'tar', 'r:gz'),
+    ('.tar.bz2', 'tar', 'r:bz2'),
+    ('.tbz2', 'tar', 'r:bz2'),
+    ('.tar.xz', 'tar', 'r:xz'),
+    ('.txz', 'tar', 'r:xz'),
+    ('.tar', 'tar', 'r:'),
+    ('.zip', 'zip', None),
+    ('.whl', 'zip', None),
+]
+
+
+def is_archive(filename):
+    '''
+    Test if *filename* has an extension supported by :class:`Archive`.
+    '''
+    return filename.lower().endswith(tuple(e for e, _, _ in ARCHIVE_FORMATS))
+
+
 class Archive(object):
     '''
     An wrapper offering a common interface around :mod:`tarfile` and
     :mod:`zipfile`.
+
+    The underlying file is opened once, on first access, and stays open until
+    :meth:`close` is called; archives can be used as context managers::
+
+        with Archive('foo-1.0.tar.gz') as archive:
+            pkg_info = archive.read(archive.root_member('PKG-INFO'))
     '''
 
     def __init__(self, filename):
-        valid_exts = [
-            ('.tar.gz', tarfile.open, 'getnames'),
-            ('.zip', zipfile.ZipFile, 'namelist'),
-            ('.tar.bz2', tarfile.open, 'getnames'),
-        ]
-        for ext, self.opener, self.get_names_func_name in valid_exts:
-            if filename.endswith(ext):
+        for ext, self.type, self.mode in ARCHIVE_FORMATS:
+            if filename.lower().endswith(ext):
                 break
         else:
             raise ValueError('%s: unknown archive format' % filename)
         self.filename = filename
+        self._archive = None
+        self._names = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def archive(self):
+        '''
+        The underlying :class:`tarfile.TarFile` or :class:`zipfile.ZipFile`.
+        '''
+        if self._archive is None:
+            if self.type == 'tar':
+                self._archive = tarfile.open(self.filename, self.mode)
+            else:
+                self._archive = zipfile.ZipFile(self.filename)
+        return self._archive
+
+    def close(self):
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
 
     def get_names(self):
-        with self.opener(self.filename) as archive:
-            members_func = getattr(archive, self.get_names_func_name)
-            return members_func()
+        if self._names is None:
+            if self.type == 'tar':
+                self._names = self.archive.getnames()
+            else:
+                self._names = self.archive.namelist()
+        return self._names
+
+    @property
+    def root(self):
+        '''
+        The top level directory shared by all members, or an empty string if
+        there is none.
+        '''
+        names = [n.rstrip('/') for n in self.get_names()]
+        roots = set(n.split('/', 1)[0] for n in names)
+        if len(roots) == 1 and any('/' in n for n in names):
+            return roots.pop()
+        return ''
+
+    def root_member(self, name):
+        '''
+        Get the name of the member at *name*, relative to :attr:`root`.
+        '''
+        root = self.root
+        return '%s/%s' % (root, name) if root else name
+
+    def open_member(self, name):
+        '''
+        Return a file-like object streaming the contents of the *name*
+        member; raise :class:`KeyError` if there is no such file.
+        '''
+        if self.type == 'tar':
+            fp = self.archive.extractfile(name)
+            if fp is None:
+                raise KeyError(name)
+            return fp
+        return self.archive.open(name)
+
+    def read(self, name):
+        '''
+        Return the contents of the *name* member, as bytes.
+        '''
+        fp = self.open_member(name)
+        try:
+            return fp.read()
+        finally:
+            fp.close()
+
+    def scan(self, wanted):
+        '''
+        List the archive members and read the regular files for which the
+        *wanted* predicate returns true, in a single pass over the archive.
+
+        Return a ``(names, contents)`` tuple, *contents* being a dict mapping
+        wanted member names to their contents.
+        '''
+        contents = {}
+        if self.type == 'zip':
+            for info in self.archive.infolist():
+                if not info.filename.endswith('/') and wanted(info.filename):
+                    contents[info.filename] = self.archive.read(info)
+            return self.get_names(), contents
+        # Reading a member while iterating only seeks forward, so compressed
+        # archives are decompressed once
+        names = []
+        for member in self.archive:
+            names.append(member.name)
+            if member.isfile() and wanted(member.name):
+                contents[member.name] = self.archive.extractfile(
+                    member).read()
+        self._names = names
+        return names, contents
+
+    def extract(self, path, members=None):
+        '''
+        Extract *members* (all members by default) to *path*.
+
+        Members with absolute paths or pointing outside of *path* are
+        skipped.
+        '''
+        names = self.get_names() if members is None else members
+        safe_names = [n for n in names if _is_safe_member(n)]
+        if self.type == 'tar':
+            safe_members = [m for m in map(self.archive.getmember, safe_names)
+                            if _is_safe_link(m)]
+            self.archive.extractall(path, safe_members)
+        else:
+            self.archive.extractall(path, safe_names)
 
     def extract_all(self, path):
-        with self.opener(self.filename) as archive:
-            archive.extractall(path)
+        self.extract(path)
+
+    def extract_root(self, path):
+        '''
+        Extract all members to *path*, and return the directory where the
+        :attr:`root` directory has been extracted.
+        '''
+        self.extract(path)
+        return op.join(path, self.root)
+
+
+def _is_safe_link(member):
+    if member.issym():
+        return _is_safe_member(posixpath.join(posixpath.dirname(member.name),
+                                              member.linkname))
+    if member.islnk():
+        return _is_safe_member(member.linkname)
+    return True
+
+
+def _is_safe_member(name):
+    normalized = posixpath.normpath(name)
+    return not (normalized.startswith(('/', '../')) or normalized == '..' or
+                op.isabs(name))
@@ -1,24 +1,97 @@
-from __future__ import print_function
-
 import os
+import re
 import sys
+import json
+import time
+import sqlite3
 import os.path as op
 import tempfile
-import json
+import threading
 import collections
 
-import sh
 import click
-try: # for pip >= 10
-    from pip._internal.req import InstallRequirement
-except ImportError: # for pip <= 9.0.3
-    from pip.req import InstallRequirement
 
-from .utils import (likely_distro, cache_dir, cache_path,
+# Modules using sh, pip or packaging are imported by the functions using them,
+# to keep the startup of the commands that don't need them fast
+from .utils import (cache_dir, merge_packages, has_versions_conflicts,
                     group_and_select_packages, StringWithAttrs,
-                    create_work_dir, get_wheel_name, colored, build_wheel,
-                    canonicalize_distro_name)
-from .exceptions import VersionsConflicts
+                    create_work_dir, clean_work_dirs, get_wheel_name,
+                    wheel_name_variants, colored, build_wheels_pool,
+                    parallel_map, available_cpus, parse_size, parse_duration,
+                    format_size, interpreter_tag, link_or_copy,
+                    place_files, canonicalize_distro_name, file_sha256,
+                    target_pip_args, target_filename)
+from .wheel_cache import WheelCache
+from .wheel_manifest import WheelManifest
+from .simple_index import SimpleIndex
+from .filenames import parse_package_filename
+from .dependencies_cache import DependenciesCache
+from .hash_cache import HashCache
+from .tracing import tracer, format_timings, REQUIREMENTS
+from .exceptions import VersionsConflicts, PipError
+
+
+# Lines logged by pip download for each package of the result
+_pip_saved_regex = re.compile(
+    r'^\s*(?:Saved|File was already downloaded) (.+?)\s*$', re.MULTILINE)
+# Terminal escape sequences of pip progress indicators
+_ansi_escape_regex = re.compile(r'\x1b\[[0-9;?]*[A-Za-z]')
+# Serializes additions to artifacts pools, which may be shared by concurrent
+# freezes
+_artifacts_pool_lock = threading.Lock()
+_outputs_lock = threading.Lock()
+
+
+class SizeType(click.ParamType):
+    '''
+    A size in bytes, with an optional K, M, G or T suffix.
+    '''
+
+    name = 'size'
+
+    def convert(self, value, param, ctx):
+        if isinstance(value, int):
+            return value
+        try:
+            return parse_size(value)
+        except ValueError:
+            self.fail('%s is not a valid size' % value, param, ctx)
+
+
+class DurationType(click.ParamType):
+    '''
+    A duration in seconds, with an optional s, m, h, d or w suffix.
+    '''
+
+    name = 'duration'
+
+    def convert(self, value, param, ctx):
+        if isinstance(value, (int, float)):
+            return value
+        try:
+            return parse_duration(value)
+        except ValueError:
+            self.fail('%s is not a valid duration' % value, param, ctx)
+
+
+class TargetType(click.ParamType):
+    '''
+    A target Python version and platform, written ``pyX.Y-PLATFORM``.
+    '''
+
+    name = 'target'
+
+    def convert(self, value, param, ctx):
+        try:
+            target_pip_args(value)
+        except ValueError:
+            self.fail('%s is not a valid target, expected pyX.Y-PLATFORM' %
+                      value, param, ctx)
+        return value
+
+
+def open_dependencies_cache():
+    return DependenciesCache(op.join(cache_dir(), 'dependencies.sqlite3'))
 
 
 @click.group()
@@ -26,364 +99,1566 @@ def main():
     '''
     A tool to freeze pip requirements files.
     '''
-    # Disable sh truncation of errors
-    sh.ErrorReturnCode.truncate_cap = None
+
+
+# Options shared by the freeze and watch commands
+FREEZE_OPTIONS = [
+    click.option('-o', '--output-dir', help='Put downloaded python packages '
+                 'and wheels here', metavar='DIR'),
+    click.option('-m', '--merged-requirements', type=click.File(mode='w'),
+                 help='Merge all requirements in FILE', metavar='FILE'),
+    click.option('--separate-requirements/--no-separate-requirements',
+                 default=False, help='Create separate frozen requirements '
+                 'next to each input requirements file'),
+    click.option('--separate-requirements-suffix', default='-frozen',
+                 help='suffix to insert before file extensions to create '
+                 'separate frozen requirements filenames'),
+    click.option('--pip', default='pip', help='Path to the pip executable',
+                 type=click.Path(dir_okay=False)),
+    click.option('--build-wheels/--no-build-wheels', default=False,
+                 help='Build wheel packages from the requirements'),
+    click.option('--rebuild-wheels/--no-rebuild-wheels', default=True,
+                 help='Check for wheels in the output directory before '
+                 'rebuilding them'),
+    click.option('-x', '--exclude', 'excluded_packages', multiple=True,
+                 help='Exclude a package from the frozen requirements; you '
+                 'may specify --exclude multiple times; PACKAGE may also take '
+                 'the form [req_path]:[package_name], to exclude a package '
+                 'from a specific separate requirement', metavar='PACKAGE'),
+    click.option('--exclude-requirements', type=click.File(mode='r'),
+                 multiple=True, help='Exclude packages contained in '
+                 'requirements FILE; you may specify --exclude-requirements '
+                 'multiple times', metavar='FILE'),
+    click.option('--use-ext-wheel', 'ext_wheels', multiple=True,
+                 help='Do not try to build wheel for PACKAGE, but still '
+                 'include it in the frozen output; use --use-ext-wheel '
+                 'multiple times to specify multiple packages',
+                 metavar='PACKAGE'),
+    click.option('--output-index-url', help='Add an --index-url in the '
+                 'generated requirements file', metavar='URL'),
+    click.option('--output-find-links', multiple=True, metavar='URL',
+                 help='Add a --find-links in the generated requirements file'),
+    click.option('--loose', 'loose_packages', multiple=True, metavar='PACKAGE',
+                 help='Do not specify version for PACKAGE in the output '
+                 'requirements file(s)'),
+    click.option('--loose-requirements/--no-loose-requirements', default=False,
+                 help='Generate loose requirements files'),
+    click.option('--loose-requirements-suffix', default='-loose',
+                 metavar='SUFFIX', help='Loose requirements filenames are '
+                 'generated with this suffix'),
+    click.option('--lockfile', type=click.File(mode='w'), metavar='FILE',
+                 help='Write the frozen packages of each requirements file, '
+                 'with their versions and origins, in JSON FILE'),
+    click.option('--max-conflict-resolution-iterations', default=10),
+    click.option('-j', '--jobs', default=1, type=click.IntRange(min=1),
+                 help='Download up to N requirements files in parallel',
+                 metavar='N'),
+    click.option('--build-jobs', type=click.IntRange(min=1),
+                 help='Build up to N wheels in parallel; defaults to the '
+                 'number of available CPUs', metavar='N'),
+    click.option('--build-logs-dir', type=click.Path(file_okay=False),
+                 help='Keep wheel build logs in DIR', metavar='DIR'),
+    click.option('--cache-wheels/--no-cache-wheels', default=False,
+                 help='Reuse wheels built by previous runs, from a cache '
+                 'shared by all output directories'),
+    click.option('--wheel-cache-size', type=SizeType(), default='5G',
+                 help='Evict least recently used wheels when the wheels cache '
+                 'grows over SIZE', metavar='SIZE'),
+    click.option('--pip-backend', type=click.Choice(['subprocess', 'worker']),
+                 default='subprocess', help='Run each pip download in a new '
+                 'process, or in long-lived pip worker processes (faster, but '
+                 'relies on pip internals)'),
+    click.option('--target', 'targets', type=TargetType(), multiple=True,
+                 metavar='pyX.Y-PLATFORM', help='Freeze requirements for '
+                 'this Python version and platform, with wheels only (e.g. '
+                 'py3.10-manylinux2014_x86_64); use --target multiple times '
+                 'to freeze for several targets concurrently, each in its '
+                 'own output files'),
+    click.option('--metadata-only/--no-metadata-only', default=False,
+                 help='Only resolve requirements, selecting the same '
+                 'packages as downloads, without keeping packages; can\'t be '
+                 'used with --output-dir'),
+    click.option('--require-hashes/--no-require-hashes', default=False,
+                 help='Add the sha256 hashes of the packages in --output-dir '
+                 'to the frozen requirements, for pip\'s hash-checking mode'),
+    click.option('--trace', type=click.File(mode='w'), metavar='FILE',
+                 help='Write the time spent in each phase, requirements file '
+                 'and package in FILE, in the Chrome trace event format'),
+    click.option('--timings/--no-timings', default=False,
+                 help='Print the time spent in each phase and the slowest '
+                 'downloads and packages at the end'),
+    click.option('--verify-manifest/--no-verify-manifest', default=False,
+                 help='Resync the manifest of the wheels built in '
+                 '--output-dir with its contents'),
+    click.option('--simple-index/--no-simple-index', default=False,
+                 help='Maintain a PEP 503 and PEP 691 simple index of the '
+                 'packages of --output-dir in its "simple" directory'),
+]
+
+
+def freeze_options(func):
+    '''
+    Add the options shared by the freeze and watch commands to the command
+    function *func*.
+    '''
+    for option in reversed(FREEZE_OPTIONS):
+        func = option(func)
+    return func
+
+
+def enable_tracing(trace, timings, on_close=True):
+    '''
+    Enable the tracer if the *trace* file or *timings* are requested, and
+    report its spans when the current command exits, even if it fails,
+    unless *on_close* is False.
+
+    Return True if the tracer was enabled.
+    '''
+    if not (trace or timings):
+        return False
+    tracer.enable()
+    if on_close:
+        click.get_current_context().call_on_close(
+            lambda: report_timings(trace, timings))
+    return True
+
+
+def report_timings(trace, timings):
+    '''
+    Write the spans recorded by the tracer to *trace*, a file object or a
+    path, and print a summary of them if *timings* is True.
+    '''
+    if trace:
+        if isinstance(trace, str):
+            with open(trace, 'w') as fp:
+                tracer.write(fp)
+        else:
+            tracer.write(trace)
+        print('Wrote trace in %s' % getattr(trace, 'name', trace),
+              file=sys.stderr)
+    if timings:
+        print(file=sys.stderr)
+        for line in format_timings(tracer):
+            print(line, file=sys.stderr)
 
 
 @click.command()
 @click.argument('requirements', nargs=-1,
                 type=click.Path(exists=True, dir_okay=False))
-@click.option('-o', '--output-dir', help='Put downloaded python packages '
-              'and wheels here', metavar='DIR')
-@click.option('-m', '--merged-requirements', type=click.File(mode='w'),
-              help='Merge all requirements in FILE', metavar='FILE')
-@click.option('--separate-requirements/--no-separate-requirements',
-              default=False, help='Create separate frozen requirements next '
-              'to each input requirements file')
-@click.option('--separate-requirements-suffix', default='-frozen',
-              help='suffix to insert before file extensions to create '
-              'separate frozen requirements filenames')
+@freeze_options
 @click.option('--cache-dependencies/--no-cache-dependencies', default=False,
               help='Use a cache to speed up processing of unchanged '
               'requirements files')
-@click.option('--pip', default='pip', help='Path to the pip executable',
-              type=click.Path(dir_okay=False))
-@click.option('--build-wheels/--no-build-wheels', default=False,
-              help='Build wheel packages from the requirements')
-@click.option('--rebuild-wheels/--no-rebuild-wheels', default=True,
-              help='Check for wheels in the output directory before '
-              'rebuilding them')
-@click.option('-x', '--exclude', 'excluded_packages', multiple=True,
-              help='Exclude a package from the frozen requirements; you may '
-              'specify --exclude multiple times; PACKAGE may also take the '
-              'form [req_path]:[package_name], to exclude a package from '
-              'a specific separate requirement', metavar='PACKAGE')
-@click.option('--exclude-requirements', type=click.File(mode='r'),
-              multiple=True, help='Exclude packages contained in '
-              'requirements FILE; you may specify --exclude-requirements '
-              'multiple times', metavar='FILE')
-@click.option('--use-ext-wheel', 'ext_wheels', multiple=True,
-              help='Do not try to build wheel for PACKAGE, but still '
-              'include it in the frozen output; use --use-ext-wheel '
-              'multiple times to specify multiple packages', metavar='PACKAGE')
-@click.option('--output-index-url', help='Add an --index-url in the generated '
-              'requirements file', metavar='URL')
-@click.option('--output-find-links', multiple=True, metavar='URL',
-              help='Add a --find-links in the generated requirements file')
-@click.option('--loose', 'loose_packages', multiple=True, metavar='PACKAGE',
-              help='Do not specify version for PACKAGE in the output '
-              'requirements file(s)')
-@click.option('--loose-requirements/--no-loose-requirements', default=False,
-              help='Generate loose requirements files')
-@click.option('--loose-requirements-suffix', default='-loose',
-              metavar='SUFFIX', help='Loose requirements filenames are '
-              'generated with this suffix')
-@click.option('--max-conflict-resolution-iterations', default=10)
-def freeze(requirements, output_dir, cache_dependencies, pip, build_wheels,
-           excluded_packages, ext_wheels, output_index_url, output_find_links,
-           merged_requirements, separate_requirements,
-           separate_requirements_suffix, rebuild_wheels, exclude_requirements,
-           loose_packages, loose_requirements, loose_requirements_suffix,
-           max_conflict_resolution_iterations):
+def freeze(requirements, trace, timings, **options):
     '''
     Create a frozen requirement file from one or more requirement files.
     '''
-    # Verify options
-    if output_dir:
-        if not op.isdir(output_dir):
-            print('Output directory does not exist: %s' % output_dir,
-                  file=sys.stderr)
-            sys.exit(1)
-    elif build_wheels:
-        print('Using --build-wheels without --output makes no sense',
-              file=sys.stderr)
+    enable_tracing(trace, timings)
+    session = FreezeSession(**options)
+    try:
+        session.freeze(requirements)
+    except VersionsConflicts:
         sys.exit(1)
+    finally:
+        session.close()
 
-    # Pre-process options
-    excluded_packages = list(excluded_packages)
-    requirements = list(requirements)
-    excluded_packages.extend(ext_wheels)
-    for excluded_reqs_fp in exclude_requirements:
-        excluded_packages.extend(
-            p.strip() for p in excluded_reqs_fp
-            if p.strip() and not p.strip().startswith('#')
-        )
-    loose_packages = set(loose_packages)
-    output_find_links = list(output_find_links)
-
-    check_versions_conflicts = separate_requirements
-
-    if cache_dependencies:
-        reqs_cache_dir = cache_dir()
-        if not op.exists(reqs_cache_dir):
-            os.makedirs(reqs_cache_dir)
-
-    # Filter excluded packages from requirements files
-    filtered_requirements_refs = []
-    ext_wheels_lines = collections.defaultdict(list)
-    if excluded_packages:
-        for i, requirement in enumerate(requirements):
-            excluded_something = False
-            filtered_lines = []
-            with open(requirement) as fp:
-                for line in fp:
-                    excluded_package = False
-                    for pkg in excluded_packages:
-                        if pkg in line:
-                            excluded_package = True
-                            excluded_something = True
-                            if pkg in ext_wheels:
-                                ext_wheels_lines[requirement].append(line)
-                            break
-                    if not excluded_package:
-                        filtered_lines.append(line)
-            if excluded_something:
-                filtered_reqs = tempfile.NamedTemporaryFile(
-                    prefix='freeze-requirements-filtered-reqs-'
-                )
-                filtered_reqs.writelines(filtered_lines)
-                filtered_reqs.flush()
-                filtered_reqs.name = StringWithAttrs(filtered_reqs.name)
-                filtered_reqs.name.original_name = requirement
-                requirements[i] = filtered_reqs.name
-                # Keep a reference to tempfile to avoid garbage collection
-                filtered_requirements_refs.append(filtered_reqs)
-
-    for _ in range(max_conflict_resolution_iterations):
+
+@click.command()
+@click.argument('requirements', nargs=-1, required=True,
+                type=click.Path(exists=True, dir_okay=False))
+@freeze_options
+@click.option('--debounce', type=DurationType(), default='0.5s',
+              help='Wait for requirements files to stay unchanged for '
+              'DURATION before freezing them again', metavar='DURATION')
+@click.option('--poll/--no-poll', default=False,
+              help='Poll requirements files for changes instead of using '
+              'inotify')
+def watch(requirements, trace, timings, debounce, poll, **options):
+    '''
+    Freeze requirement files again each time they change.
+
+    Caches and pip workers are kept open between freezes, and the
+    dependencies cache is always used, so only the requirements that changed
+    are downloaded again.
+    '''
+    from .watch import open_watcher, wait_for_changes
+
+    # Outputs and the trace are rewritten by each freeze, open them again
+    # each time
+    for name in ('merged_requirements', 'lockfile'):
+        output = options[name]
+        if output is not None and output.name != '-':
+            options[name] = output.name
+    if trace is not None and trace.name != '-':
+        trace = trace.name
+    # Exclusion files are read again by each freeze, and watched too
+    exclude_requirements = []
+    for excluded_reqs_fp in options['exclude_requirements']:
+        if excluded_reqs_fp.name != '-':
+            excluded_reqs_fp.close()
+            excluded_reqs_fp = excluded_reqs_fp.name
+        exclude_requirements.append(excluded_reqs_fp)
+    options['exclude_requirements'] = exclude_requirements
+    exclusion_paths = [p for p in exclude_requirements if isinstance(p, str)]
+
+    def all_paths():
+        paths = watched_paths(requirements)
+        return paths + [p for p in exclusion_paths if p not in paths]
+
+    tracing = enable_tracing(trace, timings, on_close=False)
+    session = FreezeSession(cache_dependencies=True, **options)
+    paths = all_paths()
+    watcher = open_watcher(paths, polling=poll)
+    contents = {}
+    try:
+        while True:
+            # Only freeze again when the contents of the files changed, not
+            # when they are just touched
+            new_contents = dict((path, read_contents(path))
+                                for path in paths)
+            changed = [path for path in paths
+                       if new_contents[path] != contents.get(path)]
+            missing = [path for path in changed
+                       if new_contents[path] is None and path in requirements]
+            if missing:
+                print(colored('warning', 'Waiting for %s to be created' %
+                              ', '.join(missing)), file=sys.stderr)
+            elif changed:
+                contents = new_contents
+                print(colored('header', 'Freezing %s' % ', '.join(changed)),
+                      file=sys.stderr)
+                print(file=sys.stderr)
+                try:
+                    session.freeze(requirements)
+                except (VersionsConflicts, SystemExit):
+                    print(colored('fail', 'Freeze failed'), file=sys.stderr)
+                if tracing:
+                    report_timings(trace, timings)
+                    tracer.reset()
+                print(file=sys.stderr)
+                # Includes may have changed too
+                new_paths = all_paths()
+                if set(new_paths) != set(paths):
+                    watcher.close()
+                    paths = new_paths
+                    watcher = open_watcher(paths, polling=poll)
+            if changed:
+                print('Watching %s requirements files for changes (press '
+                      'Ctrl-C to stop)...' % len(paths), file=sys.stderr)
+            wait_for_changes(watcher, debounce)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+        session.close()
+
+
+def watched_paths(requirements):
+    '''
+    Return the paths of the *requirements* files and of the local files they
+    include with ``-r`` or ``-c``, without duplicates.
+
+    Included files in directories that don't exist can't be watched and are
+    left out.
+    '''
+    from .requirements import parse_requirements_file
+
+    paths = list(requirements)
+    for path in requirements:
         try:
-            requirements_packages, grouped_packages = collect_packages(
-                requirements, output_dir, cache_dependencies, build_wheels,
-                rebuild_wheels, pip, check_versions_conflicts
-            )
-        except VersionsConflicts as exc:
-            if not exc.reqs_cache_paths:
+            included_paths = parse_requirements_file(path).included_paths
+        except (IOError, OSError):
+            continue
+        for included_path in included_paths:
+            if (included_path not in paths and
+                    op.isdir(op.dirname(op.abspath(included_path)))):
+                paths.append(included_path)
+    return paths
+
+
+def read_contents(path):
+    '''
+    Read the contents of the file at *path*, or return None if it doesn't
+    exist.
+    '''
+    try:
+        with open(path, 'rb') as fp:
+            return fp.read()
+    except (IOError, OSError):
+        return None
+
+
+class FreezeSession(object):
+    '''
+    Freeze requirements files with the options of the freeze command,
+    keeping caches and pip workers open between freezes.
+
+    Options are checked when the session is created, exiting the process if
+    they are invalid. Call :meth:`close` when done.
+    '''
+
+    def __init__(self, output_dir, cache_dependencies, pip, build_wheels,
+                 excluded_packages, ext_wheels, output_index_url,
+                 output_find_links, merged_requirements,
+                 separate_requirements, separate_requirements_suffix,
+                 rebuild_wheels, exclude_requirements, loose_packages,
+                 loose_requirements, loose_requirements_suffix, lockfile,
+                 max_conflict_resolution_iterations, jobs, build_jobs,
+                 build_logs_dir, cache_wheels, wheel_cache_size,
+                 pip_backend, targets, metadata_only, require_hashes,
+                 verify_manifest, simple_index):
+        from .requirements import iter_logical_lines
+
+        # Verify options
+        if output_dir:
+            if not op.isdir(output_dir):
+                print('Output directory does not exist: %s' % output_dir,
+                      file=sys.stderr)
                 sys.exit(1)
-            print('Trying to automatically resolve conflicts by reprocessing '
-                  'cached dependencies', file=sys.stderr)
-            for path in exc.reqs_cache_paths:
-                os.unlink(path)
-        else:
-            break
-    else:
-        print('Failed to resolve conflicts after %s retries' %
-              max_conflict_resolution_iterations, file=sys.stderr)
-        sys.exit(1)
+            if metadata_only:
+                print('Using --metadata-only with --output makes no sense',
+                      file=sys.stderr)
+                sys.exit(1)
+        elif build_wheels:
+            print('Using --build-wheels without --output makes no sense',
+                  file=sys.stderr)
+            sys.exit(1)
+        elif require_hashes:
+            print('Using --require-hashes without --output makes no sense',
+                  file=sys.stderr)
+            sys.exit(1)
+        elif verify_manifest:
+            print('Using --verify-manifest without --output makes no sense',
+                  file=sys.stderr)
+            sys.exit(1)
+        elif simple_index:
+            print('Using --simple-index without --output makes no sense',
+                  file=sys.stderr)
+            sys.exit(1)
+        if build_wheels and targets:
+            print('Using --build-wheels with --target makes no sense',
+                  file=sys.stderr)
+            sys.exit(1)
+
+        # Pre-process options; exclusion files given by path are read by
+        # each freeze, so changes to them are used in watch mode
+        self.excluded_packages = list(excluded_packages)
+        self.exclude_requirements = []
+        for excluded_reqs in exclude_requirements:
+            if isinstance(excluded_reqs, str):
+                self.exclude_requirements.append(excluded_reqs)
+            else:
+                self.excluded_packages.extend(
+                    iter_logical_lines(excluded_reqs))
+        self.ext_wheels = list(ext_wheels)
+        self.loose_packages = set(canonicalize_distro_name(p)
+                                  for p in loose_packages)
+        self.output_find_links = list(output_find_links)
+        self.output_dir = output_dir
+        self.pip = pip
+        self.build_wheels = build_wheels
+        self.rebuild_wheels = rebuild_wheels
+        self.output_index_url = output_index_url
+        self.merged_requirements = merged_requirements
+        self.separate_requirements = separate_requirements
+        self.separate_requirements_suffix = separate_requirements_suffix
+        self.loose_requirements = loose_requirements
+        self.loose_requirements_suffix = loose_requirements_suffix
+        self.lockfile = lockfile
+        self.max_conflict_resolution_iterations = \
+            max_conflict_resolution_iterations
+        self.jobs = jobs
+        self.build_jobs = build_jobs
+        if build_jobs is None:
+            self.build_jobs = available_cpus()
+        self.build_logs_dir = build_logs_dir
+        self.require_hashes = require_hashes
+        self.pip_backend = pip_backend
+        self.metadata_only = metadata_only
+        self.targets = list(targets)
+
+        # Open caches
+        self.wheel_cache = None
+        if build_wheels and cache_wheels:
+            self.wheel_cache = WheelCache(op.join(cache_dir(), 'wheels'),
+                                          interpreter_tag(pip),
+                                          wheel_cache_size)
+        self.dependencies_cache = None
+        if cache_dependencies:
+            self.dependencies_cache = open_dependencies_cache()
+        self.hash_cache = None
+        if require_hashes or simple_index or build_wheels:
+            self.hash_cache = HashCache(op.join(cache_dir(),
+                                                'hashes.sqlite3'))
+        self.output_index = None
+        if simple_index:
+            self.output_index = SimpleIndex(output_dir, self.hash_cache)
+        self.wheel_manifest = None
+        if build_wheels or verify_manifest:
+            self.wheel_manifest = WheelManifest(output_dir,
+                                                interpreter_tag(pip))
+        if verify_manifest:
+            with tracer.span('verify wheels manifest'):
+                removed, added = self.wheel_manifest.verify()
+                self.wheel_manifest.save()
+            print('Wheels manifest: removed %s stale entries, added %s '
+                  'entries' % (removed, added), file=sys.stderr)
+            print(file=sys.stderr)
+        self.pip_workers = self._start_pip_workers()
+
+    def _start_pip_workers(self):
+        # Each target has its own workers, so they run up to --jobs pip
+        # commands each, and a failing target doesn't interrupt the commands
+        # of the others
+        if self.pip_backend != 'worker':
+            return {}
+        from .pipworker import PipWorkerPool
+        return dict((target, PipWorkerPool(self.pip, self.jobs))
+                    for target in self.targets or [None])
+
+    def _read_exclusions(self):
+        from .requirements import iter_logical_lines, ExclusionIndex
+
+        excluded_packages = list(self.excluded_packages)
+        for path in self.exclude_requirements:
+            try:
+                with open(path) as fp:
+                    excluded_packages.extend(iter_logical_lines(fp))
+            except (IOError, OSError) as exc:
+                print('Can\'t read excluded requirements: %s' % exc,
+                      file=sys.stderr)
+                sys.exit(1)
+        return ExclusionIndex(excluded_packages, self.ext_wheels)
 
-    # Format merged requirements
-    if merged_requirements:
-        format_requirements(merged_requirements, requirements_packages,
-                            grouped_packages, excluded_packages,
-                            output_index_url, output_find_links,
-                            ext_wheels_lines)
-        print('Wrote merged frozen requirements in %s' %
-              merged_requirements.name, file=sys.stderr)
-
-    # Format separate requirements
-    if separate_requirements:
-        for requirements_file, packages in requirements_packages:
-            root, ext = op.splitext(requirements_file)
-            filename = root + separate_requirements_suffix + ext
-            with open(filename, 'w') as fp:
-                format_requirements(fp, [(requirements_file, packages)],
-                                    grouped_packages, excluded_packages,
-                                    output_index_url, output_find_links,
-                                    ext_wheels_lines)
-            print('Wrote separate frozen requirements for %s in %s' %
-                  (requirements_file, filename), file=sys.stderr)
-
-    # Format loose requirements
-    if loose_requirements and loose_packages:
-        for requirements_file, packages in requirements_packages:
-            root, ext = op.splitext(requirements_file)
-            filename = root + loose_requirements_suffix + ext
-            with open(filename, 'w') as fp:
-                format_requirements(fp, [(requirements_file, packages)],
-                                    grouped_packages, excluded_packages,
-                                    output_index_url, output_find_links,
-                                    ext_wheels_lines,
-                                    loose_packages=loose_packages)
-            print('Wrote separate loose requirements for %s in %s' %
-                  (requirements_file, filename), file=sys.stderr)
-
-
-def collect_packages(requirements, output_dir, cache_dependencies,
+    def freeze(self, requirements):
+        '''
+        Freeze the *requirements* files, for each target if any, writing the
+        outputs given by the options.
+
+        Raise :class:`VersionsConflicts` if versions conflicts between
+        requirements files can't be resolved.
+        '''
+        self.exclusions = self._read_exclusions()
+        try:
+            if self.targets:
+                self._freeze_targets(requirements)
+            else:
+                self._freeze(requirements, None, self.dependencies_cache,
+                             self.hash_cache, self.output_index)
+        except BaseException:
+            # Failed downloads terminate the pip workers, start new ones for
+            # the next freeze
+            self._close_pip_workers()
+            self.pip_workers = self._start_pip_workers()
+            raise
+        finally:
+            # Don't accumulate the packages of each freeze in work
+            # directories
+            clean_work_dirs()
+
+    def _freeze_targets(self, requirements):
+        # Freeze all targets concurrently, sharing the packages they
+        # download; each target has its own connections to the caches
+        artifacts_pool = create_work_dir(self.output_dir or None)
+
+        def freeze_target(target):
+            dependencies_cache = None
+            if self.dependencies_cache is not None:
+                dependencies_cache = open_dependencies_cache()
+            hash_cache = None
+            if self.hash_cache is not None:
+                hash_cache = HashCache(self.hash_cache.path)
+            try:
+                return self._freeze(requirements, target, dependencies_cache,
+                                    hash_cache, None, artifacts_pool)
+            finally:
+                if dependencies_cache is not None:
+                    dependencies_cache.close()
+                if hash_cache is not None:
+                    hash_cache.close()
+
+        projects = set()
+        for grouped_packages in parallel_map(freeze_target, self.targets,
+                                             len(self.targets)):
+            projects.update(canonicalize_distro_name(key)
+                            for key in grouped_packages)
+        # Update the simple index once all targets placed their packages
+        if self.output_index is not None:
+            update_simple_index(self.output_index, projects)
+
+    def _output(self, output, target):
+        # Each target has its own outputs, named after it
+        if output is None or target is None:
+            return output
+        name = getattr(output, 'name', output)
+        if name == '-':
+            return output
+        return target_filename(name, target)
+
+    def _freeze(self, requirements, target, dependencies_cache, hash_cache,
+                output_index, artifacts_pool=None):
+        # Freeze *requirements* for *target*, or for pip's environment if
+        # None, and return the grouped packages
+        from .requirements import iter_logical_lines, requirement_name
+        from .output import (FrozenRequirements, RequirementsTarget,
+                             LockfileTarget, write_outputs)
+
+        exclusions = self.exclusions
+        output_dir = self.output_dir
+        requirements = list(requirements)
+        check_versions_conflicts = self.separate_requirements
+
+        # Filter excluded packages from requirements files
+        filtered_requirements_refs = []
+        ext_wheels_lines = collections.defaultdict(list)
+        if exclusions.excluded:
+            for i, requirement in enumerate(requirements):
+                with open(requirement) as fp:
+                    lines = list(iter_logical_lines(fp))
+                filtered_lines = []
+                for line in lines:
+                    name = requirement_name(line)
+                    if name is not None and exclusions.is_excluded(name):
+                        if exclusions.is_ext_wheel(name):
+                            ext_wheels_lines[requirement].append(line)
+                    else:
+                        filtered_lines.append(line)
+                if len(filtered_lines) != len(lines):
+                    # Create the filtered file next to the original, so pip
+                    # finds the files it references
+                    filtered_reqs = tempfile.NamedTemporaryFile(
+                        mode='w', prefix='.freeze-requirements-filtered-reqs-',
+                        dir=op.dirname(op.abspath(requirement))
+                    )
+                    filtered_reqs.writelines('%s\n' % line
+                                            for line in filtered_lines)
+                    filtered_reqs.flush()
+                    filtered_reqs.name = StringWithAttrs(filtered_reqs.name)
+                    filtered_reqs.name.original_name = requirement
+                    requirements[i] = filtered_reqs.name
+                    # Keep a reference to tempfile to avoid garbage
+                    # collection
+                    filtered_requirements_refs.append(filtered_reqs)
+
+        if target is not None:
+            print(colored('header', 'Freezing for %s' % target),
+                  file=sys.stderr)
+        requirements_packages, grouped_packages = collect_packages(
+            requirements, output_dir, dependencies_cache,
+            self.build_wheels, self.rebuild_wheels, self.pip,
+            check_versions_conflicts, self.jobs, self.build_jobs,
+            self.build_logs_dir, self.wheel_cache,
+            self.max_conflict_resolution_iterations,
+            self.pip_workers.get(target), hash_cache, self.wheel_manifest,
+            output_index, self.metadata_only, target, artifacts_pool
+        )
+
+        hashes = None
+        if self.require_hashes:
+            with tracer.span('hash packages'):
+                hashes = packages_hashes(output_dir, grouped_packages,
+                                         hash_cache)
+            if ext_wheels_lines:
+                print(colored('warning', 'External wheels requirements have '
+                              'no hashes, pip will refuse them in '
+                              'hash-checking mode'), file=sys.stderr)
+            missing_hashes = sorted(
+                key for key in grouped_packages if key not in hashes and
+                not exclusions.is_excluded(canonicalize_distro_name(key)))
+            if missing_hashes:
+                print(colored('warning', 'No package found in %s for %s, '
+                              'pip will refuse them in hash-checking mode' %
+                              (output_dir, ', '.join(missing_hashes))),
+                      file=sys.stderr)
+
+        # Write all outputs in a single pass
+        frozen_requirements = FrozenRequirements(
+            requirements_packages, grouped_packages, exclusions,
+            ext_wheels_lines, hashes)
+        targets = []
+        messages = []
+        merged_requirements = self._output(self.merged_requirements, target)
+        if merged_requirements:
+            targets.append(RequirementsTarget(
+                merged_requirements, None, self.output_index_url,
+                self.output_find_links))
+            messages.append('Wrote merged frozen requirements in %s' %
+                            targets[-1].name)
+        if self.separate_requirements:
+            for requirements_file, _ in requirements_packages:
+                root, ext = op.splitext(requirements_file)
+                filename = self._output(
+                    root + self.separate_requirements_suffix + ext, target)
+                targets.append(RequirementsTarget(
+                    filename, [requirements_file], self.output_index_url,
+                    self.output_find_links))
+                messages.append('Wrote separate frozen requirements for %s '
+                                'in %s' % (requirements_file, filename))
+        if self.loose_requirements and self.loose_packages:
+            for requirements_file, _ in requirements_packages:
+                root, ext = op.splitext(requirements_file)
+                filename = self._output(
+                    root + self.loose_requirements_suffix + ext, target)
+                targets.append(RequirementsTarget(
+                    filename, [requirements_file], self.output_index_url,
+                    self.output_find_links, self.loose_packages))
+                messages.append('Wrote separate loose requirements for %s '
+                                'in %s' % (requirements_file, filename))
+        lockfile = self._output(self.lockfile, target)
+        if lockfile:
+            targets.append(LockfileTarget(lockfile))
+            messages.append('Wrote lockfile in %s' % targets[-1].name)
+        # Targets frozen concurrently may share stdout
+        with tracer.span('write outputs'), _outputs_lock:
+            write_outputs(frozen_requirements, targets)
+        for message in messages:
+            print(message, file=sys.stderr)
+        return grouped_packages
+
+    def _close_pip_workers(self):
+        for pip_workers in self.pip_workers.values():
+            pip_workers.close()
+
+    def close(self):
+        self._close_pip_workers()
+        if self.hash_cache is not None:
+            self.hash_cache.close()
+        if self.dependencies_cache is not None:
+            self.dependencies_cache.close()
+
+
+def collect_packages(requirements, output_dir, dependencies_cache,
                      build_wheels, rebuild_wheels, pip_bin,
-                     check_versions_conflicts):
+                     check_versions_conflicts, jobs=1, build_jobs=1,
+                     build_logs_dir=None, wheel_cache=None,
+                     max_conflict_resolution_iterations=10,
+                     pip_workers=None, hash_cache=None,
+                     wheel_manifest=None, simple_index=None,
+                     metadata_only=False, target=None,
+                     artifacts_pool=None):
     '''
     Collect all packages and their requirements to *output_dir*, optionally
     build wheel files in the process.
+
+    If *dependencies_cache* is not None, the packages needed by each
+    requirement are looked up in this :class:`DependenciesCache`, so only the
+    requirements that changed since the last run are downloaded.
+
+    Requirements files are downloaded with up to *jobs* concurrent pip
+    processes (or on the :class:`PipWorkerPool` *pip_workers* if given);
+    results are still processed in *requirements* order.
+    Downloaded packages are collected in a pool that later downloads use as
+    a local source, so each package is downloaded once per run. Wheels
+    are then built for all the unique source packages at once, on a pool of
+    *build_jobs* processes, logging each build in *build_logs_dir*, and
+    reusing the wheels of *wheel_cache* if given.
+
+    If *check_versions_conflicts* is true, versions conflicts between
+    requirements files are checked before building and moving packages.
+    Conflicts coming from cached dependencies are resolved by reprocessing
+    only the requirements involved, up to
+    *max_conflict_resolution_iterations* times; :class:`VersionsConflicts`
+    is raised if they can't be resolved.
+
+    If *hash_cache* is not None, the digests of the packages placed in
+    *output_dir* are computed while placing them, and stored in this
+    :class:`HashCache`.
+
+    If *wheel_manifest* is not None, the wheels already built are looked up
+    in this :class:`WheelManifest` of *output_dir*, and each wheel built is
+    placed in *output_dir* with its source package and recorded in it as
+    soon as it is built.
+
+    If *simple_index* is not None, the pages of the projects that got new
+    packages are updated in this :class:`SimpleIndex` of *output_dir*.
+
+    If *metadata_only* is true, requirements are only resolved, from the
+    metadata of packages where the index provides it, and no packages are
+    collected.
+
+    If *target* is not None, wheels are downloaded for this ``pyX.Y-PLATFORM``
+    environment instead of source packages, and its resolutions are cached
+    separately. *artifacts_pool* is the directory of the packages already
+    downloaded during the run, which may be shared with other calls
+    running concurrently; a new one is created if None.
     '''
-    # Create packages collect dir
-    packages_collect_dir = create_work_dir()
+    import sh
+    from .requirements import parse_requirements_file
+
+    # Create staging directories on the same filesystem as *output_dir*, so
+    # packages can be moved there by renaming them
+    staging_dir = output_dir or None
+    packages_collect_dir = create_work_dir(staging_dir)
+    placement_stats = collections.Counter()
 
     # Prepare reused shell commands
+    # Disable sh truncation of errors
+    sh.ErrorReturnCode.truncate_cap = None
     pip = sh.Command(pip_bin)
-    move_forced = sh.mv.bake('-f')
 
-    # Download packages
-    requirements_packages = []
     wheels = {}
-    deps_cache_map = collections.defaultdict(set)
     cache_updates = {}
-    for requirement in requirements:
-        # Check cache
-        original_requirement = getattr(requirement, 'original_name',
-                                       requirement)
-        if cache_dependencies:
-            deps_cache_path = cache_path(original_requirement)
-            if op.exists(deps_cache_path):
-                print('%s dependencies found in cache' % original_requirement,
-                      file=sys.stderr)
-                with open(deps_cache_path) as fp:
-                    dependencies = json.load(fp)
-                requirements_packages.append((original_requirement,
-                                              dependencies))
-                # Store dependencies cache path for each distro name in it, so
-                # we can retrieve cache files associated with version conflicts
-                # later
-                for pkg_filename in dependencies:
-                    pkg_name = likely_distro(pkg_filename).key
-                    deps_cache_map[pkg_name].add(deps_cache_path)
+
+    environment = []
+    if target is None:
+        # Download source packages, to build wheels from them
+        binary_args = ['--no-binary', ':all:']
+    else:
+        binary_args = environment = target_pip_args(target)
+    # Resolutions from metadata only have no packages, don't mix them with
+    # downloads in the dependencies cache
+    cache_environment = environment
+    if metadata_only:
+        cache_environment = environment + ['--metadata-only']
+    with tracer.span('parse requirements'):
+        requirements_files = [parse_requirements_file(r, cache_environment)
+                              for r in requirements]
+    original_requirements = [getattr(r, 'original_name', r)
+                             for r in requirements]
+    # For each requirements file, a list of (cache key, packages, download
+    # dir) tuples; download dir is None for packages found in the cache
+    resolved = [[] for _ in requirements]
+    # Indices of the splittable files downloaded as a whole, whose
+    # requirements dependencies are cached from that resolution
+    split_files = set()
+
+    def plan_downloads(indices):
+        # Without a dependencies cache, requirements files are downloaded as
+        # a whole. With a cache, each file is looked up as a whole, then
+        # requirement by requirement if possible, and only the requirements
+        # missing from the cache (or from *resolved*) are downloaded. Files
+        # none of whose requirements are cached are still downloaded as a
+        # whole, in a single pip process.
+        to_download = []
+        for index in indices:
+            reqs_file = requirements_files[index]
+            original_requirement = original_requirements[index]
+            if dependencies_cache is None:
+                to_download.append((index, None, None))
                 continue
-        print(original_requirement, file=sys.stderr)
-        # Download python source packages from requirement file
-        print('  Downloading packages...', file=sys.stderr)
-        temp_dir = create_work_dir()
+            file_key = reqs_file.cache_key()
+            known_keys = set(key for key, _, _ in resolved[index])
+            if not known_keys:
+                dependencies = dependencies_cache.get(file_key)
+                if dependencies is not None:
+                    print('%s dependencies found in cache' %
+                          original_requirement, file=sys.stderr)
+                    resolved[index].append((file_key, dependencies, None))
+                    continue
+            if not reqs_file.splittable:
+                to_download.append((index, file_key, None))
+                continue
+            lines = []
+            for line in reqs_file.requirements:
+                key = reqs_file.cache_key(line)
+                if key not in known_keys:
+                    lines.append((key, line, dependencies_cache.get(key)))
+            if not known_keys and all(d is None for _, _, d in lines):
+                to_download.append((index, file_key, None))
+                split_files.add(index)
+                continue
+            for key, line, dependencies in lines:
+                if dependencies is None:
+                    to_download.append((index, key, line))
+                else:
+                    resolved[index].append((key, dependencies, None))
+            print('%s: dependencies of %s of %s requirements found in cache' %
+                  (original_requirement,
+                   len(reqs_file.requirements) -
+                   sum(1 for i, _, _ in to_download if i == index),
+                   len(reqs_file.requirements)), file=sys.stderr)
+        if dependencies_cache is not None:
+            # Don't keep the database locked while downloading
+            dependencies_cache.commit()
+        return to_download
+
+    # Download python source packages from requirement files (or single
+    # requirements), running up to *jobs* pip processes at once. Packages
+    # already downloaded during this run are collected in an artifacts pool
+    # and linked in the download directories beforehand, so pip reuses them
+    # instead of downloading them again; pip still resolves requirements
+    # against the index, so this doesn't change the selected versions.
+    running_processes = {}
+    if artifacts_pool is None:
+        artifacts_pool = create_work_dir(staging_dir)
+    transferred = {'downloaded': 0, 'reused': 0, 'commands': 0}
+    use_artifacts_pool = [True]
+
+    def run_pip(index, line, args):
+        if line is None:
+            args = args + ['--requirement', requirements[index]]
+            cwd = os.getcwd()
+        else:
+            args = args + requirements_files[index].options_args + [line.line]
+            cwd = op.dirname(op.abspath(original_requirements[index]))
+        return call_pip(args, cwd)
+
+    def call_pip(args, cwd):
+        transferred['commands'] += 1
+        if pip_workers is not None:
+            return pip_workers.run(args, cwd)
+        process = pip(*args, _cwd=cwd, _bg=True, _bg_exc=False)
+        running_processes[id(process)] = process
         try:
-            pip.download(requirement=requirement, dest=temp_dir,
-                         no_binary=':all:')
-        except sh.ErrorReturnCode as exc:
-            print(exc.stdout, file=sys.stderr)
-            print(exc.stderr, file=sys.stderr)
-            sys.exit(1)
-        # List downloaded packages
+            process.wait()
+        finally:
+            del running_processes[id(process)]
+        return process.stdout.decode('utf-8', 'replace')
+
+    def run_pip_download(index, line, temp_dir):
+        # pip may run in another directory than the work directories
+        return run_pip(index, line, ['download', '--dest',
+                                     op.abspath(temp_dir)] + binary_args)
+
+    def report_args(temp_dir, args):
+        # Options to resolve requirements without installing or downloading
+        # them, printing pip's installation report
+        args = ['install', '--dry-run', '--ignore-installed', '--quiet',
+                '--report', '-'] + args
+        if target is not None:
+            # pip only accepts platform options when installing in a
+            # directory
+            args += ['--target', op.abspath(temp_dir)]
+        return args
+
+    def read_report(args, output):
+        try:
+            # pip colors the report when its output is a terminal
+            return json.loads(_ansi_escape_regex.sub('', output))
+        except ValueError:
+            raise PipError(args, 0, output, 'invalid installation report')
+
+    def pip_report(index, line, temp_dir, args):
+        args = report_args(temp_dir, args)
+        return read_report(args, run_pip(index, line, args))
+
+    def packages_report(index, temp_dir, packages):
+        # Get the metadata of the downloaded *packages* of a requirements
+        # file, without resolving their dependencies again
+        args = report_args(temp_dir, ['--no-deps'] + environment +
+                           requirements_files[index].options_args +
+                           [op.join(op.abspath(temp_dir), filename)
+                            for filename in packages])
+        cwd = op.dirname(op.abspath(original_requirements[index]))
+        with tracer.span('pip report', REQUIREMENTS,
+                         file=original_requirements[index]):
+            return read_report(args, call_pip(args, cwd))
+
+    def cache_requirements_dependencies(index, temp_dir, packages, report):
+        # Cache the dependencies of each requirement of a file resolved as a
+        # whole, so only its changed requirements are downloaded next time
+        reqs_file = requirements_files[index]
+        try:
+            if report is None:
+                report = packages_report(index, temp_dir, packages)
+        except (sh.ErrorReturnCode, PipError):
+            print('%s: failed to get the metadata of packages, dependencies '
+                  'of requirements not cached' %
+                  original_requirements[index], file=sys.stderr)
+            return
+        split = split_report_packages(report, reqs_file.requirements)
+        if split is not None:
+            for line, dependencies in zip(reqs_file.requirements, split):
+                cache_updates[reqs_file.cache_key(line)] = dependencies
+
+    def download(job):
+        index, _, line = job
+        temp_dir = create_work_dir(staging_dir)
+        if metadata_only:
+            # Select packages like downloads do, so both pin the same
+            # versions; pip uses the metadata files of wheels (PEP 658)
+            # instead of downloading them when the index has them
+            report = pip_report(index, line, temp_dir, binary_args)
+            dependencies = report_packages(report)
+            if line is None and index in split_files:
+                cache_requirements_dependencies(index, temp_dir,
+                                                dependencies, report)
+            return temp_dir, dependencies
+        seeded = set()
+        if use_artifacts_pool[0]:
+            for filename in os.listdir(artifacts_pool):
+                try:
+                    os.link(op.join(artifacts_pool, filename),
+                            op.join(temp_dir, filename))
+                except OSError:
+                    continue
+                seeded.add(filename)
+        output = run_pip_download(index, line, temp_dir)
+        if seeded:
+            saved = [op.basename(p)
+                     for p in _pip_saved_regex.findall(
+                         _ansi_escape_regex.sub('', output))]
+            if not saved:
+                # Can't tell which packages pip used (e.g. because it runs
+                # quietly), stop using the pool and download again
+                use_artifacts_pool[0] = False
+                temp_dir = create_work_dir(staging_dir)
+                seeded = set()
+                run_pip_download(index, line, temp_dir)
+            else:
+                for filename in seeded.difference(saved):
+                    os.unlink(op.join(temp_dir, filename))
         dependencies = os.listdir(temp_dir)
-        requirements_packages.append((original_requirement, dependencies))
-        # Build wheel packages
-        if build_wheels:
-            print('  Building wheels...', file=sys.stderr)
-            for package in dependencies:
-                package_path = op.join(temp_dir, package)
-                # Check the wheel does not already exist
-                if not rebuild_wheels:
-                    wheel_name = get_wheel_name(package_path)
-                    distro = likely_distro(package)
-                    final_wheel_path = op.join(
-                        output_dir,
-                        canonicalize_distro_name(distro.key),
-                        wheel_name
-                    )
-                    if op.exists(final_wheel_path):
-                        print(colored('okgreen', '  %s already built, skipped'
-                                      % final_wheel_path), file=sys.stderr)
-                        continue
-                    else:
-                        print(colored('okblue', '  %s not found, rebuilding' %
-                                      final_wheel_path), file=sys.stderr)
-                # Nope, build wheel
-                final_path = op.join(packages_collect_dir, package)
-                wheels[final_path] = build_wheel(pip, package_path)
-        # Save cache content for later and move packages to the packages
-        # collect dir
-        if cache_dependencies:
-            cache_updates[deps_cache_path] = json.dumps(dependencies)
-        move_forced(sh.glob(op.join(temp_dir, '*')), packages_collect_dir)
-    print(file=sys.stderr)
+        with _artifacts_pool_lock:
+            for filename in dependencies:
+                path = op.join(temp_dir, filename)
+                if filename in seeded:
+                    transferred['reused'] += op.getsize(path)
+                    continue
+                transferred['downloaded'] += op.getsize(path)
+                pool_path = op.join(artifacts_pool, filename)
+                if not op.exists(pool_path):
+                    link_or_copy(path, pool_path)
+        if line is None and index in split_files:
+            cache_requirements_dependencies(index, temp_dir, dependencies,
+                                            None)
+        return temp_dir, dependencies
+
+    def traced_download(job):
+        index, _, line = job
+        with tracer.span('pip download', REQUIREMENTS,
+                         file=original_requirements[index],
+                         requirement=None if line is None else line.line):
+            return download(job)
+
+    def cancel_downloads():
+        if pip_workers is not None:
+            pip_workers.terminate()
+        for process in list(running_processes.values()):
+            try:
+                process.terminate()
+            except OSError:
+                pass
+
+    def run_downloads(to_download):
+        if not to_download:
+            return
+        print('Downloading packages for %s requirements files (%s jobs)...' %
+              (len(set(index for index, _, _ in to_download)), jobs),
+              file=sys.stderr)
+        downloads = parallel_map(traced_download, to_download, jobs,
+                                 cancel=cancel_downloads)
+        try:
+            for (index, key, line), (temp_dir, dependencies) in zip(
+                    to_download, downloads):
+                if line is None:
+                    print(original_requirements[index], file=sys.stderr)
+                else:
+                    print('%s: %s' % (original_requirements[index],
+                                      line.line), file=sys.stderr)
+                print('  %s %s packages' % (
+                    'Resolved' if metadata_only else 'Downloaded',
+                    len(dependencies)), file=sys.stderr)
+                resolved[index].append((key, dependencies, temp_dir))
+        except (sh.ErrorReturnCode, PipError) as exc:
+            downloads.close()
+            for output in (exc.stdout, exc.stderr):
+                if isinstance(output, bytes):
+                    output = output.decode('utf-8', 'replace')
+                print(output, file=sys.stderr)
+            sys.exit(1)
+
+    def resolve_separate_conflicts(indices):
+        # Requirements resolved separately may pick conflicting versions of
+        # a common dependency, resolve these files as a whole instead
+        to_download = []
+        for index in indices:
+            file_key = requirements_files[index].cache_key()
+            if resolved[index] and resolved[index][0][0] == file_key:
+                continue
+            packages = merge_packages(p for _, p, _ in resolved[index])
+            if has_versions_conflicts(packages):
+                print('%s: requirements resolved separately have versions '
+                      'conflicts, resolving them together' %
+                      original_requirements[index], file=sys.stderr)
+                # Still cache the separate resolutions, they are valid
+                for key, dependencies, temp_dir in resolved[index]:
+                    if temp_dir is not None:
+                        cache_updates[key] = dependencies
+                resolved[index] = []
+                to_download.append((index, file_key, None))
+            else:
+                cache_updates[file_key] = packages
+        run_downloads(to_download)
+
+    def resolve(indices):
+        with tracer.span('dependencies cache'):
+            to_download = plan_downloads(indices)
+        with tracer.span('download'):
+            run_downloads(to_download)
+            if dependencies_cache is not None:
+                resolve_separate_conflicts(indices)
+        print(file=sys.stderr)
+
+    def commit_cache():
+        if dependencies_cache is None:
+            return
+        with tracer.span('dependencies cache'):
+            for file_resolved in resolved:
+                for key, dependencies, temp_dir in file_resolved:
+                    if temp_dir is not None:
+                        cache_updates[key] = dependencies
+            for key, dependencies in sorted(cache_updates.items()):
+                dependencies_cache.set(key, dependencies)
+            dependencies_cache.commit()
+
+    def merge_requirements_packages():
+        return [(original_requirements[index],
+                 merge_packages(p for _, p, _ in file_resolved))
+                for index, file_resolved in enumerate(resolved)]
+
+    resolve(range(len(requirements)))
+    requirements_packages = merge_requirements_packages()
+    # Group packages by distribution key and sort them by version
+    grouped_packages = group_and_select_packages(requirements_packages)
+
+    # Check versions conflicts between requirements files. Conflicts may
+    # come from stale cached dependencies: remove them from the cache and
+    # resolve again the requirements that used them, keeping everything
+    # else.
+    iteration = 0
+    while check_versions_conflicts:
+        errors, cache_keys = find_versions_conflicts(
+            grouped_packages, resolved, requirements_files)
+        if not errors:
+            if iteration:
+                print('Resolved versions conflicts in %s iterations' %
+                      iteration, file=sys.stderr)
+                print(file=sys.stderr)
+            break
+        print('Found versions conflicts:', file=sys.stderr)
+        print('\n'.join(errors), file=sys.stderr)
+        exhausted = iteration == max_conflict_resolution_iterations
+        if exhausted and cache_keys:
+            print('Failed to resolve conflicts after %s retries' %
+                  max_conflict_resolution_iterations, file=sys.stderr)
+        if exhausted or not cache_keys:
+            # Still cache the valid resolutions
+            commit_cache()
+            raise VersionsConflicts(cache_keys)
+        iteration += 1
+        start = time.time()
+        print('Trying to automatically resolve conflicts by reprocessing '
+              'cached dependencies (iteration %s)' % iteration,
+              file=sys.stderr)
+        for key in cache_keys:
+            dependencies_cache.delete(key)
+            cache_updates.pop(key, None)
+        indices = []
+        for index, file_resolved in enumerate(resolved):
+            kept = [r for r in file_resolved
+                    if r[2] is not None or r[0] not in cache_keys]
+            if len(kept) != len(file_resolved):
+                resolved[index] = kept
+                cache_updates.pop(requirements_files[index].cache_key(),
+                                  None)
+                indices.append(index)
+        resolve(indices)
+        requirements_packages = merge_requirements_packages()
+        grouped_packages = group_and_select_packages(requirements_packages)
+        print('Iteration %s reprocessed %s requirements files in %.1fs' %
+              (iteration, len(indices), time.time() - start),
+              file=sys.stderr)
+        print(file=sys.stderr)
+
+    if transferred['downloaded'] or transferred['reused']:
+        if pip_workers is None:
+            commands = '%s pip processes started' % transferred['commands']
+        else:
+            commands = '%s pip commands run on pip workers' % \
+                transferred['commands']
+        print('Downloaded %s, reused %s of packages downloaded earlier in '
+              'this run (%s)' % (format_size(transferred['downloaded']),
+                                 format_size(transferred['reused']),
+                                 commands), file=sys.stderr)
+        print(file=sys.stderr)
+
+    # Move downloaded packages to the packages collect dir; packages
+    # downloaded for multiple requirements are links to the same artifact, so
+    # move them only once
+    to_collect = {}
+    for file_resolved in resolved:
+        for _, dependencies, temp_dir in file_resolved:
+            if temp_dir is not None and not metadata_only:
+                for filename in dependencies:
+                    to_collect.setdefault(filename,
+                                          op.join(temp_dir, filename))
+    with tracer.span('collect packages'):
+        place_files(sorted(to_collect.values()), packages_collect_dir,
+                    placement_stats, hash_cache)
+
+    # Build wheel packages for all the unique source packages collected
+    placed_projects = set()
+
+    def sdist_digest(path):
+        if hash_cache is None:
+            return file_sha256(path)
+        return hash_cache.hash(path)
+
+    def place_built_wheel(package_path, wheel_path):
+        # Place wheels and their source package as soon as they are built,
+        # so builds that succeeded are kept in the manifest if others fail
+        digest = sdist_digest(package_path)
+        distro = parse_package_filename(package_path)
+        place_files([package_path, wheel_path],
+                    op.join(output_dir, distro.canonical_name),
+                    placement_stats, hash_cache)
+        placed_projects.add(distro.canonical_name)
+        wheel_manifest.set(op.basename(package_path), digest,
+                           op.basename(wheel_path))
+        wheel_manifest.save()
+
+    if build_wheels:
+        to_build = []
+        for package in sorted(os.listdir(packages_collect_dir)):
+            package_path = op.join(packages_collect_dir, package)
+            # Check the wheel does not already exist, looking it up in the
+            # manifest first to avoid extracting the source package
+            if not rebuild_wheels:
+                final_wheel_path = None
+                if wheel_manifest is not None:
+                    final_wheel_path = wheel_manifest.get(
+                        package, sdist_digest(package_path))
+                if final_wheel_path is None:
+                    wheel_name = get_wheel_name(package_path,
+                                                interpreter_tag(pip_bin))
+                    distro = parse_package_filename(package)
+                    # The setuptools version of the build decides if the
+                    # project name is normalized
+                    for wheel_name in wheel_name_variants(wheel_name):
+                        final_wheel_path = op.join(
+                            output_dir,
+                            distro.canonical_name,
+                            wheel_name
+                        )
+                        if op.exists(final_wheel_path):
+                            break
+                    if (wheel_manifest is not None and
+                            op.exists(final_wheel_path)):
+                        wheel_manifest.set(package,
+                                           sdist_digest(package_path),
+                                           wheel_name)
+                if op.exists(final_wheel_path):
+                    print(colored('okgreen', '  %s already built, skipped'
+                                  % final_wheel_path), file=sys.stderr)
+                    continue
+                else:
+                    print(colored('okblue', '  %s not found, rebuilding' %
+                                  final_wheel_path), file=sys.stderr)
+            to_build.append(package_path)
+        if to_build:
+            print('Building %s wheels (%s jobs)...' %
+                  (len(to_build), build_jobs), file=sys.stderr)
+            if build_logs_dir is None:
+                build_logs_dir = create_work_dir()
+            elif not op.exists(build_logs_dir):
+                os.makedirs(build_logs_dir)
+            # Source packages were hashed when placed in the collect dir
+            digests = None
+            if wheel_cache is not None:
+                digests = dict((p, sdist_digest(p)) for p in to_build)
+            with tracer.span('build wheels'):
+                wheels, failures = build_wheels_pool(
+                    pip_bin, to_build, build_jobs, build_logs_dir,
+                    wheel_cache, staging_dir,
+                    place_built_wheel if wheel_manifest is not None else None,
+                    digests)
+            if failures:
+                print(file=sys.stderr)
+                print('Failed to build wheels for:', file=sys.stderr)
+                for package_path in sorted(failures):
+                    print('  - %s' % op.basename(package_path),
+                          file=sys.stderr)
+                    with open(failures[package_path]) as fp:
+                        for line in fp:
+                            print('    %s' % line.rstrip(), file=sys.stderr)
+                sys.exit(1)
+            if wheel_cache is not None:
+                with tracer.span('wheel cache'):
+                    wheel_cache.evict()
+        print(file=sys.stderr)
 
     # Move packages to their final destination
     packages = [op.join(packages_collect_dir, p)
                 for p in os.listdir(packages_collect_dir)]
     if output_dir and packages:
         print('Moving packages to their final destination...', file=sys.stderr)
+        placements = collections.defaultdict(list)
         for package in packages:
-            distro = likely_distro(package)
-            dst_dir = op.join(output_dir, canonicalize_distro_name(distro.key))
-            if not op.exists(dst_dir):
-                os.makedirs(dst_dir)
-            move_forced(package, dst_dir)
-            if build_wheels and package in wheels:
-                move_forced(wheels[package], dst_dir)
+            distro = parse_package_filename(package)
+            dst_dir = op.join(output_dir, distro.canonical_name)
+            placements[dst_dir].append(package)
+            placed_projects.add(distro.canonical_name)
+            # Wheels recorded in the manifest were placed once built
+            if build_wheels and package in wheels and wheel_manifest is None:
+                placements[dst_dir].append(wheels[package])
+        with tracer.span('place packages'):
+            for dst_dir, paths in sorted(placements.items()):
+                place_files(paths, dst_dir, placement_stats, hash_cache)
+        print('Placed %s files (%s renamed, %s copied from another '
+              'filesystem: %s)' % (
+                  placement_stats['renamed'] + placement_stats['copied'],
+                  placement_stats['renamed'], placement_stats['copied'],
+                  format_size(placement_stats['copied_bytes'])),
+              file=sys.stderr)
         print(file=sys.stderr)
+    if hash_cache is not None:
+        hash_cache.commit()
 
-    # Commit cache
-    for filename, contents in cache_updates.items():
-        with open(filename, 'w') as fp:
-            fp.write(contents)
+    # Record the wheels found already built in the output directory
+    if wheel_manifest is not None:
+        wheel_manifest.save()
 
-    # Group packages by distribution key and sort them by version
-    grouped_packages = group_and_select_packages(requirements_packages)
-    if check_versions_conflicts:
-        errors = []
-        deps_cache_paths = set()
-        for distro, versions in grouped_packages.items():
-            if len(versions) > 1:
-                lines = ['  - %s:' % distro]
-                lines.extend(
-                    '    - %s==%s coming from %s' %
-                    (distro, version, ', '.join(requirements))
-                    for version, requirements in versions
-                )
-                errors.append('\n'.join(lines))
-                deps_cache_paths.update(deps_cache_map[distro])
-        if errors:
-            print('Found versions conflicts:', file=sys.stderr)
-            print('\n'.join(errors), file=sys.stderr)
-            raise VersionsConflicts(deps_cache_paths)
+    if simple_index is not None:
+        update_simple_index(simple_index, placed_projects)
+        print(file=sys.stderr)
+
+    # Commit cache
+    commit_cache()
 
     return requirements_packages, grouped_packages
 
 
-def format_requirements(fp, packages_groups, grouped_packages,
-                        excluded_packages, output_index_url,
-                        output_find_links, ext_wheels_lines,
-                        loose_packages=set()):
-    fp.write('# This file has been automatically generated, DO NOT EDIT!\n')
-    fp.write('\n')
-    if output_index_url:
-        fp.write('--index-url %s\n' % output_index_url, )
-        fp.write('\n')
-    for find_links in output_find_links:
-        fp.write('--find-links %s\n' % find_links, )
-        fp.write('\n')
-    seen = set()
-    for requirements_file, packages in packages_groups:
-        fp.write('# Frozen requirements for "%s"\n' % requirements_file)
-        fp.write('\n')
-        distros = [likely_distro(p) for p in packages]
-        for distro in sorted(distros, key=lambda d: d.key):
-            if (distro.key in seen or
-                    distro.key in excluded_packages or
-                    '%s:%s' % (requirements_file, distro.key) in
-                    excluded_packages):
+def update_simple_index(simple_index, projects):
+    '''
+    Update the pages of *projects* in the :class:`SimpleIndex`
+    *simple_index*, exiting if the index can't be written.
+    '''
+    with tracer.span('simple index'):
+        try:
+            updated_projects = simple_index.update(projects)
+        except ValueError as exc:
+            print('Can\'t update the simple index: %s' % exc, file=sys.stderr)
+            sys.exit(1)
+    print('Updated the simple index pages of %s projects' %
+          len(updated_projects), file=sys.stderr)
+
+
+def report_packages(report):
+    '''
+    Return the filenames of the packages selected in the pip installation
+    *report*, as pip download would save them.
+    '''
+    import urllib.parse
+
+    packages = []
+    for item in report['install']:
+        download_info = item['download_info']
+        if 'archive_info' in download_info:
+            path = urllib.parse.urlsplit(download_info['url']).path
+            packages.append(urllib.parse.unquote(path.rsplit('/', 1)[-1]))
+        else:
+            # pip download saves VCS checkouts and directories as zip files
+            packages.append('%s-%s.zip' % (item['metadata']['name'],
+                                           item['metadata']['version']))
+    return packages
+
+
+def split_report_packages(report, requirements):
+    '''
+    Split the packages of the pip installation *report* of a whole
+    requirements file between its *requirements* (a list of
+    :class:`RequirementLine`), following the dependencies in the metadata of
+    packages.
+
+    Return a list with the packages needed by each requirement, named like
+    :func:`report_packages` does, or None if a requirement matches no package
+    of *report*.
+    '''
+    from packaging.requirements import Requirement
+    from packaging.utils import canonicalize_name
+
+    items = {}
+    for item, package in zip(report['install'], report_packages(report)):
+        items[canonicalize_name(item['metadata']['name'])] = item, package
+    split = []
+    for line in requirements:
+        requirement = Requirement(line.line)
+        if requirement.marker and \
+                not requirement.marker.evaluate({'extra': ''}):
+            split.append([])
+            continue
+        if line.canonical_name not in items:
+            return None
+        packages = []
+        seen = set()
+        pending = [(line.canonical_name, requirement.extras)]
+        while pending:
+            name, extras = pending.pop()
+            if (name, frozenset(extras)) in seen or name not in items:
+                # Already followed, or excluded by markers
                 continue
-            seen.add(distro.key)
-            versions = grouped_packages[distro.key]
-            if distro.key not in loose_packages:
-                line = '%s==%s' % (distro.key, versions[-1][0])
-            else:
-                line = distro.key
-            fp.write('%s\n' % line)
-        for line in ext_wheels_lines[requirements_file]:
-            req = InstallRequirement.from_line(line)
-            if req.name in loose_packages:
-                fp.write('%s\n' % req.name)
-            else:
-                fp.write('%s\n' % line.strip())
-        fp.write('\n')
+            seen.add((name, frozenset(extras)))
+            item, package = items[name]
+            if package not in packages:
+                packages.append(package)
+            for spec in item['metadata'].get('requires_dist') or []:
+                dependency = Requirement(spec)
+                if dependency.marker and not any(
+                        dependency.marker.evaluate({'extra': extra})
+                        for extra in sorted(extras) or ['']):
+                    continue
+                pending.append((canonicalize_name(dependency.name),
+                                dependency.extras))
+        split.append(packages)
+    return split
 
 
-@click.command()
+def packages_hashes(output_dir, grouped_packages, hash_cache):
+    '''
+    Get the digests of the files of the selected version of
+    *grouped_packages* in *output_dir*, using *hash_cache*.
+
+    Return a dict mapping packages keys to lists of digests, without the
+    packages having no file in *output_dir*.
+    '''
+    hashes = collections.defaultdict(list)
+    for key, versions in grouped_packages.items():
+        version = versions[-1][0]
+        canonical_name = canonicalize_distro_name(key)
+        package_dir = op.join(output_dir, canonical_name)
+        if not op.isdir(package_dir):
+            continue
+        for filename in sorted(os.listdir(package_dir)):
+            try:
+                distro = parse_package_filename(filename)
+            except ValueError:
+                continue
+            # Wheels have normalized names, unlike some source packages
+            if (distro.canonical_name == canonical_name and
+                    distro.version == version):
+                hashes[key].append(
+                    hash_cache.hash(op.join(package_dir, filename)))
+    return hashes
+
+
+def find_versions_conflicts(grouped_packages, resolved, requirements_files):
+    '''
+    Find the distributions having multiple versions in *grouped_packages*.
+
+    Return a list of error messages, and the set of dependencies cache keys
+    of the cached entries in *resolved* that contain the conflicting
+    distributions.
+    '''
+    # Map distro names to the cache keys of the cached entries containing
+    # them; the entries of the requirements of cached files are stale too
+    deps_cache_map = collections.defaultdict(set)
+    for reqs_file, file_resolved in zip(requirements_files, resolved):
+        for key, dependencies, temp_dir in file_resolved:
+            if temp_dir is not None:
+                continue
+            keys = [key]
+            if key == reqs_file.cache_key():
+                keys.extend(reqs_file.cache_key(line)
+                            for line in reqs_file.requirements)
+            for pkg_filename in dependencies:
+                pkg_name = parse_package_filename(pkg_filename).key
+                deps_cache_map[pkg_name].update(keys)
+    errors = []
+    cache_keys = set()
+    for distro, versions in sorted(grouped_packages.items()):
+        if len(versions) > 1:
+            lines = ['  - %s:' % distro]
+            lines.extend(
+                '    - %s==%s coming from %s' %
+                (distro, version, ', '.join(requirements))
+                for version, requirements in versions
+            )
+            errors.append('\n'.join(lines))
+            cache_keys.update(deps_cache_map[distro])
+    return errors, cache_keys
+
+
+@click.group()
+def cache():
+    '''
+    Inspect and manage the caches: the dependencies cache, and the wheels
+    cache for "cache stats".
+    '''
+
+
+@cache.command()
+def stats():
+    '''
+    Print dependencies and wheels cache statistics.
+    '''
+    dependencies_cache = open_dependencies_cache()
+    stats = dependencies_cache.stats()
+    lookups = stats['hits'] + stats['misses']
+    print('Dependencies cache: %s' % dependencies_cache.path)
+    print('  Entries: %s (%s)' % (stats['entries'],
+                                  format_size(stats['size'])))
+    print('  Hits: %s, misses: %s (%.1f%% hit rate)' % (
+        stats['hits'], stats['misses'],
+        100.0 * stats['hits'] / lookups if lookups else 0))
+    if stats['entries']:
+        print('  Least recently used: %s' %
+              format_time(stats['oldest_access']))
+        print('  Most recently used: %s' %
+              format_time(stats['latest_access']))
+    legacy_entries = legacy_cache_entries()
+    if legacy_entries:
+        print('  Legacy entries: %s (remove them with "cache prune")' %
+              len(legacy_entries))
+    wheel_cache = WheelCache(op.join(cache_dir(), 'wheels'), None)
+    wheels = wheel_cache.entries()
+    print('Wheels cache: %s' % wheel_cache.path)
+    print('  Entries: %s (%s)' % (
+        len(wheels), format_size(sum(size for _, size, _ in wheels))))
+
+
+@cache.command()
+@click.option('--max-size', type=SizeType(), metavar='SIZE',
+              help='Remove least recently used entries until the cache '
+              'fits in SIZE')
+@click.option('--max-age', type=DurationType(), metavar='DURATION',
+              help='Remove entries not used since DURATION (e.g. 30d, 12h); '
+              'durations without unit are in days')
+def prune(max_size, max_age):
+    '''
+    Remove entries from the dependencies cache.
+    '''
+    dependencies_cache = open_dependencies_cache()
+    removed, freed = dependencies_cache.prune(max_size, max_age)
+    print('Removed %s entries (%s)' % (removed, format_size(freed)))
+    legacy_entries = legacy_cache_entries()
+    for path in legacy_entries:
+        os.unlink(path)
+    if legacy_entries:
+        print('Removed %s legacy entries' % len(legacy_entries))
+
+
+@cache.command()
+@click.option('--repair/--no-repair', default=False,
+              help='Remove invalid entries, and reset the cache if it is '
+              'corrupted')
+def verify(repair):
+    '''
+    Check the dependencies cache for invalid entries.
+    '''
+    dependencies_cache = open_dependencies_cache()
+    try:
+        errors = dependencies_cache.verify(repair)
+    except sqlite3.DatabaseError as exc:
+        print('%s is corrupted: %s' % (dependencies_cache.path, exc),
+              file=sys.stderr)
+        if not repair:
+            sys.exit(1)
+        dependencies_cache.close()
+        os.unlink(dependencies_cache.path)
+        print('Removed %s' % dependencies_cache.path, file=sys.stderr)
+        return
+    for key, error in errors:
+        print('%s: %s' % (key, error), file=sys.stderr)
+    if errors and not repair:
+        print('Found %s invalid entries, use --repair to remove them' %
+              len(errors), file=sys.stderr)
+        sys.exit(1)
+    if errors:
+        print('Removed %s invalid entries' % len(errors), file=sys.stderr)
+    else:
+        print('No errors found', file=sys.stderr)
+
+
+@cache.command(name='export')
+@click.argument('output', type=click.File(mode='w'))
+def export_cache(output):
+    '''
+    Export the dependencies cache to OUTPUT, as JSON lines.
+    '''
+    dependencies_cache = open_dependencies_cache()
+    count = 0
+    for key, packages, created, last_access, hits in \
+            dependencies_cache.entries():
+        output.write('%s\n' % json.dumps({
+            'key': key,
+            'packages': json.loads(packages),
+            'created': created,
+            'last_access': last_access,
+            'hits': hits,
+        }, sort_keys=True))
+        count += 1
+    print('Exported %s entries' % count, file=sys.stderr)
+
+
+@cache.command(name='import')
+@click.argument('input', type=click.File(mode='r'))
+def import_cache(input):
+    '''
+    Import entries exported with "cache export" from INPUT.
+    '''
+    entries = []
+    for lineno, line in enumerate(input, 1):
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+            entries.append((entry['key'], entry['packages'],
+                            entry.get('created'), entry.get('last_access'),
+                            entry.get('hits', 0)))
+        except (ValueError, KeyError, TypeError):
+            print('%s:%s: invalid entry' % (input.name, lineno),
+                  file=sys.stderr)
+            sys.exit(1)
+    dependencies_cache = open_dependencies_cache()
+    for key, packages, created, last_access, hits in entries:
+        dependencies_cache.set(key, packages, created, last_access, hits)
+    dependencies_cache.commit()
+    print('Imported %s entries' % len(entries), file=sys.stderr)
+
+
+@cache.command()
 @click.argument('requirements', nargs=-1)
-def cache_infos(requirements):
+def infos(requirements):
     '''
     Print cache information for the given list of requirements.
     '''
+    from .requirements import parse_requirements_file
+    dependencies_cache = open_dependencies_cache()
     for req in requirements:
-        req_cache = cache_path(req)
-        if not op.exists(req_cache):
-            req_cache = 'not cached'
-        print('%s %s' % (req, req_cache))
+        reqs_file = parse_requirements_file(req)
+        if dependencies_cache.contains(reqs_file.cache_key()):
+            status = 'cached (%s)' % reqs_file.cache_key()
+        else:
+            cached_count = sum(
+                dependencies_cache.contains(reqs_file.cache_key(line))
+                for line in reqs_file.requirements
+            )
+            if cached_count:
+                status = '%s of %s requirements cached' % (
+                    cached_count, len(reqs_file.requirements))
+            else:
+                status = 'not cached'
+        print('%s %s' % (req, status))
+
+
+@click.command(hidden=True)
+@click.argument('requirements', nargs=-1)
+@click.pass_context
+def cache_infos(ctx, requirements):
+    '''
+    Deprecated alias of "cache infos".
+    '''
+    ctx.invoke(infos, requirements=requirements)
+
+
+def legacy_cache_entries():
+    '''
+    List the entries of the JSON files dependencies cache used by older
+    versions.
+    '''
+    directory = cache_dir()
+    if not op.isdir(directory):
+        return []
+    return [op.join(directory, f) for f in os.listdir(directory)
+            if re.match(r'^[0-9a-f]{40}$', f)]
+
+
+def format_time(timestamp):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
 
 
 main.add_command(freeze)
+main.add_command(watch)
+main.add_command(cache)
 main.add_command(cache_infos)
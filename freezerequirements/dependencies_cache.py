@@ -0,0 +1,202 @@
+import json
+import os
+import os.path as op
+import sqlite3
+import time
+
+from .filenames import parse_package_filename
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    packages TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_access REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+'''
+
+
+class DependenciesCache(object):
+    '''
+    Stores the packages resolved for requirements files and requirements, in
+    a SQLite database at *path*.
+
+    Keys are given by :meth:`RequirementsFile.cache_key
+    <freezerequirements.requirements.RequirementsFile.cache_key>`. Each entry
+    records its size, creation and last access times and number of hits, and
+    the cache counts hits and misses, so it can be inspected and pruned with
+    the ``freeze-requirements cache`` commands.
+
+    Changes are grouped in a transaction until :meth:`commit` is called.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = None
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            directory = op.dirname(self.path)
+            if directory and not op.exists(directory):
+                os.makedirs(directory)
+            self._connection = sqlite3.connect(self.path, timeout=60,
+                                               check_same_thread=False)
+            self._connection.executescript(SCHEMA)
+        return self._connection
+
+    def commit(self):
+        if self._connection is not None:
+            self._connection.commit()
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.commit()
+            self._connection.close()
+            self._connection = None
+
+    def _count(self, name):
+        self.connection.execute(
+            'INSERT OR IGNORE INTO counters (name, value) VALUES (?, 0)',
+            (name,)
+        )
+        self.connection.execute(
+            'UPDATE counters SET value = value + 1 WHERE name = ?', (name,))
+
+    def get(self, key):
+        '''
+        Get the packages stored for *key*, or None if there are none.
+        '''
+        row = self.connection.execute(
+            'SELECT packages FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self._count('misses')
+            return None
+        self._count('hits')
+        self.connection.execute(
+            'UPDATE entries SET last_access = ?, hits = hits + 1 '
+            'WHERE key = ?', (time.time(), key)
+        )
+        return json.loads(row[0])
+
+    def contains(self, key):
+        '''
+        Test if *key* is in the cache, without counting it as an access.
+        '''
+        return self.connection.execute(
+            'SELECT 1 FROM entries WHERE key = ?', (key,)).fetchone() \
+            is not None
+
+    def set(self, key, packages, created=None, last_access=None, hits=0):
+        now = time.time()
+        packages = json.dumps(packages)
+        self.connection.execute(
+            'INSERT OR REPLACE INTO entries '
+            '(key, packages, size, created, last_access, hits) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (key, packages, len(key) + len(packages), created or now,
+             last_access or now, hits)
+        )
+
+    def delete(self, key):
+        self.connection.execute('DELETE FROM entries WHERE key = ?', (key,))
+
+    def entries(self):
+        '''
+        Iterate over ``(key, packages, created, last_access, hits)`` tuples
+        for all entries, least recently used first.
+        '''
+        cursor = self.connection.execute(
+            'SELECT key, packages, created, last_access, hits FROM entries '
+            'ORDER BY last_access, key'
+        )
+        for key, packages, created, last_access, hits in cursor:
+            yield key, packages, created, last_access, hits
+
+    def stats(self):
+        '''
+        Return a dict with the number of entries, their total size, the
+        oldest and latest access times, and the hits and misses counts.
+        '''
+        count, size, oldest, latest = self.connection.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0), MIN(last_access), '
+            'MAX(last_access) FROM entries'
+        ).fetchone()
+        ret = {
+            'entries': count,
+            'size': size,
+            'oldest_access': oldest,
+            'latest_access': latest,
+            'hits': 0,
+            'misses': 0,
+        }
+        ret.update(self.connection.execute(
+            'SELECT name, value FROM counters').fetchall())
+        return ret
+
+    def prune(self, max_size=None, max_age=None):
+        '''
+        Remove the entries not accessed in the last *max_age* seconds, then
+        the least recently used entries until the cache fits in *max_size*
+        bytes.
+
+        Return a ``(removed entries count, freed bytes)`` tuple.
+        '''
+        removed = []
+        if max_age is not None:
+            removed.extend(self.connection.execute(
+                'SELECT key, size FROM entries WHERE last_access < ?',
+                (time.time() - max_age,)
+            ).fetchall())
+            self.connection.executemany('DELETE FROM entries WHERE key = ?',
+                                        [(key,) for key, _ in removed])
+        if max_size is not None:
+            total_size = self.stats()['size']
+            cursor = self.connection.execute(
+                'SELECT key, size FROM entries ORDER BY last_access, key')
+            to_remove = []
+            for key, size in cursor:
+                if total_size <= max_size:
+                    break
+                to_remove.append((key, size))
+                total_size -= size
+            self.connection.executemany('DELETE FROM entries WHERE key = ?',
+                                        [(key,) for key, _ in to_remove])
+            removed.extend(to_remove)
+        self.commit()
+        return len(removed), sum(size for _, size in removed)
+
+    def verify(self, repair=False):
+        '''
+        Check the database integrity and the contents of all entries.
+
+        Return a list of ``(key, error message)`` tuples for invalid entries,
+        and delete them if *repair* is true. Raise :class:`sqlite3.Error` if
+        the database itself is corrupted.
+        '''
+        result = self.connection.execute('PRAGMA integrity_check').fetchone()
+        if result[0] != 'ok':
+            raise sqlite3.DatabaseError(result[0])
+        errors = []
+        for key, packages, _, _, _ in list(self.entries()):
+            try:
+                packages = json.loads(packages)
+                if not isinstance(packages, list):
+                    raise ValueError('not a list of packages')
+                for package in packages:
+                    parse_package_filename(package)
+            except (ValueError, TypeError) as exc:
+                errors.append((key, str(exc)))
+        if repair:
+            self.connection.executemany('DELETE FROM entries WHERE key = ?',
+                                        [(key,) for key, _ in errors])
+            self.commit()
+        return errors
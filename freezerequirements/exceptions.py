@@ -5,5 +5,35 @@ class FreezeRequirementsError(Exception):
 
 class VersionsConflicts(FreezeRequirementsError):
 
-    def __init__(self, reqs_cache_paths):
-        self.reqs_cache_paths = reqs_cache_paths
+    def __init__(self, cache_keys):
+        self.cache_keys = cache_keys
+
+
+class WheelBuildError(FreezeRequirementsError):
+
+    def __init__(self, source_archive, log_path=None):
+        super(WheelBuildError, self).__init__(source_archive, log_path)
+        self.source_archive = source_archive
+        self.log_path = log_path
+
+
+class PipError(FreezeRequirementsError):
+    '''
+    Raised when a pip command run by a pip worker fails.
+
+    Like :class:`sh.ErrorReturnCode`, it has *stdout* and *stderr*
+    attributes holding the output of the command.
+    '''
+
+    def __init__(self, command_args, returncode, stdout, stderr):
+        super(PipError, self).__init__(command_args, returncode, stdout,
+                                       stderr)
+        self.command_args = command_args
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+
+    def __str__(self):
+        return 'pip %s exited with code %s' % (' '.join(self.command_args),
+                                               self.returncode)
+
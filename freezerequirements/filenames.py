@@ -0,0 +1,93 @@
+'''
+Fast parsing of source and wheel package filenames.
+'''
+import os.path as op
+import re
+import string
+from functools import lru_cache
+
+from .archive import ARCHIVE_FORMATS
+
+
+SDIST_EXTENSIONS = tuple(e for e, _, _ in ARCHIVE_FORMATS if e != '.whl')
+_unsafe_name_regex = re.compile(r'[^A-Za-z0-9.]+')
+_canonicalize_regex = re.compile(r'[-_.]+')
+
+
+def safe_version(version):
+    '''
+    Normalize *version* if it is a valid PEP 440 version, or replace runs of
+    characters other than alphanumerics and dots by dashes, like setuptools
+    does.
+    '''
+    # Imported on first use, as cli imports this module at startup
+    from packaging.version import Version, InvalidVersion
+
+    try:
+        return str(Version(version.replace(' ', '.')))
+    except InvalidVersion:
+        return _unsafe_name_regex.sub('-', version)
+
+
+class PackageFilename(object):
+    '''
+    The name and version of a package, parsed from its filename.
+
+    *key* is the distribution key, as returned by setuptools (lowercase,
+    runs of characters other than alphanumerics and dots replaced by dashes),
+    *canonical_name* the name normalized according to PEP 503, and *kind*
+    either ``'sdist'`` or ``'wheel'``.
+    '''
+
+    __slots__ = ('filename', 'key', 'canonical_name', 'version', 'kind')
+
+    def __init__(self, filename, key, canonical_name, version, kind):
+        self.filename = filename
+        self.key = key
+        self.canonical_name = canonical_name
+        self.version = version
+        self.kind = kind
+
+    def __repr__(self):
+        return '<PackageFilename %s %s %s>' % (self.kind, self.key,
+                                               self.version)
+
+
+@lru_cache(maxsize=65536)
+def parse_package_filename(filename):
+    '''
+    Parse a source or wheel package *filename* (or path).
+
+    For source packages, the version starts at the first dash-separated part
+    of the filename that starts with a digit, like
+    :func:`freezerequirements.utils.likely_distro` does. Versions are
+    normalized with :func:`safe_version`. Raise
+    :class:`ValueError` if there is no such part or if *filename* has an
+    unknown extension.
+    '''
+    basename = op.basename(filename)
+    lower_basename = basename.lower()
+    if lower_basename.endswith('.whl'):
+        parts = basename[:-4].split('-')
+        if len(parts) not in (5, 6):
+            raise ValueError("can't find distro for %s" % filename)
+        name, version = parts[0], safe_version(parts[1].replace('_', '-'))
+        kind = 'wheel'
+    else:
+        for ext in SDIST_EXTENSIONS:
+            if lower_basename.endswith(ext):
+                break
+        else:
+            raise ValueError("can't find distro for %s" % filename)
+        parts = basename[:-len(ext)].split('-')
+        for i, part in enumerate(parts[1:], 1):
+            if part and part[0] in string.digits:
+                break
+        else:
+            raise ValueError("can't find distro for %s" % filename)
+        name = '-'.join(parts[:i])
+        version = safe_version('-'.join(parts[i:]))
+        kind = 'sdist'
+    key = _unsafe_name_regex.sub('-', name).lower()
+    canonical_name = _canonicalize_regex.sub('-', name).lower()
+    return PackageFilename(filename, key, canonical_name, version, kind)
@@ -0,0 +1,99 @@
+import os
+import os.path as op
+import sqlite3
+
+from .tracing import tracer, PACKAGE
+from .utils import file_sha256
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+'''
+
+
+class HashCache(object):
+    '''
+    Stores the sha256 digests of files, in a SQLite database at *path*.
+
+    Entries are keyed by the absolute path, size and modification time of
+    files, so a file is only read again when it changes.
+
+    Changes are grouped in a transaction until :meth:`commit` is called.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = None
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            directory = op.dirname(self.path)
+            if directory and not op.exists(directory):
+                os.makedirs(directory)
+            self._connection = sqlite3.connect(self.path, timeout=60,
+                                               check_same_thread=False)
+            self._connection.executescript(SCHEMA)
+        return self._connection
+
+    def commit(self):
+        if self._connection is not None:
+            self._connection.commit()
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.commit()
+            self._connection.close()
+            self._connection = None
+
+    def get(self, path):
+        '''
+        Get the digest of the file at *path*, or None if it is not in the
+        cache or if the file changed.
+        '''
+        stat = os.stat(path)
+        row = self.connection.execute(
+            'SELECT sha256 FROM hashes WHERE path = ? AND size = ? AND '
+            'mtime = ?', (op.abspath(path), stat.st_size, stat.st_mtime_ns)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def set(self, path, digest):
+        '''
+        Store *digest*, the sha256 digest of the current contents of the file
+        at *path*.
+        '''
+        stat = os.stat(path)
+        self.connection.execute(
+            'INSERT OR REPLACE INTO hashes (path, size, mtime, sha256) '
+            'VALUES (?, ?, ?, ?)',
+            (op.abspath(path), stat.st_size, stat.st_mtime_ns, digest)
+        )
+
+    def rename(self, path, new_path):
+        '''
+        Move the entry of the file at *path*, if any, to *new_path*, after
+        the file was renamed.
+        '''
+        new_path = op.abspath(new_path)
+        self.connection.execute('DELETE FROM hashes WHERE path = ?',
+                                (new_path,))
+        self.connection.execute('UPDATE hashes SET path = ? WHERE path = ?',
+                                (new_path, op.abspath(path)))
+
+    def hash(self, path):
+        '''
+        Get the digest of the file at *path*, computing it if it's not in
+        the cache.
+        '''
+        digest = self.get(path)
+        if digest is None:
+            with tracer.span('sha256', PACKAGE, package=op.basename(path)):
+                digest = file_sha256(path)
+            self.set(path, digest)
+        return digest
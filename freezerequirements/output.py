@@ -0,0 +1,259 @@
+'''
+Output of frozen requirements.
+
+The resolved packages are first gathered in a :class:`FrozenRequirements`
+model, then written to all the output targets in a single pass with
+:func:`write_outputs`.
+'''
+import json
+
+from .filenames import parse_package_filename
+from .requirements import requirement_name
+
+
+HEADER = '# This file has been automatically generated, DO NOT EDIT!\n'
+
+
+class FrozenPackage(object):
+    '''
+    A package selected for the frozen requirements.
+
+    *key* is the distribution key written in requirements files, *version*
+    the selected (highest) version, and *origins* the requirements files
+    that require this version. *hashes* are the sha256 digests of the
+    package files (source package and wheels), if known.
+    '''
+
+    __slots__ = ('key', 'canonical_name', 'version', 'origins', 'hashes')
+
+    def __init__(self, key, canonical_name, version, origins, hashes=()):
+        self.key = key
+        self.canonical_name = canonical_name
+        self.version = version
+        self.origins = origins
+        self.hashes = list(hashes)
+
+    def __repr__(self):
+        return '<FrozenPackage %s==%s>' % (self.key, self.version)
+
+
+class FrozenRequirementsFile(object):
+    '''
+    The frozen requirements of a requirements file: its :class:`FrozenPackage`
+    objects sorted by key, without excluded packages, and the ``(canonical
+    name, original line)`` tuples of its external wheels requirements.
+    '''
+
+    __slots__ = ('path', 'packages', 'ext_wheels')
+
+    def __init__(self, path, packages, ext_wheels):
+        self.path = path
+        self.packages = packages
+        self.ext_wheels = ext_wheels
+
+
+class FrozenRequirements(object):
+    '''
+    The frozen requirements of all requirements files, built from the
+    results of :func:`freezerequirements.cli.collect_packages`.
+
+    *files* is a list of :class:`FrozenRequirementsFile`, in requirements
+    files order. *hashes* maps packages keys to the digests of their files.
+    '''
+
+    def __init__(self, requirements_packages, grouped_packages, exclusions,
+                 ext_wheels_lines, hashes=None):
+        hashes = hashes or {}
+        packages = {}
+        self.files = []
+        for requirements_file, filenames in requirements_packages:
+            file_packages = {}
+            for filename in filenames:
+                distro = parse_package_filename(filename)
+                if distro.key in file_packages:
+                    continue
+                if exclusions.is_excluded(distro.canonical_name,
+                                          requirements_file):
+                    continue
+                if distro.key not in packages:
+                    version, origins = grouped_packages[distro.key][-1]
+                    packages[distro.key] = FrozenPackage(
+                        distro.key, distro.canonical_name, version,
+                        list(origins), sorted(hashes.get(distro.key, ())))
+                file_packages[distro.key] = packages[distro.key]
+            self.files.append(FrozenRequirementsFile(
+                requirements_file,
+                [file_packages[k] for k in sorted(file_packages)],
+                [(requirement_name(line), line)
+                 for line in ext_wheels_lines.get(requirements_file, ())]
+            ))
+
+
+class RequirementsTarget(object):
+    '''
+    A frozen requirements file output.
+
+    *output* is a path or a file object. The requirements of *files* (all
+    files if None) are written to it, each package only once.
+    *loose_packages* are canonical names of packages written without version.
+    Packages hashes are written as ``--hash`` options, making the file usable
+    with pip's hash-checking mode.
+    '''
+
+    def __init__(self, output, files=None, index_url=None, find_links=(),
+                 loose_packages=frozenset()):
+        self.output = output
+        self.files = None if files is None else set(files)
+        self.index_url = index_url
+        self.find_links = find_links
+        self.loose_packages = loose_packages
+        self._fp = None
+        self._seen = set()
+
+    @property
+    def name(self):
+        return getattr(self.output, 'name', self.output)
+
+    @property
+    def single_file(self):
+        return self.files is not None and len(self.files) == 1
+
+    def accepts(self, frozen_file):
+        return self.files is None or frozen_file.path in self.files
+
+    def start(self):
+        if hasattr(self.output, 'write'):
+            self._fp = self.output
+        else:
+            self._fp = open(self.output, 'w')
+        self._fp.write(HEADER)
+        self._fp.write('\n')
+        if self.index_url:
+            self._fp.write('--index-url %s\n' % self.index_url)
+            self._fp.write('\n')
+        for find_links in self.find_links:
+            self._fp.write('--find-links %s\n' % find_links)
+            self._fp.write('\n')
+
+    def write_file(self, frozen_file):
+        fp = self._fp
+        fp.write('# Frozen requirements for "%s"\n' % frozen_file.path)
+        fp.write('\n')
+        for package in frozen_file.packages:
+            if package.key in self._seen:
+                continue
+            self._seen.add(package.key)
+            if package.canonical_name in self.loose_packages:
+                fp.write('%s\n' % package.key)
+            elif package.hashes:
+                fp.write('%s==%s \\\n' % (package.key, package.version))
+                hash_lines = ['    --hash=sha256:%s' % digest
+                              for digest in package.hashes]
+                fp.write(' \\\n'.join(hash_lines) + '\n')
+            else:
+                fp.write('%s==%s\n' % (package.key, package.version))
+        for name, line in frozen_file.ext_wheels:
+            if name in self.loose_packages:
+                fp.write('%s\n' % name)
+            else:
+                fp.write('%s\n' % line)
+        fp.write('\n')
+
+    def finish(self):
+        if self._fp is not self.output:
+            self._fp.close()
+        else:
+            self._fp.flush()
+        self._fp = None
+
+
+class LockfileTarget(object):
+    '''
+    A JSON lockfile output, listing the frozen packages of each requirements
+    file, and the version and origins of all packages::
+
+        {
+            "requirements": {
+                "requirements.txt": {
+                    "packages": [{"name": "six", "version": "1.16.0"}],
+                    "ext_wheels": []
+                }
+            },
+            "packages": {
+                "six": {
+                    "version": "1.16.0",
+                    "origins": ["requirements.txt"],
+                    "hashes": ["sha256:8abb2f1d..."]
+                }
+            }
+        }
+
+    *output* is a path or a file object.
+    '''
+
+    def __init__(self, output):
+        self.output = output
+        self._data = None
+
+    @property
+    def name(self):
+        return getattr(self.output, 'name', self.output)
+
+    single_file = False
+
+    def accepts(self, frozen_file):
+        return True
+
+    def start(self):
+        self._data = {'requirements': {}, 'packages': {}}
+
+    def write_file(self, frozen_file):
+        self._data['requirements'][frozen_file.path] = {
+            'packages': [{'name': p.key, 'version': p.version}
+                         for p in frozen_file.packages],
+            'ext_wheels': [line for _, line in frozen_file.ext_wheels],
+        }
+        for package in frozen_file.packages:
+            self._data['packages'][package.key] = {
+                'version': package.version,
+                'origins': package.origins,
+                'hashes': ['sha256:%s' % d for d in package.hashes],
+            }
+
+    def finish(self):
+        contents = json.dumps(self._data, indent=2, sort_keys=True) + '\n'
+        if hasattr(self.output, 'write'):
+            self.output.write(contents)
+            self.output.flush()
+        else:
+            with open(self.output, 'w') as fp:
+                fp.write(contents)
+        self._data = None
+
+
+def write_outputs(frozen_requirements, targets):
+    '''
+    Write *frozen_requirements* to all *targets* in a single pass over the
+    requirements files.
+
+    Targets of a single requirements file are only opened while their file
+    is written, so separate requirements of thousands of files don't exhaust
+    file descriptors.
+    '''
+    shared_targets = [t for t in targets if not t.single_file]
+    for target in shared_targets:
+        target.start()
+    for frozen_file in frozen_requirements.files:
+        for target in targets:
+            if not target.accepts(frozen_file):
+                continue
+            if target.single_file:
+                target.start()
+                try:
+                    target.write_file(frozen_file)
+                finally:
+                    target.finish()
+            else:
+                target.write_file(frozen_file)
+    for target in shared_targets:
+        target.finish()
@@ -0,0 +1,253 @@
+'''
+Long-lived pip processes, running pip commands in-process.
+
+A worker is started with the interpreter running the pip executable, and
+reads JSON requests from its standard input, one per line::
+
+    {"args": ["download", "six"], "cwd": "/path/to/dir"}
+
+For each request, it runs pip's main function and writes a JSON response on
+a line of its standard output::
+
+    {"returncode": 0, "stdout": "...", "stderr": "..."}
+
+This saves the interpreter startup and pip imports for each command, and
+lets commands share HTTP sessions when their options allow it.
+
+The worker side only depends on the standard library and pip, as it runs with
+the pip's interpreter.
+'''
+import io
+import os
+import os.path as op
+import sys
+import json
+import queue
+import threading
+import traceback
+import subprocess
+
+from .exceptions import PipError
+
+
+class PipWorker(object):
+    '''
+    A pip worker process, running pip commands one at a time.
+    '''
+
+    def __init__(self, pip_bin):
+        # Imported here to keep the worker side free of our dependencies
+        from .utils import pip_interpreter
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(
+            p for p in [op.dirname(op.dirname(op.abspath(__file__))),
+                        env.get('PYTHONPATH')] if p
+        )
+        self.process = subprocess.Popen(
+            [pip_interpreter(pip_bin), '-m', 'freezerequirements.pipworker'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env,
+            universal_newlines=True
+        )
+
+    def run(self, args, cwd=None):
+        '''
+        Run pip with *args* in *cwd* (the current directory by default), and
+        return its standard output.
+
+        Raise :class:`PipError` if the command fails or if the worker
+        died.
+        '''
+        request = {'args': list(args), 'cwd': cwd or os.getcwd()}
+        try:
+            self.process.stdin.write(json.dumps(request) + '\n')
+            self.process.stdin.flush()
+            response = self.process.stdout.readline()
+        except (IOError, OSError, ValueError):
+            response = ''
+        if not response:
+            raise PipError(args, self.process.poll(), '',
+                           'pip worker exited unexpectedly')
+        response = json.loads(response)
+        if response['returncode'] != 0:
+            raise PipError(args, response['returncode'],
+                           response['stdout'], response['stderr'])
+        return response['stdout']
+
+    @property
+    def alive(self):
+        return self.process.poll() is None
+
+    def terminate(self):
+        if self.alive:
+            try:
+                self.process.terminate()
+            except OSError:
+                pass
+        self.process.wait()
+
+    def close(self):
+        if self.alive:
+            self.process.stdin.close()
+        self.process.wait()
+
+
+class PipWorkerPool(object):
+    '''
+    Run pip commands on up to *size* :class:`PipWorker` processes, started
+    on demand. Commands may be run from multiple threads.
+    '''
+
+    def __init__(self, pip_bin, size):
+        self.pip_bin = pip_bin
+        self.size = size
+        self.workers = []
+        self._idle_workers = queue.Queue()
+        self._lock = threading.Lock()
+        self._terminated = False
+
+    def _acquire(self):
+        # None is put in the idle queue to wake up a waiting caller when a
+        # worker died or when the pool is terminated
+        while True:
+            with self._lock:
+                if self._terminated:
+                    # Wake up the next waiting caller too
+                    self._idle_workers.put(None)
+                    raise PipError([], None, '', 'pip workers terminated')
+                if (self._idle_workers.empty() and
+                        len(self.workers) < self.size):
+                    worker = PipWorker(self.pip_bin)
+                    self.workers.append(worker)
+                    return worker
+            worker = self._idle_workers.get()
+            if worker is not None:
+                return worker
+
+    def run(self, args, cwd=None):
+        '''
+        Run pip with *args* in *cwd* on the first available worker, and
+        return its standard output.
+        '''
+        worker = self._acquire()
+        try:
+            return worker.run(args, cwd)
+        finally:
+            if worker.alive:
+                self._idle_workers.put(worker)
+            else:
+                with self._lock:
+                    self.workers.remove(worker)
+                # Let a waiting caller start a new worker
+                self._idle_workers.put(None)
+
+    def terminate(self):
+        '''
+        Kill all workers, interrupting running commands. Commands waiting for
+        a worker raise :class:`PipError`.
+        '''
+        with self._lock:
+            self._terminated = True
+            workers = list(self.workers)
+        self._idle_workers.put(None)
+        for worker in workers:
+            worker.terminate()
+
+    def close(self):
+        with self._lock:
+            workers = list(self.workers)
+            self.workers = []
+        for worker in workers:
+            worker.close()
+
+
+def _session_key(options, args):
+    names = ('index_url', 'extra_index_urls', 'trusted_hosts', 'cert',
+             'client_cert', 'proxy', 'cache_dir', 'no_input', 'retries',
+             'timeout', 'keyring_provider')
+    return json.dumps([repr(getattr(options, n, None)) for n in names] +
+                      [repr(a) for a in args], sort_keys=True)
+
+
+def _enable_sessions_reuse():
+    '''
+    Make pip commands reuse the HTTP sessions of previous commands having the
+    same network options, so connections stay open across commands.
+
+    This relies on pip internals, and does nothing if they don't look as
+    expected.
+    '''
+    try:
+        from pip._internal.cli.req_command import SessionCommandMixin
+    except ImportError:
+        return
+    build_session = getattr(SessionCommandMixin, '_build_session', None)
+    if build_session is None:
+        return
+    sessions = {}
+
+    def _build_session(self, options, *args, **kwargs):
+        key = _session_key(options, list(args) + sorted(kwargs.items()))
+        if key not in sessions:
+            session = build_session(self, options, *args, **kwargs)
+            # Commands close their session when they exit
+            session.close = lambda: None
+            sessions[key] = session
+        return sessions[key]
+
+    SessionCommandMixin._build_session = _build_session
+
+
+def _get_pip_main():
+    try:
+        from pip._internal.cli.main import main
+    except ImportError:
+        try:
+            from pip._internal import main
+        except ImportError:
+            from pip import main
+    return main
+
+
+def run_request(pip_main, request):
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    old_stdout, old_stderr = sys.stdout, sys.stderr
+    old_cwd = os.getcwd()
+    sys.stdout, sys.stderr = stdout, stderr
+    try:
+        os.chdir(request.get('cwd') or old_cwd)
+        returncode = pip_main(request['args'])
+    except SystemExit as exc:
+        if exc.code is None or isinstance(exc.code, int):
+            returncode = exc.code
+        else:
+            print(exc.code, file=sys.stderr)
+            returncode = 1
+    except Exception:
+        traceback.print_exc()
+        returncode = 1
+    finally:
+        sys.stdout, sys.stderr = old_stdout, old_stderr
+        os.chdir(old_cwd)
+    return {
+        'returncode': returncode or 0,
+        'stdout': stdout.getvalue(),
+        'stderr': stderr.getvalue(),
+    }
+
+
+def main():
+    # Keep the real stdout for responses, and send anything written directly
+    # to it (e.g. by subprocesses) to stderr
+    responses = os.fdopen(os.dup(1), 'w')
+    os.dup2(2, 1)
+    pip_main = _get_pip_main()
+    _enable_sessions_reuse()
+    for line in iter(sys.stdin.readline, ''):
+        response = run_request(pip_main, json.loads(line))
+        responses.write(json.dumps(response) + '\n')
+        responses.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+'''
+Parsing of pip requirements files.
+'''
+import hashlib
+import os.path as op
+import re
+import shlex
+from collections import defaultdict
+
+from packaging.requirements import Requirement, InvalidRequirement
+from packaging.utils import canonicalize_name
+
+
+_comment_regex = re.compile(r'(^|\s+)#.*$')
+_egg_fragment_regex = re.compile(r'[#&]egg=([^&\s]+)')
+_editable_regex = re.compile(r'^(?:-e|--editable)(?:\s+|=)?(.+)$')
+# Options that pull requirements from elsewhere, so a requirements file using
+# them can't be resolved line by line
+NESTING_OPTIONS = ('-r', '--requirement', '-c', '--constraint', '-e',
+                   '--editable')
+# Options including other requirements files
+INCLUDE_OPTIONS = ('-r', '--requirement', '-c', '--constraint')
+_url_regex = re.compile(r'^[a-z][a-z0-9+.-]*://', re.IGNORECASE)
+# Start of the per-requirement options of a line, like --hash
+_requirement_options_regex = re.compile(r'\s+--?[a-z]')
+
+
+class RequirementLine(object):
+    '''
+    A requirement from a requirements file.
+
+    *line* is the requirement as written in the file, without comments.
+    *canonical_name* is the PEP 503 name of the required project, or None if
+    it could not be parsed (e.g. for paths). *normalized* is a canonical
+    representation of the requirement, independent of formatting and of the
+    order of extras and specifiers. *standalone* is True for plain project
+    requirements, that can be passed to ``pip download`` on the command line
+    (not URLs, paths or requirements with per-requirement options).
+    '''
+
+    __slots__ = ('line', 'canonical_name', 'normalized', 'standalone')
+
+    def __init__(self, line, canonical_name, normalized, standalone):
+        self.line = line
+        self.canonical_name = canonical_name
+        self.normalized = normalized
+        self.standalone = standalone
+
+    def __repr__(self):
+        return '<RequirementLine %s>' % self.normalized
+
+
+class RequirementsFile(object):
+    '''
+    A parsed requirements file.
+
+    *options* are the normalized option lines (e.g. ``--index-url URL``),
+    *requirements* a list of :class:`RequirementLine`. *splittable* is False
+    if the file's requirements can't be resolved independently, e.g. because
+    it includes other files or has requirements that are not plain project
+    names.
+
+    *environment* are the options of the environment requirements are
+    resolved for (e.g. ``--platform``), or of how they are resolved (e.g.
+    ``--metadata-only``); they change the dependencies of requirements, so
+    they are part of cache keys.
+
+    *included* are the :class:`RequirementsFile` objects of the local files
+    included with ``-r`` or ``-c``; files that don't exist have no options
+    and requirements.
+    '''
+
+    def __init__(self, path, options, requirements, splittable,
+                 environment=(), included=()):
+        self.path = path
+        self.options = options
+        self.requirements = requirements
+        self.splittable = splittable
+        self.environment = list(environment)
+        self.included = list(included)
+
+    @property
+    def included_paths(self):
+        '''
+        The paths of the files included by this file, recursively.
+        '''
+        paths = []
+        for included in self.included:
+            paths.append(included.path)
+            paths.extend(included.included_paths)
+        return paths
+
+    @property
+    def options_args(self):
+        '''
+        The options of the file, as a list of command line arguments.
+        '''
+        args = []
+        for option in self.options:
+            args.extend(shlex.split(option))
+        return args
+
+    def cache_key(self, requirement=None):
+        '''
+        Get a cache key for the dependencies of *requirement* (a
+        :class:`RequirementLine`) resolved with the file options, or for the
+        dependencies of the whole file if *requirement* is None.
+
+        Keys only depend on normalized options and requirements, including
+        the ones of included files, so they don't change when comments,
+        blank lines or formatting change.
+        '''
+        if requirement is None:
+            lines = sorted(r.normalized for r in self.requirements)
+        else:
+            lines = [requirement.normalized]
+        options = self.options
+        if self.environment:
+            options = options + [' '.join(self.environment)]
+        if self.included:
+            options = options + [included.cache_key()
+                                 for included in self.included]
+        contents = '\n'.join(options + ['--'] + lines)
+        return hashlib.sha1(contents.encode('utf-8')).hexdigest()
+
+
+def parse_requirement_line(line):
+    '''
+    Parse a requirement *line*, stripped of comments and surrounding
+    whitespace, into a :class:`RequirementLine`.
+    '''
+    collapsed = ' '.join(line.split())
+    # Strip per-requirement options like --hash
+    requirement_part = _requirement_options_regex.split(line, 1)[0]
+    try:
+        requirement = Requirement(requirement_part)
+    except InvalidRequirement:
+        # Maybe an URL or a path with an #egg= fragment
+        match = _egg_fragment_regex.search(line)
+        canonical_name = canonicalize_name(match.group(1)) if match else None
+        return RequirementLine(line, canonical_name, collapsed, False)
+    canonical_name = canonicalize_name(requirement.name)
+    if requirement.url or requirement_part != line:
+        return RequirementLine(line, canonical_name, collapsed, False)
+    normalized = canonical_name
+    if requirement.extras:
+        normalized += '[%s]' % ','.join(sorted(requirement.extras))
+    normalized += ','.join(sorted(str(s) for s in requirement.specifier))
+    if requirement.marker:
+        normalized += '; %s' % requirement.marker
+    return RequirementLine(line, canonical_name, normalized, True)
+
+
+def iter_logical_lines(fp):
+    '''
+    Iterate over the lines of *fp*, stripped of comments and surrounding
+    whitespace, joining continued lines and skipping empty lines.
+    '''
+    pending = ''
+    for line in fp:
+        line = _comment_regex.sub('', line.rstrip('\r\n'))
+        if line.endswith('\\'):
+            pending += line[:-1] + ' '
+            continue
+        line = (pending + line).strip()
+        pending = ''
+        if line:
+            yield line
+    if pending.strip():
+        yield pending.strip()
+
+
+def parse_requirements_file(path, environment=(), _parents=()):
+    '''
+    Parse the requirements file at *path*, resolved with the pip options
+    *environment*, and return a :class:`RequirementsFile`.
+
+    The local files it includes are parsed too, relative to the directory of
+    the including file like pip does.
+    '''
+    options = []
+    requirements = []
+    included = []
+    splittable = True
+    parents = _parents + (op.abspath(path),)
+    with open(path) as fp:
+        for line in iter_logical_lines(fp):
+            if line.startswith('-'):
+                option = line.split('=', 1)[0].split(None, 1)[0]
+                if not option.startswith('--'):
+                    option = option[:2]
+                if option in NESTING_OPTIONS:
+                    splittable = False
+                options.append(' '.join(line.split()))
+                if option in INCLUDE_OPTIONS:
+                    value = line[len(option):].strip().lstrip('=').strip()
+                    if value and not _url_regex.match(value):
+                        included.append(_parse_included_file(
+                            op.join(op.dirname(path), value), environment,
+                            parents))
+                continue
+            requirement = parse_requirement_line(line)
+            if not requirement.standalone:
+                splittable = False
+            requirements.append(requirement)
+    return RequirementsFile(path, options, requirements, splittable,
+                            environment, included)
+
+
+def _parse_included_file(path, environment, parents):
+    path = op.normpath(path)
+    if op.abspath(path) in parents:
+        # pip would recurse forever, don't
+        return RequirementsFile(path, [], [], False, environment)
+    try:
+        return parse_requirements_file(path, environment, parents)
+    except (IOError, OSError):
+        return RequirementsFile(path, [], [], False, environment)
+
+
+def requirement_name(line):
+    '''
+    Get the canonical name of the project required by *line*, a requirement
+    or an editable requirement (``-e URL#egg=name``), stripped of comments.
+
+    Return None for other options, or if the name can't be determined.
+    '''
+    if line.startswith('-'):
+        match = _editable_regex.match(line)
+        if not match:
+            return None
+        line = match.group(1).strip()
+    return parse_requirement_line(line).canonical_name
+
+
+class ExclusionIndex(object):
+    '''
+    The packages excluded from frozen requirements, by canonical name.
+
+    *excluded_packages* and *ext_wheels* are lists of package names or
+    requirement lines. Packages may also take the ``req_path:package`` form,
+    to exclude them only from the frozen requirements of the requirements
+    file at *req_path*. *ext_wheels* packages are excluded too.
+    '''
+
+    def __init__(self, excluded_packages=(), ext_wheels=()):
+        self.excluded = set()
+        self.excluded_per_file = defaultdict(set)
+        self.ext_wheels = set()
+        for spec in excluded_packages:
+            self.add(spec)
+        for spec in ext_wheels:
+            self.add(spec, ext_wheel=True)
+
+    def __bool__(self):
+        return bool(self.excluded or self.excluded_per_file)
+
+    def add(self, spec, ext_wheel=False):
+        path = None
+        # Per-requirement options like --hash=sha256:... have colons too
+        requirement_part = _requirement_options_regex.split(spec, 1)[0]
+        if ':' in requirement_part and '://' not in requirement_part:
+            path, name_part = requirement_part.rsplit(':', 1)
+            spec = name_part + spec[len(requirement_part):]
+        name = requirement_name(spec.strip())
+        if name is None:
+            return
+        if path:
+            self.excluded_per_file[op.normpath(path)].add(name)
+        else:
+            self.excluded.add(name)
+        if ext_wheel:
+            self.ext_wheels.add(name)
+
+    def is_excluded(self, name, requirements_file=None):
+        '''
+        Test if package *name* (a canonical name) is excluded, everywhere or
+        from the frozen requirements of *requirements_file*.
+        '''
+        if name in self.excluded:
+            return True
+        if requirements_file is None or not self.excluded_per_file:
+            return False
+        return name in self.excluded_per_file.get(
+            op.normpath(requirements_file), ())
+
+    def is_ext_wheel(self, name):
+        return name in self.ext_wheels
@@ -0,0 +1,203 @@
+'''
+Static simple repository index of an output directory.
+
+The index is written in ``<output_dir>/simple/``, with an HTML (PEP 503) and
+a JSON (PEP 691) page for the root and each project, named ``index.html``
+and ``index.json``. Links point to the packages in ``<output_dir>/<project>/``
+and include their sha256 digests, so a project named ``simple`` can't be
+indexed.
+
+Static web servers only serve the HTML pages for directory URLs; the web
+server has to pick the page from the ``Accept`` header of requests to serve
+the JSON pages.
+'''
+import json
+import os
+import os.path as op
+import tempfile
+from html import escape
+
+from .filenames import parse_package_filename
+
+
+INDEX_DIRNAME = 'simple'
+API_VERSION = '1.0'
+PAGES = ('index.html', 'index.json')
+
+HTML_PAGE = '''<!DOCTYPE html>
+<html>
+  <head>
+    <meta name="pypi:repository-version" content="%(version)s">
+    <title>%(title)s</title>
+  </head>
+  <body>
+    <h1>%(title)s</h1>
+%(links)s
+  </body>
+</html>
+'''
+
+
+def write_if_changed(path, contents):
+    '''
+    Atomically replace the file at *path* by *contents*, unless it already
+    has them. Return True if the file was written.
+    '''
+    try:
+        with open(path) as fp:
+            if fp.read() == contents:
+                return False
+    except (IOError, OSError):
+        pass
+    directory = op.dirname(path)
+    if not op.isdir(directory):
+        os.makedirs(directory)
+    fd, temp_path = tempfile.mkstemp(prefix='.tmp-', dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as fp:
+            fp.write(contents)
+        # Pages are served by web servers, make them readable like the
+        # packages
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except Exception:
+        os.unlink(temp_path)
+        raise
+    return True
+
+
+class SimpleIndex(object):
+    '''
+    The simple repository index of the packages of *output_dir*, using
+    *hash_cache* to get the digests of packages.
+
+    Pages are only written when their contents change, so the index can be
+    updated in time proportional to the number of projects that changed.
+    '''
+
+    def __init__(self, output_dir, hash_cache):
+        self.output_dir = output_dir
+        self.path = op.join(output_dir, INDEX_DIRNAME)
+        self.hash_cache = hash_cache
+
+    def project_files(self, project):
+        '''
+        List the package filenames of *project* in the output directory.
+        '''
+        project_dir = op.join(self.output_dir, project)
+        try:
+            filenames = os.listdir(project_dir)
+        except OSError:
+            return []
+        ret = []
+        for filename in sorted(filenames):
+            if (filename.startswith('.') or
+                    not op.isfile(op.join(project_dir, filename))):
+                continue
+            try:
+                parse_package_filename(filename)
+            except ValueError:
+                continue
+            ret.append(filename)
+        return ret
+
+    def projects(self):
+        '''
+        List the projects having packages in the output directory.
+        '''
+        return [name for name in sorted(os.listdir(self.output_dir))
+                if not name.startswith('.') and self.project_files(name)]
+
+    def indexed_projects(self):
+        '''
+        List the projects having pages in the index.
+        '''
+        try:
+            names = os.listdir(self.path)
+        except OSError:
+            return []
+        return sorted(name for name in names
+                      if not name.startswith('.') and
+                      op.isdir(op.join(self.path, name)))
+
+    def update_project(self, project):
+        '''
+        Write the pages of *project*, or remove them if it has no packages
+        anymore. Return True if pages changed.
+        '''
+        project_path = op.join(self.path, project)
+        files = [(filename, self.hash_cache.hash(
+                    op.join(self.output_dir, project, filename)))
+                 for filename in self.project_files(project)]
+        if not files:
+            changed = False
+            for page in PAGES:
+                try:
+                    os.unlink(op.join(project_path, page))
+                except OSError:
+                    continue
+                changed = True
+            try:
+                os.rmdir(project_path)
+            except OSError:
+                pass
+            return changed
+        links = []
+        json_files = []
+        for filename, digest in files:
+            url = '../../%s/%s' % (project, filename)
+            links.append('    <a href="%s#sha256=%s">%s</a><br>' %
+                         (escape(url), digest, escape(filename)))
+            json_files.append({'filename': filename, 'url': url,
+                               'hashes': {'sha256': digest}})
+        title = 'Links for %s' % project
+        changed = write_if_changed(
+            op.join(project_path, 'index.html'),
+            HTML_PAGE % {'version': API_VERSION, 'title': escape(title),
+                         'links': '\n'.join(links)})
+        changed |= write_if_changed(
+            op.join(project_path, 'index.json'),
+            json.dumps({'meta': {'api-version': API_VERSION},
+                        'name': project, 'files': json_files},
+                       indent=2, sort_keys=True) + '\n')
+        return changed
+
+    def update_root(self):
+        '''
+        Write the root pages, listing the indexed projects. Return True if
+        pages changed.
+        '''
+        projects = self.indexed_projects()
+        links = ['    <a href="%s/">%s</a><br>' % (escape(p), escape(p))
+                 for p in projects]
+        changed = write_if_changed(
+            op.join(self.path, 'index.html'),
+            HTML_PAGE % {'version': API_VERSION, 'title': 'Simple index',
+                         'links': '\n'.join(links)})
+        changed |= write_if_changed(
+            op.join(self.path, 'index.json'),
+            json.dumps({'meta': {'api-version': API_VERSION},
+                        'projects': [{'name': p} for p in projects]},
+                       indent=2, sort_keys=True) + '\n')
+        return changed
+
+    def update(self, projects=None):
+        '''
+        Update the pages of *projects*, and the root pages. The pages of all
+        projects are updated if *projects* is None or if the index does not
+        exist yet.
+
+        Return the list of projects whose pages changed. Raise
+        :class:`ValueError` if the output directory has a project whose
+        packages would be in the index directory.
+        '''
+        if self.project_files(INDEX_DIRNAME):
+            raise ValueError('the packages of the %s project are in the '
+                             'simple index directory %s' %
+                             (INDEX_DIRNAME, self.path))
+        if projects is None or not op.exists(op.join(self.path, PAGES[0])):
+            projects = set(self.projects()).union(self.indexed_projects())
+        changed = [p for p in sorted(projects) if self.update_project(p)]
+        self.update_root()
+        self.hash_cache.commit()
+        return changed
@@ -0,0 +1,85 @@
+import io
+import os
+import os.path as op
+import tarfile
+import tempfile
+import zipfile
+
+from nose.tools import assert_equal, assert_raises
+
+from freezerequirements.archive import Archive, is_archive
+
+
+FILES = {
+    'pkg-1.0/PKG-INFO': b'Name: pkg\n',
+    'pkg-1.0/setup.py': b'setup()\n',
+    'pkg-1.0/pkg/__init__.py': b'',
+}
+
+
+def make_tar(path, mode, files=FILES):
+    with tarfile.open(path, mode) as archive:
+        for name, contents in sorted(files.items()):
+            info = tarfile.TarInfo(name)
+            info.size = len(contents)
+            archive.addfile(info, io.BytesIO(contents))
+    return path
+
+
+def make_zip(path, files=FILES):
+    with zipfile.ZipFile(path, 'w') as archive:
+        for name, contents in sorted(files.items()):
+            archive.writestr(name, contents)
+    return path
+
+
+def make_archives(directory):
+    return [
+        make_tar(op.join(directory, 'pkg-1.0.tar.gz'), 'w:gz'),
+        make_tar(op.join(directory, 'pkg-1.0.tgz'), 'w:gz'),
+        make_tar(op.join(directory, 'pkg-1.0.tar.bz2'), 'w:bz2'),
+        make_tar(op.join(directory, 'pkg-1.0.tar.xz'), 'w:xz'),
+        make_tar(op.join(directory, 'pkg-1.0.tar'), 'w'),
+        make_zip(op.join(directory, 'pkg-1.0.zip')),
+        make_zip(op.join(directory, 'pkg-1.0-py3-none-any.whl')),
+    ]
+
+
+def test_formats():
+    assert not is_archive('pkg-1.0.rpm')
+    with assert_raises(ValueError):
+        Archive('pkg-1.0.rpm')
+    for path in make_archives(tempfile.mkdtemp()):
+        assert is_archive(path)
+        with Archive(path) as archive:
+            assert_equal(sorted(archive.get_names()), sorted(FILES))
+            assert_equal(archive.root, 'pkg-1.0')
+            assert_equal(archive.read(archive.root_member('PKG-INFO')),
+                         b'Name: pkg\n')
+            with assert_raises(KeyError):
+                archive.read('pkg-1.0/missing')
+            names, contents = archive.scan(
+                lambda name: name.endswith('.py'))
+            assert_equal(sorted(names), sorted(FILES))
+            assert_equal(contents, {
+                'pkg-1.0/setup.py': b'setup()\n',
+                'pkg-1.0/pkg/__init__.py': b'',
+            })
+            extract_dir = tempfile.mkdtemp()
+            root_dir = archive.extract_root(extract_dir)
+            assert_equal(root_dir, op.join(extract_dir, 'pkg-1.0'))
+            assert op.exists(op.join(root_dir, 'pkg', '__init__.py'))
+
+
+def test_selective_and_safe_extraction():
+    work_dir = tempfile.mkdtemp()
+    files = dict(FILES)
+    files['../evil'] = b''
+    path = make_tar(op.join(work_dir, 'evil-1.0.tar.gz'), 'w:gz', files)
+    extract_dir = op.join(work_dir, 'extract')
+    with Archive(path) as archive:
+        archive.extract(extract_dir, ['pkg-1.0/setup.py'])
+        assert_equal(os.listdir(op.join(extract_dir, 'pkg-1.0')),
+                     ['setup.py'])
+        archive.extract_all(extract_dir)
+    assert not op.exists(op.join(work_dir, 'evil'))
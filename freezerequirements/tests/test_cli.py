@@ -0,0 +1,294 @@
+import os
+import os.path as op
+import subprocess
+import sys
+import tempfile
+import threading
+
+from click.testing import CliRunner
+from nose.tools import assert_equal
+
+from freezerequirements.cli import (find_versions_conflicts, packages_hashes,
+                                    watched_paths, report_packages,
+                                    split_report_packages, freeze, watch,
+                                    FreezeSession)
+from freezerequirements.hash_cache import HashCache
+from freezerequirements.requirements import (parse_requirements_file,
+                                             parse_requirement_line)
+from freezerequirements.utils import group_and_select_packages
+
+
+def test_find_versions_conflicts():
+    temp_dir = tempfile.mkdtemp()
+    requirements_files = []
+    for name, contents in [('a.txt', 'six\nclick\n'), ('b.txt', 'six\n')]:
+        path = op.join(temp_dir, name)
+        with open(path, 'w') as fp:
+            fp.write(contents)
+        requirements_files.append(parse_requirements_file(path))
+    a, b = requirements_files
+    resolved = [
+        # Cached as a whole
+        [(a.cache_key(), ['six-1.0.tar.gz', 'click-1.0.tar.gz'], None)],
+        # Downloaded
+        [(b.cache_key(b.requirements[0]), ['six-2.0.tar.gz'], temp_dir)],
+    ]
+    grouped_packages = group_and_select_packages([
+        ('a.txt', resolved[0][0][1]),
+        ('b.txt', resolved[1][0][1]),
+    ])
+    errors, cache_keys = find_versions_conflicts(grouped_packages, resolved,
+                                                 requirements_files)
+    assert_equal(len(errors), 1)
+    assert 'six==1.0 coming from a.txt' in errors[0]
+    assert_equal(cache_keys, set([a.cache_key()] +
+                                 [a.cache_key(l) for l in a.requirements]))
+
+
+def test_packages_hashes():
+    output_dir = tempfile.mkdtemp()
+    package_dir = op.join(output_dir, 'zope-interface')
+    os.mkdir(package_dir)
+    for filename in ['zope.interface-5.0.tar.gz', 'zope.interface-4.0.tar.gz',
+                     'zope_interface-5.0-cp311-cp311-linux_x86_64.whl']:
+        with open(op.join(package_dir, filename), 'w') as fp:
+            fp.write(filename)
+    requirements_packages = [
+        ('a.txt', ['zope.interface-5.0.tar.gz', 'six-1.0.tar.gz'])]
+    hashes = packages_hashes(
+        output_dir, group_and_select_packages(requirements_packages),
+        HashCache(op.join(output_dir, 'hashes.sqlite3')))
+    # Wheels have normalized names, and packages missing from the output
+    # directory have no hashes
+    assert_equal(list(hashes), ['zope.interface'])
+    assert_equal(len(hashes['zope.interface']), 2)
+
+
+def test_watched_paths():
+    temp_dir = tempfile.mkdtemp()
+    os.mkdir(op.join(temp_dir, 'sub'))
+    paths = [op.join(temp_dir, name)
+             for name in ('a.txt', 'b.txt', 'sub/c.txt')]
+    for path, contents in zip(paths, ['-r b.txt\n-c sub/c.txt\n-r x/y.txt\n',
+                                      '-r sub/c.txt\nsix\n', 'six<2\n']):
+        with open(path, 'w') as fp:
+            fp.write(contents)
+    # Missing files are watched for creation, but not in missing directories
+    assert_equal(watched_paths([paths[0], paths[1]]), paths)
+    os.unlink(paths[2])
+    assert_equal(watched_paths([paths[0]]), paths)
+
+
+def test_report_packages():
+    report = {'version': '1', 'install': [
+        {'metadata': {'name': 'Foo.Bar', 'version': '1.0'},
+         'download_info': {'url': 'https://host/Foo.Bar-1.0-py3-none-any.whl',
+                           'archive_info': {}}},
+        {'metadata': {'name': 'python-dateutil', 'version': '2.8.2'},
+         'download_info': {'url': 'file:///dist/python_dateutil-2.8.2.tar.gz'
+                           '#sha256=abc', 'archive_info': {}}},
+        {'metadata': {'name': 'six', 'version': '1.0'},
+         'download_info': {'url': 'https://host/six%2B-1.0.zip',
+                           'archive_info': {}}},
+        {'metadata': {'name': 'zope.thing', 'version': '2.0'},
+         'download_info': {'url': 'git+https://host/zope.thing',
+                           'vcs_info': {'vcs': 'git'}}},
+    ]}
+    assert_equal(report_packages(report),
+                 ['Foo.Bar-1.0-py3-none-any.whl',
+                  'python_dateutil-2.8.2.tar.gz', 'six+-1.0.zip',
+                  'zope.thing-2.0.zip'])
+
+
+def test_split_report_packages():
+    def item(name, requires_dist=None):
+        return {'metadata': {'name': name, 'version': '1.0',
+                             'requires_dist': requires_dist},
+                'download_info': {'url': 'https://host/%s-1.0.tar.gz' % name,
+                                  'archive_info': {}}}
+
+    report = {'version': '1', 'install': [
+        item('Alpha', ['beta', 'delta; extra == "x"', 'eps; extra == "y"']),
+        item('beta', ['Shared>1']),
+        item('gamma', ['shared', 'zeta; python_version < "1"']),
+        item('delta', ['beta']),
+        item('shared'),
+    ]}
+    lines = [parse_requirement_line(line)
+             for line in ['alpha[x]', 'gamma', 'omega; python_version < "1"']]
+    split = split_report_packages(report, lines)
+    assert_equal([sorted(packages) for packages in split],
+                 [['Alpha-1.0.tar.gz', 'beta-1.0.tar.gz', 'delta-1.0.tar.gz',
+                   'shared-1.0.tar.gz'],
+                  ['gamma-1.0.tar.gz', 'shared-1.0.tar.gz'],
+                  []])
+    # Requirements missing from the report can't be split
+    lines.append(parse_requirement_line('omega'))
+    assert_equal(split_report_packages(report, lines), None)
+
+
+def test_cache_dependencies_split():
+    # Files are downloaded as a whole when none of their requirements are
+    # cached, but the dependencies of each requirement are still cached
+    temp_dir = tempfile.mkdtemp()
+    dist_dir = op.join(temp_dir, 'dist')
+    for name, requires in [('alpha', ['beta']), ('beta', []),
+                           ('gamma', ['beta'])]:
+        project_dir = op.join(temp_dir, name)
+        os.mkdir(project_dir)
+        with open(op.join(project_dir, 'setup.py'), 'w') as fp:
+            fp.write('from setuptools import setup\n'
+                     'setup(name=%r, version="1.0", install_requires=%r)\n' %
+                     (name, requires))
+        subprocess.check_call([sys.executable, 'setup.py', '-q', 'sdist',
+                               '-d', dist_dir], cwd=project_dir)
+    requirements = op.join(temp_dir, 'requirements.txt')
+    env = {'XDG_CACHE_HOME': op.join(temp_dir, 'cache'),
+           'PIP_NO_BUILD_ISOLATION': '0'}
+    runner = CliRunner()
+
+    def run_freeze(contents):
+        with open(requirements, 'w') as fp:
+            fp.write('--no-index\n--find-links %s\n%s' % (dist_dir, contents))
+        output = op.join(temp_dir, 'frozen.txt')
+        result = runner.invoke(freeze, [
+            '--cache-dependencies', '-m', output, requirements], env=env)
+        assert_equal(result.exit_code, 0, result.output)
+        with open(output) as fp:
+            return result.output, fp.read()
+
+    log, frozen = run_freeze('alpha\n')
+    assert 'requirements found in cache' not in log
+    assert 'alpha==1.0\nbeta==1.0\n' in frozen
+    log, frozen = run_freeze('alpha\ngamma\n')
+    assert 'dependencies of 1 of 2 requirements found in cache' in log
+    assert '%s: gamma\n' % requirements in log
+    assert 'alpha==1.0\nbeta==1.0\ngamma==1.0\n' in frozen
+
+
+def test_session_exclusions():
+    # Watch sessions read exclusion files again for each freeze
+    temp_dir = tempfile.mkdtemp()
+    dist_dir = op.join(temp_dir, 'dist')
+    for name, requires in [('alpha', ['beta']), ('beta', [])]:
+        project_dir = op.join(temp_dir, name)
+        os.mkdir(project_dir)
+        with open(op.join(project_dir, 'setup.py'), 'w') as fp:
+            fp.write('from setuptools import setup\n'
+                     'setup(name=%r, version="1.0", install_requires=%r)\n' %
+                     (name, requires))
+        subprocess.check_call([sys.executable, 'setup.py', '-q', 'sdist',
+                               '-d', dist_dir], cwd=project_dir)
+    requirements = op.join(temp_dir, 'requirements.txt')
+    with open(requirements, 'w') as fp:
+        fp.write('--no-index\n--find-links %s\nalpha\n' % dist_dir)
+    excluded = op.join(temp_dir, 'excluded.txt')
+    output = op.join(temp_dir, 'frozen.txt')
+    options = watch.make_context('watch', ['-m', output, requirements]).params
+    for name in ('requirements', 'trace', 'timings', 'debounce', 'poll'):
+        del options[name]
+    options['merged_requirements'] = output
+    options['exclude_requirements'] = [excluded]
+
+    def run_freeze(exclusions):
+        with open(excluded, 'w') as fp:
+            fp.write(exclusions)
+        session.freeze([requirements])
+        with open(output) as fp:
+            return fp.read()
+
+    os.environ['PIP_NO_BUILD_ISOLATION'] = '0'
+    session = FreezeSession(cache_dependencies=False, **options)
+    try:
+        assert 'alpha==1.0\n\n' in run_freeze('beta\n')
+        assert 'alpha==1.0\nbeta==1.0\n' in run_freeze('')
+    finally:
+        session.close()
+        del os.environ['PIP_NO_BUILD_ISOLATION']
+
+
+def test_metadata_only_freeze():
+    # Resolve local source packages without network access, from the
+    # metadata pip prepares and from downloads, sharing a dependencies cache.
+    # delta 2.0 only has a wheel, that downloads of source packages skip.
+    temp_dir = tempfile.mkdtemp()
+    dist_dir = op.join(temp_dir, 'dist')
+    for name, version, requires in [('alpha', '1.0', ['beta<2']),
+                                    ('beta', '1.2', []),
+                                    ('delta', '1.0', []),
+                                    ('delta', '2.0', [])]:
+        project_dir = op.join(temp_dir, '%s-%s' % (name, version))
+        os.mkdir(project_dir)
+        with open(op.join(project_dir, 'setup.py'), 'w') as fp:
+            fp.write('from setuptools import setup\n'
+                     'setup(name=%r, version=%r, install_requires=%r)\n' %
+                     (name, version, requires))
+        command = 'bdist_wheel' if (name, version) == ('delta', '2.0') \
+            else 'sdist'
+        subprocess.check_call([sys.executable, 'setup.py', '-q', command,
+                               '-d', dist_dir], cwd=project_dir)
+    requirements = op.join(temp_dir, 'requirements.txt')
+    with open(requirements, 'w') as fp:
+        fp.write('--no-index\n--find-links %s\nalpha\ndelta\n' % dist_dir)
+    env = {'XDG_CACHE_HOME': op.join(temp_dir, 'cache'),
+           'PIP_NO_BUILD_ISOLATION': '0'}
+    runner = CliRunner()
+
+    def run_freeze(name, *args):
+        output = op.join(temp_dir, name)
+        result = runner.invoke(freeze, list(args) + [
+            '--cache-dependencies', '-m', output, requirements], env=env)
+        assert_equal(result.exit_code, 0, result.output)
+        with open(output) as fp:
+            return fp.read()
+
+    resolved = run_freeze('resolved.txt', '--metadata-only')
+    assert 'alpha==1.0\nbeta==1.2\ndelta==1.0\n' in resolved
+    output_dir = op.join(temp_dir, 'packages')
+    os.mkdir(output_dir)
+    # Resolutions from metadata are not used for downloads
+    assert_equal(run_freeze('downloaded.txt', '-o', output_dir), resolved)
+    assert_equal(os.listdir(op.join(output_dir, 'alpha')),
+                 ['alpha-1.0.tar.gz'])
+    assert_equal(os.listdir(op.join(output_dir, 'beta')), ['beta-1.2.tar.gz'])
+    assert_equal(run_freeze('cached.txt', '--metadata-only'), resolved)
+
+
+def test_targets_failure():
+    # One target has no package, it fails without blocking the other one,
+    # which runs its pip commands on its own workers
+    temp_dir = tempfile.mkdtemp()
+    project_dir = op.join(temp_dir, 'beta')
+    os.mkdir(project_dir)
+    with open(op.join(project_dir, 'setup.py'), 'w') as fp:
+        fp.write('from setuptools import setup\n'
+                 'setup(name="beta", version="1.2")\n')
+    wheels_dir = op.join(temp_dir, 'wheels')
+    subprocess.check_call([sys.executable, '-m', 'pip', 'wheel', '-q',
+                           '--no-build-isolation', '--no-deps', '-w',
+                           wheels_dir, project_dir])
+    wheel, = os.listdir(wheels_dir)
+    subprocess.check_call([sys.executable, '-m', 'wheel', 'tags', '--remove',
+                           '--platform-tag', 'manylinux2014_x86_64',
+                           op.join(wheels_dir, wheel)])
+    requirements = []
+    for name in ('a.txt', 'b.txt', 'c.txt'):
+        requirements.append(op.join(temp_dir, name))
+        with open(requirements[-1], 'w') as fp:
+            fp.write('--no-index\n--find-links %s\nbeta\n' % wheels_dir)
+    merged = op.join(temp_dir, 'frozen.txt')
+    args = ['--pip-backend', 'worker', '--jobs', '2', '-m', merged,
+            '--target', 'py3.11-manylinux2014_x86_64',
+            '--target', 'py3.11-win_amd64'] + requirements
+    env = {'XDG_CACHE_HOME': op.join(temp_dir, 'cache')}
+    results = []
+    thread = threading.Thread(target=lambda: results.append(
+        CliRunner().invoke(freeze, args, env=env)))
+    thread.daemon = True
+    thread.start()
+    thread.join(120)
+    assert not thread.is_alive(), 'freeze hangs'
+    assert_equal(results[0].exit_code, 1, results[0].output)
+    with open(op.join(temp_dir,
+                      'frozen-py3.11-manylinux2014_x86_64.txt')) as fp:
+        assert 'beta==1.2\n' in fp.read()
@@ -0,0 +1,67 @@
+import os.path as op
+import tempfile
+import time
+
+from nose.tools import assert_equal
+
+from freezerequirements.dependencies_cache import DependenciesCache
+
+
+def make_cache():
+    return DependenciesCache(op.join(tempfile.mkdtemp(), 'cache',
+                                     'dependencies.sqlite3'))
+
+
+def test_dependencies_cache():
+    cache = make_cache()
+    assert cache.get('key') is None
+    cache.set('key', ['six-1.0.tar.gz'])
+    assert_equal(cache.get('key'), ['six-1.0.tar.gz'])
+    cache.set('key', [])
+    assert_equal(cache.get('key'), [])
+    cache.delete('key')
+    cache.delete('key')
+    assert cache.get('key') is None
+    cache.commit()
+    # Changes are persistent
+    cache.set('key', ['six-1.0.tar.gz'])
+    cache.close()
+    cache = DependenciesCache(cache.path)
+    assert cache.contains('key')
+
+
+def test_dependencies_cache_stats():
+    cache = make_cache()
+    cache.set('a', ['six-1.0.tar.gz'])
+    cache.get('a')
+    cache.get('a')
+    cache.get('b')
+    stats = cache.stats()
+    assert_equal(stats['entries'], 1)
+    assert_equal(stats['hits'], 2)
+    assert_equal(stats['misses'], 1)
+    assert stats['size'] > 0
+    assert_equal([e[4] for e in cache.entries()], [2])
+
+
+def test_dependencies_cache_prune():
+    cache = make_cache()
+    now = time.time()
+    cache.set('old', ['six-1.0.tar.gz'], last_access=now - 100 * 86400)
+    cache.set('a', ['six-1.0.tar.gz'], last_access=now - 10)
+    cache.set('b', ['six-1.0.tar.gz'], last_access=now)
+    assert_equal(cache.prune(max_age=30 * 86400)[0], 1)
+    assert not cache.contains('old')
+    entry_size = cache.stats()['size'] // 2
+    assert_equal(cache.prune(max_size=entry_size), (1, entry_size))
+    assert_equal([e[0] for e in cache.entries()], ['b'])
+
+
+def test_dependencies_cache_verify():
+    cache = make_cache()
+    cache.set('valid', ['six-1.0.tar.gz'])
+    cache.set('invalid', ['not-a-package'])
+    assert_equal([key for key, _ in cache.verify()], ['invalid'])
+    assert cache.contains('invalid')
+    cache.verify(repair=True)
+    assert_equal([e[0] for e in cache.entries()], ['valid'])
@@ -0,0 +1,39 @@
+from nose.tools import assert_equal, assert_raises
+
+from freezerequirements.filenames import parse_package_filename
+from freezerequirements.utils import likely_distro
+
+
+def test_parse_package_filename():
+    for filename, key, canonical_name, version, kind in [
+        ('lizard-2013-01-29-16-44-48.878536.tar.gz', 'lizard', 'lizard',
+         '2013-01-29-16-44-48.878536', 'sdist'),
+        ('stashy-client-0.1.3.tar.gz', 'stashy-client', 'stashy-client',
+         '0.1.3', 'sdist'),
+        ('/some/dir/zope.interface-4.1.1.zip', 'zope.interface',
+         'zope-interface', '4.1.1', 'sdist'),
+        ('Foo_Bar-1.0.tar.xz', 'foo-bar', 'foo-bar', '1.0', 'sdist'),
+        ('foo_bar-1.0-py2.py3-none-any.whl', 'foo-bar', 'foo-bar', '1.0',
+         'wheel'),
+        ('foo-1.0-1-cp311-cp311-linux_x86_64.whl', 'foo', 'foo', '1.0',
+         'wheel'),
+    ]:
+        parsed = parse_package_filename(filename)
+        assert_equal((parsed.key, parsed.canonical_name, parsed.version,
+                      parsed.kind), (key, canonical_name, version, kind))
+        assert parse_package_filename(filename) is parsed
+    for filename in ['foo.tar.gz', 'foo-bar.zip', 'foo-1.0.rpm',
+                     'foo-1.0.whl']:
+        with assert_raises(ValueError):
+            parse_package_filename(filename)
+
+
+def test_same_as_likely_distro():
+    for filename in ['lizard-2013-01-29-16-44-48.878536.tar.gz',
+                     'stashy-client-0.1.3.tar.gz', 'zope.interface-4.1.1.zip',
+                     'Foo_Bar-1.0-2.tar.gz', 'python-dateutil-2.8.2.tar.gz',
+                     'foo-bar-baz-10-1.tar.bz2']:
+        distro = likely_distro(filename)
+        parsed = parse_package_filename(filename)
+        assert_equal((parsed.key, parsed.version),
+                     (distro.key, distro.version))
@@ -0,0 +1,33 @@
+import os
+import os.path as op
+import tempfile
+
+from nose.tools import assert_equal
+
+from freezerequirements.hash_cache import HashCache
+from freezerequirements.utils import file_sha256
+
+
+def test_hash_cache():
+    temp_dir = tempfile.mkdtemp()
+    cache = HashCache(op.join(temp_dir, 'cache', 'hashes.sqlite3'))
+    path = op.join(temp_dir, 'six-1.0.tar.gz')
+    with open(path, 'w') as fp:
+        fp.write('six')
+    assert cache.get(path) is None
+    assert_equal(cache.hash(path), file_sha256(path))
+    # Cached digests are returned while the file is unchanged
+    cache.set(path, 'digest')
+    assert_equal(cache.hash(path), 'digest')
+    with open(path, 'w') as fp:
+        fp.write('six 1.0')
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert cache.get(path) is None
+    assert_equal(cache.hash(path), file_sha256(path))
+    # Renamed files keep their digest
+    new_path = op.join(temp_dir, 'six-1.0-renamed.tar.gz')
+    os.rename(path, new_path)
+    cache.rename(path, new_path)
+    assert_equal(cache.get(new_path), file_sha256(new_path))
+    cache.close()
@@ -0,0 +1,115 @@
+import io
+import json
+
+from nose.tools import assert_equal
+
+from freezerequirements.output import (FrozenRequirements, RequirementsTarget,
+                                       LockfileTarget, write_outputs)
+from freezerequirements.requirements import ExclusionIndex
+from freezerequirements.utils import group_and_select_packages
+
+
+def make_frozen_requirements(exclusions=(), hashes=None):
+    requirements_packages = [
+        ('a.txt', ['six-1.0.tar.gz', 'click-7.0.tar.gz', 'ext-1.0.tar.gz']),
+        ('b.txt', ['six-1.1.tar.gz', 'idna-3.4.tar.gz']),
+    ]
+    return FrozenRequirements(
+        requirements_packages,
+        group_and_select_packages(requirements_packages),
+        ExclusionIndex(exclusions, ['ext']),
+        {'a.txt': ['ext==1.0']},
+        hashes
+    )
+
+
+def test_write_outputs():
+    frozen_requirements = make_frozen_requirements(['b.txt:idna'])
+    merged = io.StringIO()
+    loose = io.StringIO()
+    lockfile = io.StringIO()
+    write_outputs(frozen_requirements, [
+        RequirementsTarget(merged, index_url='http://index'),
+        RequirementsTarget(loose, ['b.txt'],
+                           loose_packages=frozenset(['six'])),
+        LockfileTarget(lockfile),
+    ])
+    assert_equal(merged.getvalue(), '\n'.join([
+        '# This file has been automatically generated, DO NOT EDIT!',
+        '',
+        '--index-url http://index',
+        '',
+        '# Frozen requirements for "a.txt"',
+        '',
+        'click==7.0',
+        'six==1.1',
+        'ext==1.0',
+        '',
+        '# Frozen requirements for "b.txt"',
+        '',
+        '',
+        '',
+    ]))
+    assert_equal(loose.getvalue().splitlines()[-3:],
+                 ['', 'six', ''])
+    lock = json.loads(lockfile.getvalue())
+    assert_equal(lock['packages']['six'], {'version': '1.1',
+                                           'origins': ['b.txt'],
+                                           'hashes': []})
+    assert_equal(lock['requirements']['a.txt']['ext_wheels'], ['ext==1.0'])
+    b_packages = lock['requirements']['b.txt']['packages']
+    assert_equal([p['name'] for p in b_packages], ['six'])
+
+
+def test_write_outputs_hashes():
+    frozen_requirements = make_frozen_requirements(
+        hashes={'six': ['bb', 'aa'], 'click': ['cc']})
+    output = io.StringIO()
+    lockfile = io.StringIO()
+    write_outputs(frozen_requirements, [
+        RequirementsTarget(output, ['a.txt']),
+        LockfileTarget(lockfile),
+    ])
+    assert_equal(output.getvalue().splitlines()[4:10], [
+        'click==7.0 \\',
+        '    --hash=sha256:cc',
+        'six==1.1 \\',
+        '    --hash=sha256:aa \\',
+        '    --hash=sha256:bb',
+        'ext==1.0',
+    ])
+    lock = json.loads(lockfile.getvalue())
+    assert_equal(lock['packages']['six']['hashes'],
+                 ['sha256:aa', 'sha256:bb'])
+
+
+def test_write_outputs_open_files():
+    requirements_packages = [('%s.txt' % i, ['six-1.0.tar.gz'])
+                             for i in range(5)]
+    frozen_requirements = FrozenRequirements(
+        requirements_packages,
+        group_and_select_packages(requirements_packages),
+        ExclusionIndex(), {})
+    opened = []
+    open_counts = []
+
+    class CountingTarget(RequirementsTarget):
+
+        def start(self):
+            opened.append(self)
+            open_counts.append(len(opened))
+            super(CountingTarget, self).start()
+
+        def finish(self):
+            super(CountingTarget, self).finish()
+            opened.remove(self)
+
+    outputs = [io.StringIO() for _ in requirements_packages]
+    write_outputs(frozen_requirements, [CountingTarget(io.StringIO())] + [
+        CountingTarget(output, [path])
+        for output, (path, _) in zip(outputs, requirements_packages)
+    ])
+    # Only the merged output and one separate output are open at once
+    assert_equal(max(open_counts), 2)
+    assert_equal(opened, [])
+    assert all('six==1.0' in output.getvalue() for output in outputs)
@@ -0,0 +1,63 @@
+import os
+import sys
+import tempfile
+import threading
+
+from nose.tools import assert_equal, assert_raises
+
+from freezerequirements.pipworker import run_request, PipWorkerPool
+from freezerequirements.exceptions import PipError
+
+
+def test_run_request():
+    def pip_main(args):
+        print(os.getcwd())
+        print('error', file=sys.stderr)
+        if args == ['fail']:
+            sys.exit(2)
+        return 0
+    cwd = os.path.realpath(tempfile.mkdtemp())
+    response = run_request(pip_main, {'args': [], 'cwd': cwd})
+    assert_equal(response, {'returncode': 0, 'stdout': cwd + '\n',
+                            'stderr': 'error\n'})
+    response = run_request(pip_main, {'args': ['fail'], 'cwd': cwd})
+    assert_equal(response['returncode'], 2)
+
+
+def test_pip_worker_pool():
+    pool = PipWorkerPool('pip', 2)
+    try:
+        assert pool.run(['--version']).startswith('pip ')
+        assert pool.run(['--version']).startswith('pip ')
+        assert_equal(len(pool.workers), 1)
+        with assert_raises(PipError):
+            pool.run(['no-such-command'])
+    finally:
+        pool.close()
+
+
+def test_pip_worker_pool_terminate():
+    pool = PipWorkerPool('pip', 1)
+    errors = []
+
+    def run():
+        try:
+            pool.run(['--version'])
+        except PipError as exc:
+            errors.append(exc)
+
+    try:
+        # Callers waiting for the only worker are woken up by terminate()
+        worker = pool._acquire()
+        threads = [threading.Thread(target=run) for _ in range(2)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        pool.terminate()
+        for thread in threads:
+            thread.join(30)
+            assert not thread.is_alive()
+        assert_equal(len(errors), 2)
+        assert not worker.alive
+    finally:
+        pool.close()
@@ -0,0 +1,132 @@
+import os.path as op
+import tempfile
+
+from nose.tools import assert_equal
+
+from freezerequirements.requirements import (parse_requirements_file,
+                                             requirement_name, ExclusionIndex,
+                                             parse_requirement_line)
+
+
+def write_requirements(contents):
+    path = op.join(tempfile.mkdtemp(), 'requirements.txt')
+    with open(path, 'w') as fp:
+        fp.write(contents)
+    return path
+
+
+def test_parse_requirement_line():
+    for line, canonical_name, normalized, standalone in [
+        ('Six >= 1.0,<2', 'six', 'six<2,>=1.0', True),
+        ('Foo.Bar[b,a]==1; python_version<"3"', 'foo-bar',
+         'foo-bar[a,b]==1; python_version < "3"', True),
+        ('foo==1  --hash=sha256:abc', 'foo', 'foo==1 --hash=sha256:abc',
+         False),
+        ('git+https://host/foo.git#egg=Foo_Bar', 'foo-bar',
+         'git+https://host/foo.git#egg=Foo_Bar', False),
+        ('bar @ https://host/bar.tgz', 'bar', 'bar @ https://host/bar.tgz',
+         False),
+        ('./local', None, './local', False),
+    ]:
+        requirement = parse_requirement_line(line)
+        assert_equal((requirement.canonical_name, requirement.normalized,
+                      requirement.standalone),
+                     (canonical_name, normalized, standalone))
+
+
+def test_parse_requirements_file():
+    reqs_file = parse_requirements_file(write_requirements(
+        '# Comment\n'
+        '--index-url   https://example.com/simple\n'
+        '\n'
+        'six  # trailing comment\n'
+        'requests[security] \\\n'
+        '    >= 2.0\n'
+    ))
+    assert reqs_file.splittable
+    assert_equal(reqs_file.options, ['--index-url https://example.com/simple'])
+    assert_equal(reqs_file.options_args,
+                 ['--index-url', 'https://example.com/simple'])
+    assert_equal([r.normalized for r in reqs_file.requirements],
+                 ['six', 'requests[security]>=2.0'])
+    for contents in ['-r other.txt\nsix\n', '-rother.txt\n',
+                     '-e git+https://host/foo.git#egg=foo\n',
+                     'foo==1 --hash=sha256:abc\n']:
+        assert not parse_requirements_file(
+            write_requirements(contents)).splittable
+
+
+def test_cache_keys():
+    reqs_file = parse_requirements_file(write_requirements(
+        'six\nidna==3.4\n'))
+    same_reqs_file = parse_requirements_file(write_requirements(
+        '# Comment\nIDNA == 3.4\n\nsix\n'))
+    other_reqs_file = parse_requirements_file(write_requirements(
+        'six\nidna==3.4\ncertifi\n'))
+    assert_equal(reqs_file.cache_key(), same_reqs_file.cache_key())
+    assert reqs_file.cache_key() != other_reqs_file.cache_key()
+    assert_equal([reqs_file.cache_key(r) for r in reqs_file.requirements],
+                 [other_reqs_file.cache_key(r)
+                  for r in other_reqs_file.requirements[:2]])
+    # Options apply to all requirements
+    index_reqs_file = parse_requirements_file(write_requirements(
+        '-i https://example.com/simple\nsix\n'))
+    assert (index_reqs_file.cache_key(index_reqs_file.requirements[0]) !=
+            reqs_file.cache_key(reqs_file.requirements[0]))
+    # So does the target environment
+    target_reqs_file = parse_requirements_file(
+        reqs_file.path, ['--platform', 'win_amd64'])
+    assert target_reqs_file.cache_key() != reqs_file.cache_key()
+
+
+def test_included_files():
+    path = write_requirements('-r base.txt\n-c=sub/constraints.txt\n'
+                              '-r https://host/reqs.txt\nsix\n')
+    directory = op.dirname(path)
+    base_path = op.join(directory, 'base.txt')
+    constraints_path = op.join(directory, 'sub', 'constraints.txt')
+    reqs_file = parse_requirements_file(path)
+    assert_equal(reqs_file.included_paths, [base_path, constraints_path])
+    missing_key = reqs_file.cache_key()
+
+    with open(base_path, 'w') as fp:
+        fp.write('idna==3.4\n-r requirements.txt\n')
+    reqs_file = parse_requirements_file(path)
+    # Includes are relative to the including file, and cycles are stopped
+    assert_equal(reqs_file.included_paths, [base_path, path,
+                                            constraints_path])
+    assert_equal([r.normalized for r in reqs_file.included[0].requirements],
+                 ['idna==3.4'])
+    key = reqs_file.cache_key()
+    assert key != missing_key
+
+    # Editing an included file changes the key of the including file
+    with open(base_path, 'w') as fp:
+        fp.write('idna==3.5\n-r requirements.txt\n')
+    assert parse_requirements_file(path).cache_key() != key
+
+
+def test_requirement_name():
+    assert_equal(requirement_name('Foo.Bar>=1'), 'foo-bar')
+    assert_equal(requirement_name('-e git+https://host/repo#egg=Foo_Bar'),
+                 'foo-bar')
+    assert_equal(requirement_name('--index-url https://host/simple'), None)
+
+
+def test_exclusion_index():
+    index = ExclusionIndex(['six', 'Foo_Bar==1.0', 'reqs/base.txt:click',
+                            'idna==3.4 --hash=sha256:abc',
+                            'reqs/base.txt:certifi==1 --hash=sha256:abc'],
+                           ['ext-pkg'])
+    assert index.is_excluded('six')
+    assert not index.is_excluded('sixer')
+    assert index.is_excluded('foo-bar')
+    assert index.is_excluded('ext-pkg')
+    assert index.is_ext_wheel('ext-pkg')
+    assert not index.is_ext_wheel('six')
+    assert not index.is_excluded('click')
+    assert not index.is_excluded('click', 'reqs/other.txt')
+    assert index.is_excluded('click', './reqs/base.txt')
+    assert index.is_excluded('idna')
+    assert not index.is_excluded('certifi')
+    assert index.is_excluded('certifi', 'reqs/base.txt')
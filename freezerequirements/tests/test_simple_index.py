@@ -0,0 +1,67 @@
+import json
+import os
+import os.path as op
+import tempfile
+
+from nose.tools import assert_equal, assert_raises
+
+from freezerequirements.hash_cache import HashCache
+from freezerequirements.simple_index import SimpleIndex
+from freezerequirements.utils import file_sha256
+
+
+def add_package(output_dir, project, filename):
+    project_dir = op.join(output_dir, project)
+    if not op.exists(project_dir):
+        os.mkdir(project_dir)
+    path = op.join(project_dir, filename)
+    with open(path, 'w') as fp:
+        fp.write(filename)
+    return path
+
+
+def read_json(output_dir, *path):
+    with open(op.join(output_dir, 'simple', *path)) as fp:
+        return json.load(fp)
+
+
+def test_simple_index():
+    output_dir = tempfile.mkdtemp()
+    six_path = add_package(output_dir, 'six', 'six-1.0.tar.gz')
+    add_package(output_dir, 'idna', 'idna-3.4.tar.gz')
+    # Hidden directories and unknown files are ignored
+    add_package(output_dir, '.freeze-requirements-tmp', 'six-1.0.tar.gz')
+    add_package(output_dir, 'six', 'README')
+    index = SimpleIndex(output_dir, HashCache(op.join(output_dir, '.hashes')))
+
+    # The whole index is written the first time
+    assert_equal(index.update(['six']), ['idna', 'six'])
+    assert_equal(read_json(output_dir, 'index.json')['projects'],
+                 [{'name': 'idna'}, {'name': 'six'}])
+    assert_equal(read_json(output_dir, 'six', 'index.json')['files'], [{
+        'filename': 'six-1.0.tar.gz',
+        'url': '../../six/six-1.0.tar.gz',
+        'hashes': {'sha256': file_sha256(six_path)},
+    }])
+    with open(op.join(output_dir, 'simple', 'six', 'index.html')) as fp:
+        assert ('<a href="../../six/six-1.0.tar.gz#sha256=%s">'
+                'six-1.0.tar.gz</a>' % file_sha256(six_path)) in fp.read()
+
+    # Then only the projects given, if their pages changed
+    assert_equal(index.update(['six', 'idna']), [])
+    add_package(output_dir, 'six', 'six-1.1.tar.gz')
+    add_package(output_dir, 'click', 'click-7.0.tar.gz')
+    assert_equal(index.update(['six', 'click']), ['click', 'six'])
+    assert_equal(len(read_json(output_dir, 'six', 'index.json')['files']), 2)
+    assert_equal(len(read_json(output_dir, 'index.json')['projects']), 3)
+
+    # Projects without packages are removed
+    os.unlink(op.join(output_dir, 'click', 'click-7.0.tar.gz'))
+    assert_equal(index.update(), ['click'])
+    assert not op.exists(op.join(output_dir, 'simple', 'click'))
+    assert_equal(read_json(output_dir, 'index.json')['projects'],
+                 [{'name': 'idna'}, {'name': 'six'}])
+
+    # The packages of a project named simple would be in the index directory
+    add_package(output_dir, 'simple', 'simple-1.0.tar.gz')
+    assert_raises(ValueError, index.update, ['simple'])
@@ -0,0 +1,29 @@
+import subprocess
+import sys
+
+
+# Modules only the commands using them may import
+LAZY_MODULES = ('sh', 'pip', 'setuptools', 'distutils', 'asyncio',
+                'packaging', 'concurrent.futures',
+                'freezerequirements.requirements',
+                'freezerequirements.pipworker')
+
+
+def imported_modules(module):
+    '''
+    Import *module* in a new interpreter, and return the set of modules
+    loaded afterwards.
+    '''
+    process = subprocess.run(
+        [sys.executable, '-c',
+         'import sys, %s; print("\\n".join(sys.modules))' % module],
+        stdout=subprocess.PIPE, universal_newlines=True, check=True
+    )
+    return set(process.stdout.splitlines())
+
+
+def test_lazy_imports():
+    imported = imported_modules('freezerequirements.cli')
+    assert 'freezerequirements.cli' in imported
+    for module in LAZY_MODULES:
+        assert module not in imported, '%s imported at startup' % module
@@ -0,0 +1,55 @@
+import io
+import json
+
+from nose.tools import assert_equal
+
+from freezerequirements.tracing import (Tracer, format_timings, PHASE,
+                                        REQUIREMENTS, PACKAGE)
+
+
+def test_tracer():
+    tracer = Tracer()
+    with tracer.span('download'):
+        pass
+    assert_equal(tracer.events, [])
+    tracer.enable()
+    with tracer.span('download'):
+        with tracer.span('pip download', REQUIREMENTS, file='a.txt',
+                         requirement=None):
+            pass
+    start = tracer.origin
+    tracer.add('build_wheel', PACKAGE, start, start + 2, 1234,
+               package='six-1.0.tar.gz')
+    tracer.add('build_wheel', PACKAGE, start, start + 1, 1234,
+               package='idna-3.4.tar.gz')
+    assert_equal([(e['name'], e['cat']) for e in tracer.events], [
+        ('pip download', REQUIREMENTS),
+        ('download', PHASE),
+        ('build_wheel', PACKAGE),
+        ('build_wheel', PACKAGE),
+    ])
+    assert_equal(tracer.events[2]['dur'], 2000000)
+    assert_equal(tracer.events[2]['tid'], 1234)
+
+    fp = io.StringIO()
+    tracer.write(fp)
+    trace = json.loads(fp.getvalue())
+    assert_equal(len(trace['traceEvents']), 6)
+    thread_names = [e['args']['name'] for e in trace['traceEvents']
+                    if e['ph'] == 'M']
+    assert_equal(sorted(thread_names), ['MainThread', 'worker 1234'])
+
+    lines = format_timings(tracer, count=1)
+    assert_equal(lines[0], 'Phases:')
+    assert lines[1].endswith('s  download')
+    assert_equal(lines[2], 'Slowest downloads:')
+    assert lines[3].endswith('s  pip download a.txt')
+    assert_equal(lines[4:], ['Slowest packages:',
+                             '      2.00s  build_wheel six-1.0.tar.gz'])
+
+    tracer.reset()
+    assert_equal(tracer.events, [])
+    assert tracer.origin >= start
+    with tracer.span('download'):
+        pass
+    assert_equal([e['name'] for e in tracer.events], ['download'])
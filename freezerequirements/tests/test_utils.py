@@ -1,9 +1,27 @@
+import os
+import shutil
+import sys
 import os.path as op
+import io
+import tarfile
+import tempfile
+import threading
+import time
+from collections import Counter
 
-from nose.tools import assert_equal
+import sh
+from nose.tools import assert_equal, assert_raises
 
+from freezerequirements.hash_cache import HashCache
 from freezerequirements.utils import (likely_distro, group_and_select_packages,
-                                      get_wheel_name)
+                                      get_wheel_name, parallel_map,
+                                      build_wheels_pool, parse_size,
+                                      interpreter_tag, get_pure_wheel_name,
+                                      wheel_name_variants, merge_packages,
+                                      has_versions_conflicts,
+                                      parse_duration, place_files,
+                                      file_sha256, target_pip_args,
+                                      target_filename)
 
 
 DATA_DIR = op.join(op.dirname(__file__), 'data')
@@ -40,6 +58,27 @@ def test_group_and_select_packages():
     })
 
 
+def test_group_and_select_packages_pep440():
+    pkgs = [
+        ('requirements1.txt', ['foo-1.0.post1.tar.gz', 'foo-1.0rc1.tar.gz',
+                               'foo-1.0.tar.gz']),
+        ('requirements2.txt', ['foo-1.0.0.tar.gz', 'foo-1.0b2.tar.gz',
+                               'foo-1.0a10.tar.gz', 'foo-1.0a9.tar.gz',
+                               'foo-0.9-custom-build.tar.gz']),
+    ]
+    assert_equal(group_and_select_packages(pkgs), {
+        'foo': [
+            ('0.9-custom-build', ['requirements2.txt']),
+            ('1.0a9', ['requirements2.txt']),
+            ('1.0a10', ['requirements2.txt']),
+            ('1.0b2', ['requirements2.txt']),
+            ('1.0rc1', ['requirements1.txt']),
+            ('1.0', ['requirements1.txt', 'requirements2.txt']),
+            ('1.0.post1', ['requirements1.txt']),
+        ],
+    })
+
+
 def test_get_wheel_name():
     setuptools_package = op.join(DATA_DIR, 'simple-setuptools-0.0.0.tar.gz')
     assert get_wheel_name(setuptools_package).endswith('.whl')
@@ -47,3 +86,238 @@ def test_get_wheel_name():
     assert get_wheel_name(distutils_package).endswith('.whl')
     distutils_package = op.join(DATA_DIR, 'simple-setuptools-0.0.0.zip')
     assert get_wheel_name(distutils_package).endswith('.whl')
+
+
+def make_sdist(directory, name, files):
+    path = op.join(directory, '%s.tar.gz' % name)
+    with tarfile.open(path, 'w:gz') as archive:
+        for filename, contents in files.items():
+            info = tarfile.TarInfo('%s/%s' % (name, filename))
+            contents = contents.encode('utf-8')
+            info.size = len(contents)
+            archive.addfile(info, io.BytesIO(contents))
+    return path
+
+
+def test_get_pure_wheel_name():
+    py = 'py%s' % sys.version_info[0]
+    assert_equal(
+        get_pure_wheel_name(op.join(DATA_DIR,
+                                    'simple-setuptools-0.0.0.tar.gz')),
+        'simple_setuptools-0.0.0-%s-none-any.whl' % py
+    )
+    assert_equal(
+        get_pure_wheel_name(op.join(DATA_DIR, 'simple-setuptools-0.0.0.zip')),
+        'simple_setuptools-0.0.0-%s-none-any.whl' % py
+    )
+    work_dir = tempfile.mkdtemp()
+    pkg_info = 'Metadata-Version: 1.0\nName: Foo.Bar\nVersion: 1.0-1\n'
+    universal = make_sdist(work_dir, 'Foo.Bar-1.0-1', {
+        'PKG-INFO': pkg_info,
+        'setup.py': 'from setuptools import setup\n'
+                    'setup(name="Foo.Bar", version="1.0-1")\n',
+        'setup.cfg': '[bdist_wheel]\nuniversal = 1\n',
+    })
+    assert_equal(get_pure_wheel_name(universal),
+                 'Foo.Bar-1.0.post1-py2.py3-none-any.whl')
+    # The python tag is the one of the interpreter building wheels
+    mixed_case = make_sdist(work_dir, 'My_Pkg-2.0', {
+        'PKG-INFO': 'Metadata-Version: 1.0\nName: My_Pkg\nVersion: 2.0\n',
+        'setup.py': 'from setuptools import setup\n'
+                    'setup(name="My_Pkg", version="2.0")\n',
+    })
+    assert_equal(get_pure_wheel_name(mixed_case, 'cpython-27-none-linux'),
+                 'My_Pkg-2.0-py2-none-any.whl')
+    flit = make_sdist(work_dir, 'flit-1.0', {
+        'PKG-INFO': pkg_info,
+        'pyproject.toml': '[build-system]\n'
+                          'build-backend = "flit_core.buildapi"\n'
+                          '[project]\ndescription = "Foo"\n'
+                          '[project.scripts]\nfoo = "foo:main"\n',
+    })
+    assert_equal(get_pure_wheel_name(flit),
+                 'foo_bar-1.0.post1-py3-none-any.whl')
+    # Packages that may not be pure need the slow path
+    for files in [
+        {'PKG-INFO': pkg_info, 'setup.py': 'setup()', 'foo.c': ''},
+        {'PKG-INFO': pkg_info, 'setup.py': 'setup(ext_modules=[])'},
+        {'PKG-INFO': pkg_info, 'setup.py': 'setup()',
+         'setup.cfg': '[bdist_wheel]\npy_limited_api = cp36\n'},
+        {'PKG-INFO': pkg_info, 'pyproject.toml': 'build-backend = "maturin"'},
+        {'PKG-INFO': pkg_info,
+         'pyproject.toml': 'build-backend = "hatchling.build"\n'
+                           '[tool.hatch.build.hooks.custom]\n'},
+        {'PKG-INFO': pkg_info,
+         'pyproject.toml': 'build-backend = "poetry.core.masonry.api"\n'
+                           '[tool.poetry.build]\nscript = "build.py"\n'},
+        {'setup.py': 'setup()'},
+    ]:
+        sdist = make_sdist(tempfile.mkdtemp(), 'pkg-1.0', files)
+        assert get_pure_wheel_name(sdist) is None
+
+
+def test_get_pure_wheel_name_matches_build():
+    # Wheels built by older setuptools keep the case and dots of project
+    # names, newer ones normalize them; builds are isolated, as newer pip
+    # versions always do, so they use the latest setuptools
+    work_dir = tempfile.mkdtemp()
+    sdists = [op.join(DATA_DIR, 'simple-setuptools-0.0.0.tar.gz')]
+    for name, version, setup_cfg in [('Foo.Bar', '1.0-1', '[bdist_wheel]\n'
+                                      'universal = 1\n'),
+                                     ('My_Pkg', '2.0', ''),
+                                     ('Zope.Thing', '1.0', '')]:
+        sdists.append(make_sdist(work_dir, '%s-%s' % (name, version), {
+            'PKG-INFO': 'Metadata-Version: 1.0\nName: %s\nVersion: %s\n' %
+                        (name, version),
+            'setup.py': 'from setuptools import setup\n'
+                        'setup(name=%r, version=%r)\n' % (name, version),
+            'setup.cfg': setup_cfg,
+        }))
+    interpreter = interpreter_tag('pip')
+    for sdist in sdists:
+        wheel_dir = tempfile.mkdtemp(dir=work_dir)
+        sh.Command(sys.executable)('-m', 'pip', 'wheel', '--quiet',
+                                   '--use-pep517', '--no-deps',
+                                   '--wheel-dir', wheel_dir, sdist)
+        wheel, = os.listdir(wheel_dir)
+        assert wheel in wheel_name_variants(
+            get_pure_wheel_name(sdist, interpreter)), wheel
+
+
+def test_wheel_name_variants():
+    assert_equal(wheel_name_variants('Zope.Thing-1.0-py3-none-any.whl'),
+                 ['Zope.Thing-1.0-py3-none-any.whl',
+                  'zope_thing-1.0-py3-none-any.whl'])
+    assert_equal(wheel_name_variants('six-1.0-py2.py3-none-any.whl'),
+                 ['six-1.0-py2.py3-none-any.whl'])
+
+
+def test_parallel_map():
+    def slow_square(x):
+        time.sleep(0.01 * (5 - x))
+        return x * x
+    assert_equal(list(parallel_map(slow_square, range(5), 3)),
+                 [0, 1, 4, 9, 16])
+    assert_equal(list(parallel_map(slow_square, range(5), 1)),
+                 [0, 1, 4, 9, 16])
+
+
+def test_parallel_map_cancel():
+    release = threading.Event()
+    cancelled = []
+
+    def job(x):
+        if x == 0:
+            raise ValueError(x)
+        release.wait(5)
+        return x
+
+    def cancel():
+        cancelled.append(True)
+        release.set()
+
+    with assert_raises(ValueError):
+        list(parallel_map(job, range(10), 2, cancel=cancel))
+    assert_equal(cancelled, [True])
+
+
+def test_build_wheels_pool_failures():
+    work_dir = tempfile.mkdtemp()
+    broken_package = op.join(work_dir, 'broken-0.0.0.tar.gz')
+    with open(broken_package, 'w') as fp:
+        fp.write('not an archive')
+    package = op.join(work_dir, 'simple-setuptools-0.0.0.tar.gz')
+    shutil.copy(op.join(DATA_DIR, op.basename(package)), package)
+    built = []
+    wheels, failures = build_wheels_pool(
+        'pip', [broken_package, package], 2, work_dir,
+        on_built=lambda *args: built.append(args))
+    # Successful builds are reported as they complete
+    assert_equal(list(wheels), [package])
+    assert_equal(built, [(package, wheels[package])])
+    assert_equal(list(failures), [broken_package])
+    assert op.exists(failures[broken_package])
+    assert os.stat(failures[broken_package]).st_size
+
+
+def test_parse_size():
+    assert_equal(parse_size('123'), 123)
+    assert_equal(parse_size('2K'), 2048)
+    assert_equal(parse_size('1.5g'), 1536 * 1024 ** 2)
+    assert_equal(parse_size('10MB'), 10 * 1024 ** 2)
+    with assert_raises(ValueError):
+        parse_size('lots')
+
+
+def test_interpreter_tag():
+    tag = interpreter_tag('pip')
+    assert tag
+    assert_equal(tag, interpreter_tag('pip'))
+
+
+def test_merge_packages():
+    assert_equal(merge_packages([['a-1.tar.gz', 'b-1.tar.gz'],
+                                 ['b-1.tar.gz', 'c-1.tar.gz']]),
+                 ['a-1.tar.gz', 'b-1.tar.gz', 'c-1.tar.gz'])
+    assert not has_versions_conflicts(['a-1.tar.gz', 'b-1.tar.gz',
+                                       'a-1.tar.gz'])
+    assert has_versions_conflicts(['a-1.tar.gz', 'b-1.tar.gz', 'a-2.zip'])
+
+
+def test_parse_duration():
+    assert_equal(parse_duration('2'), 2 * 86400)
+    assert_equal(parse_duration('12h'), 12 * 3600)
+    assert_equal(parse_duration('90s'), 90)
+    with assert_raises(ValueError):
+        parse_duration('soon')
+
+
+def test_place_files():
+    src_dir = tempfile.mkdtemp()
+    dst_dir = op.join(tempfile.mkdtemp(), 'six')
+    paths = []
+    for name in ('six-1.0.tar.gz', 'six-1.0-py3-none-any.whl'):
+        paths.append(op.join(src_dir, name))
+        with open(paths[-1], 'w') as fp:
+            fp.write(name)
+    stats = Counter()
+    place_files(paths, dst_dir, stats)
+    assert_equal(sorted(os.listdir(dst_dir)), sorted(op.basename(p)
+                                                     for p in paths))
+    assert_equal(os.listdir(src_dir), [])
+    assert_equal(stats['renamed'], 2)
+    # Existing files are replaced
+    with open(paths[0], 'w') as fp:
+        fp.write('new')
+    place_files(paths[:1], dst_dir)
+    with open(op.join(dst_dir, 'six-1.0.tar.gz')) as fp:
+        assert_equal(fp.read(), 'new')
+
+
+def test_place_files_hash_cache():
+    src_dir = tempfile.mkdtemp()
+    dst_dir = tempfile.mkdtemp()
+    hash_cache = HashCache(op.join(src_dir, 'hashes.sqlite3'))
+    paths = []
+    for name in ('six-1.0.tar.gz', 'idna-3.4.tar.gz'):
+        paths.append(op.join(src_dir, name))
+        with open(paths[-1], 'w') as fp:
+            fp.write(name)
+    digest = hash_cache.hash(paths[0])
+    place_files(paths, dst_dir, hash_cache=hash_cache)
+    # Renamed files keep their cached digest, without being read again
+    six_path = op.join(dst_dir, 'six-1.0.tar.gz')
+    assert_equal(hash_cache.get(six_path), digest)
+    assert_equal(digest, file_sha256(six_path))
+    assert hash_cache.get(op.join(dst_dir, 'idna-3.4.tar.gz')) is None
+
+
+def test_targets():
+    assert_equal(target_pip_args('py3.10-manylinux2014_x86_64'),
+                 ['--python-version', '3.10', '--platform',
+                  'manylinux2014_x86_64', '--only-binary', ':all:'])
+    assert_equal(target_pip_args('py3-any')[:2], ['--python-version', '3'])
+    assert_raises(ValueError, target_pip_args, '3.10-manylinux2014_x86_64')
+    assert_raises(ValueError, target_pip_args, 'py3.10')
+    assert_equal(target_filename('reqs/frozen.txt', 'py3.10-win_amd64'),
+                 'reqs/frozen-py3.10-win_amd64.txt')
@@ -0,0 +1,62 @@
+import os
+import os.path as op
+import tempfile
+import threading
+import time
+
+from nose.tools import assert_equal
+
+from freezerequirements.watch import (InotifyWatcher, PollingWatcher,
+                                      wait_for_changes)
+
+
+def check_watcher(watcher_class, **kwargs):
+    directory = tempfile.mkdtemp()
+    path = op.join(directory, 'requirements.txt')
+    other_path = op.join(directory, 'other.txt')
+    with open(path, 'w') as fp:
+        fp.write('six\n')
+    watcher = watcher_class([path], **kwargs)
+    try:
+        assert_equal(watcher.wait(0.1), set())
+        # Other files are ignored
+        with open(other_path, 'w') as fp:
+            fp.write('idna\n')
+        assert_equal(watcher.wait(0.1), set())
+        # Files rewritten in place
+        with open(path, 'w') as fp:
+            fp.write('six==1.16.0\n')
+        assert_equal(watcher.wait(1), set([path]))
+        # Files replaced by a rename
+        os.rename(other_path, path)
+        assert_equal(watcher.wait(1), set([path]))
+    finally:
+        watcher.close()
+
+
+def test_inotify_watcher():
+    check_watcher(InotifyWatcher)
+
+
+def test_polling_watcher():
+    check_watcher(PollingWatcher, interval=0.01)
+
+
+def test_wait_for_changes():
+    directory = tempfile.mkdtemp()
+    paths = [op.join(directory, name) for name in ('a.txt', 'b.txt')]
+    for path in paths:
+        open(path, 'w').close()
+    watcher = PollingWatcher(paths, interval=0.01)
+
+    def write_files():
+        # A burst of writes, reported at once
+        for path in paths:
+            with open(path, 'w') as fp:
+                fp.write('six\n')
+            time.sleep(0.05)
+
+    thread = threading.Thread(target=write_files)
+    thread.start()
+    assert_equal(wait_for_changes(watcher, debounce=0.2), set(paths))
+    thread.join()
@@ -0,0 +1,69 @@
+import os
+import os.path as op
+import tempfile
+import time
+
+from nose.tools import assert_equal
+
+from freezerequirements.wheel_cache import WheelCache
+
+
+def make_file(path, contents):
+    with open(path, 'w') as fp:
+        fp.write(contents)
+    return path
+
+
+def test_get_put():
+    work_dir = tempfile.mkdtemp()
+    cache = WheelCache(op.join(work_dir, 'cache'), 'tag')
+    sdist = make_file(op.join(work_dir, 'foo-1.0.tar.gz'), 'sdist')
+    wheel = make_file(op.join(work_dir, 'foo-1.0-py3-none-any.whl'), 'wheel')
+    dst_dir = tempfile.mkdtemp()
+    assert cache.get(sdist, dst_dir) is None
+    cache.put(sdist, wheel)
+    # Storing twice is harmless
+    cache.put(sdist, wheel)
+    wheel_path = cache.get(sdist, dst_dir)
+    assert_equal(wheel_path, op.join(dst_dir, 'foo-1.0-py3-none-any.whl'))
+    with open(wheel_path) as fp:
+        assert_equal(fp.read(), 'wheel')
+    # Entries are keyed by interpreter tag and contents, not filename
+    other_cache = WheelCache(op.join(work_dir, 'cache'), 'other-tag')
+    assert other_cache.get(sdist, tempfile.mkdtemp()) is None
+    make_file(sdist, 'changed sdist')
+    assert cache.get(sdist, tempfile.mkdtemp()) is None
+
+
+def test_evict():
+    work_dir = tempfile.mkdtemp()
+    cache = WheelCache(op.join(work_dir, 'cache'), 'tag', max_size=25)
+    sdists = []
+    for i in range(3):
+        sdist = make_file(op.join(work_dir, 'pkg%s-1.0.tar.gz' % i), str(i))
+        wheel = make_file(op.join(work_dir, 'pkg%s-1.0-py3-none-any.whl' % i),
+                          '%s' % i * 10)
+        cache.put(sdist, wheel)
+        os.utime(cache.entry_path(sdist), (time.time() - 100 + i,) * 2)
+        sdists.append(sdist)
+    # Use the oldest entry, so the second one is evicted instead
+    assert cache.get(sdists[0], tempfile.mkdtemp())
+    assert_equal(cache.evict(), 10)
+    assert op.exists(cache.entry_path(sdists[0]))
+    assert not op.exists(cache.entry_path(sdists[1]))
+    assert op.exists(cache.entry_path(sdists[2]))
+
+
+def test_known_digest():
+    work_dir = tempfile.mkdtemp()
+    cache = WheelCache(op.join(work_dir, 'cache'), 'tag')
+    sdist = make_file(op.join(work_dir, 'foo-1.0.tar.gz'), 'sdist')
+    wheel = make_file(op.join(work_dir, 'foo-1.0-py3-none-any.whl'), 'wheel')
+    # Digests computed elsewhere are used as is, without hashing sdists
+    digest = 'ab' * 32
+    cache.put(sdist, wheel, digest)
+    assert_equal(cache.entry_path(sdist, digest),
+                 op.join(work_dir, 'cache', 'ab', '%s-tag' % digest))
+    assert op.isdir(cache.entry_path(sdist, digest))
+    assert cache.get(sdist, tempfile.mkdtemp(), digest)
+    assert cache.get(sdist, tempfile.mkdtemp()) is None
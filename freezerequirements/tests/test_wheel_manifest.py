@@ -0,0 +1,61 @@
+import os
+import os.path as op
+import shutil
+import tempfile
+
+from nose.tools import assert_equal
+
+from freezerequirements.utils import (file_sha256, get_wheel_name,
+                                      interpreter_tag)
+from freezerequirements.wheel_manifest import WheelManifest
+
+
+DATA_DIR = op.join(op.dirname(__file__), 'data')
+SDIST = 'simple-setuptools-0.0.0.tar.gz'
+
+
+def make_output_dir():
+    output_dir = tempfile.mkdtemp()
+    package_dir = op.join(output_dir, 'simple-setuptools')
+    os.mkdir(package_dir)
+    sdist_path = op.join(package_dir, SDIST)
+    shutil.copy(op.join(DATA_DIR, SDIST), sdist_path)
+    wheel = get_wheel_name(sdist_path)
+    open(op.join(package_dir, wheel), 'w').close()
+    return output_dir, file_sha256(sdist_path), wheel
+
+
+def test_wheel_manifest():
+    output_dir, digest, wheel = make_output_dir()
+    manifest = WheelManifest(output_dir, 'tag')
+    assert manifest.get(SDIST, digest) is None
+    manifest.set(SDIST, digest, wheel)
+    manifest.set(SDIST, digest, 'missing.whl')
+    # Concurrent changes are kept
+    other_manifest = WheelManifest(output_dir, 'other-tag')
+    other_manifest.set(SDIST, digest, wheel)
+    other_manifest.save()
+    manifest.save()
+    manifest = WheelManifest(output_dir, 'tag')
+    assert_equal(len(manifest.entries), 2)
+    # Wheels missing from the output dir are ignored
+    assert manifest.get(SDIST, digest) is None
+    manifest.set(SDIST, digest, wheel)
+    assert_equal(manifest.get(SDIST, digest),
+                 op.join(output_dir, 'simple-setuptools', wheel))
+    assert manifest.get(SDIST, 'other digest') is None
+    assert_equal([f for f in os.listdir(output_dir) if f.startswith('.tmp')],
+                 [])
+
+
+def test_wheel_manifest_verify():
+    output_dir, digest, wheel = make_output_dir()
+    tag = interpreter_tag('pip')
+    manifest = WheelManifest(output_dir, tag)
+    manifest.set(SDIST, 'stale digest', wheel)
+    manifest.set(SDIST, digest, 'missing.whl')
+    assert_equal(manifest.verify(), (2, 1))
+    manifest.save()
+    manifest = WheelManifest(output_dir, tag)
+    assert_equal(manifest.entries, {(SDIST, digest, tag): wheel})
+    assert_equal(manifest.verify(), (0, 0))
@@ -0,0 +1,148 @@
+'''
+Lightweight tracing of the time spent in each phase of a freeze.
+
+Code measures spans with the global :data:`tracer`, which records nothing
+until it is enabled::
+
+    with tracer.span('download', 'requirements', file='requirements.txt'):
+        ...
+
+Spans are written in the Chrome trace event format, which can be loaded in
+``chrome://tracing`` or https://ui.perfetto.dev, and summarized with
+:func:`format_timings`.
+'''
+import contextlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+
+# Categories of spans: phases of a freeze, downloads of requirements files
+# (or single requirements), and operations on a single package
+PHASE = 'phase'
+REQUIREMENTS = 'requirements'
+PACKAGE = 'package'
+
+
+class Tracer(object):
+    '''
+    Records spans from any thread, as Chrome "complete" events.
+    '''
+
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self.origin = time.time()
+        self._lock = threading.Lock()
+        self._threads = {}
+
+    def enable(self):
+        self.enabled = True
+        self.origin = time.time()
+
+    def reset(self):
+        '''
+        Forget the recorded spans and measure new ones from now on, so
+        long-running processes don't keep them forever.
+        '''
+        with self._lock:
+            self.events = []
+            self._threads = {}
+            self.origin = time.time()
+
+    @contextlib.contextmanager
+    def span(self, name, category=PHASE, **args):
+        '''
+        Record the time spent in the ``with`` block as a span named *name*,
+        in *category*, with the arguments *args*.
+        '''
+        if not self.enabled:
+            yield
+            return
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add(name, category, start, time.time(), **args)
+
+    def add(self, name, category, start, end, pid=None, **args):
+        '''
+        Record a span measured elsewhere, from *start* to *end* timestamps
+        (as returned by :func:`time.time`). *pid* is the process the span
+        ran in, the current one by default.
+        '''
+        if not self.enabled:
+            return
+        if pid is None:
+            pid = os.getpid()
+            thread = threading.current_thread()
+            tid = thread.ident
+        else:
+            thread = None
+            tid = pid
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': int((start - self.origin) * 1e6),
+            'dur': int((end - start) * 1e6),
+            'pid': pid,
+            'tid': tid,
+            'args': args,
+        }
+        with self._lock:
+            self.events.append(event)
+            if (pid, tid) not in self._threads:
+                self._threads[(pid, tid)] = (
+                    thread.name if thread is not None else 'worker %s' % pid)
+
+    def durations(self, category):
+        '''
+        Return ``(event, duration in seconds)`` tuples for the spans of
+        *category*.
+        '''
+        return [(e, e['dur'] / 1e6) for e in self.events
+                if e['cat'] == category]
+
+    def write(self, fp):
+        '''
+        Write the recorded spans in the Chrome trace event JSON format to the
+        file object *fp*.
+        '''
+        events = list(self.events)
+        for (pid, tid), name in sorted(self._threads.items()):
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid,
+                           'tid': tid, 'args': {'name': name}})
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, fp)
+        fp.write('\n')
+
+
+tracer = Tracer()
+
+
+def format_timings(tracer, count=10):
+    '''
+    Return the lines of a summary of the spans recorded by *tracer*: the
+    total time of each phase, and the *count* slowest downloads and package
+    operations.
+    '''
+    lines = []
+    phases = defaultdict(float)
+    for event, duration in tracer.durations(PHASE):
+        phases[event['name']] += duration
+    if phases:
+        lines.append('Phases:')
+        for name, duration in sorted(phases.items(), key=lambda i: -i[1]):
+            lines.append('  %8.2fs  %s' % (duration, name))
+    for category, title in ((REQUIREMENTS, 'Slowest downloads:'),
+                            (PACKAGE, 'Slowest packages:')):
+        spans = sorted(tracer.durations(category), key=lambda i: -i[1])
+        if spans:
+            lines.append(title)
+        for event, duration in spans[:count]:
+            lines.append('  %8.2fs  %s' % (duration, ' '.join(
+                [event['name']] +
+                [str(v) for v in event['args'].values() if v is not None])))
+    return lines
@@ -1,5 +1,3 @@
-from __future__ import print_function
-
 import sys
 import shutil
 import atexit
@@ -7,19 +5,21 @@ import os.path as op
 import string
 import hashlib
 import os
-import bisect
 import tempfile
-from collections import defaultdict
-from distutils.version import LooseVersion
+import errno
+import time
+from collections import defaultdict, Counter
+from functools import lru_cache
 from itertools import takewhile
 import glob
-import six
 import re
+import configparser
 
-import sh
-from setuptools.package_index import distros_for_filename
 
 from .archive import Archive
+from .filenames import parse_package_filename, safe_version
+from .exceptions import WheelBuildError
+from .tracing import tracer, PACKAGE
 
 
 CLI_COLORS = {
@@ -30,6 +30,29 @@ CLI_COLORS = {
     'fail': 91,
 }
 _canonicalize_regex = re.compile(r"[-_.]+")
+_target_regex = re.compile(r'^py(\d+(?:\.\d+)?)-(\w+)$')
+# Files that can only be part of packages with compiled extensions
+EXTENSION_SOURCE_SUFFIXES = ('.c', '.cc', '.cpp', '.cxx', '.pyx', '.f',
+                             '.f90', '.rs', '.go', '.m', '.mm')
+# setup.py contents hinting at extensions or custom wheel tags
+SETUP_PY_NON_PURE_MARKERS = ('ext_modules', 'Extension', 'cffi_modules',
+                             'rust_extensions', 'bdist_wheel', 'distclass',
+                             'has_ext_modules', 'libraries')
+# PEP 517 backends building pure python wheels, unless configured with build
+# hooks or scripts, and naming them with normalized project names (setuptools
+# keeps the case and dots of project names)
+PURE_BUILD_BACKENDS = ('flit_core.buildapi', 'hatchling.build',
+                       'poetry.core.masonry.api')
+SETUPTOOLS_BUILD_BACKENDS = ('setuptools.build_meta',
+                             'setuptools.build_meta:__legacy__')
+# pyproject.toml settings running code at build time: hatch build hooks,
+# poetry build scripts
+_build_hooks_regex = re.compile(
+    r'^\s*\[[^\]\n]*\bhooks\b|^\s*\[tool\.poetry\.build\]|'
+    r'^\s*(?:build|script)\s*=|build\.py', re.MULTILINE)
+# Files read to compute wheel names without running setup.py
+PACKAGE_METADATA_FILES = ('PKG-INFO', 'setup.py', 'setup.cfg',
+                          'pyproject.toml')
 
 
 class cd(object):
@@ -59,7 +82,12 @@ def likely_distro(filename):
     '''
     Get the first distro as returned by :func:`distros_for_filename` that has a
     version that starts with a number.
+
+    This creates several setuptools distributions per call; use
+    :func:`freezerequirements.filenames.parse_package_filename` instead when
+    only the key and version are needed.
     '''
+    from setuptools.package_index import distros_for_filename
     distros = [d for d in distros_for_filename(filename)
                if d.version and d.version[0] in string.digits]
     if len(distros) < 1:
@@ -71,10 +99,155 @@ def file_hash(filename):
     '''
     Return the hash of *filename* contents.
     '''
-    with open(filename) as fp:
+    with open(filename, 'rb') as fp:
         return hashlib.sha1(fp.read()).hexdigest()
 
 
+def file_sha256(filename):
+    '''
+    Return the sha256 hex digest of *filename* contents.
+    '''
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def link_or_copy(src, dst):
+    '''
+    Hard link *src* to *dst*, or copy it if they are not on the same
+    filesystem.
+    '''
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def parse_size(value):
+    '''
+    Parse a size in bytes, with an optional K, M, G or T suffix (e.g.
+    ``512M``).
+    '''
+    value = value.strip().upper()
+    units = 'KMGT'
+    multiplier = 1
+    if value.endswith('B'):
+        value = value[:-1]
+    if value and value[-1] in units:
+        multiplier = 1024 ** (units.index(value[-1]) + 1)
+        value = value[:-1]
+    try:
+        return int(float(value) * multiplier)
+    except ValueError:
+        raise ValueError('invalid size: %s' % value)
+
+
+def format_size(size):
+    '''
+    Format *size* in bytes for humans (e.g. ``1.5M``).
+    '''
+    for unit in ('', 'K', 'M', 'G'):
+        if size < 1024:
+            break
+        size /= 1024.0
+    else:
+        unit = 'T'
+    if not unit:
+        return '%sB' % size
+    return '%.1f%s' % (size, unit)
+
+
+def parse_duration(value):
+    '''
+    Parse a duration in seconds, with an optional s, m, h, d or w suffix
+    (e.g. ``30d``); durations without suffix are in days.
+    '''
+    value = value.strip().lower()
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+    multiplier = units['d']
+    if value and value[-1] in units:
+        multiplier = units[value[-1]]
+        value = value[:-1]
+    try:
+        return float(value) * multiplier
+    except ValueError:
+        raise ValueError('invalid duration: %s' % value)
+
+
+def target_pip_args(target):
+    '''
+    Get the pip options selecting the packages of *target*, a Python version
+    and platform written ``pyX.Y-PLATFORM`` (e.g.
+    ``py3.10-manylinux2014_x86_64``). Only wheels can be selected for other
+    environments than pip's.
+    '''
+    match = _target_regex.match(target)
+    if match is None:
+        raise ValueError('invalid target: %s' % target)
+    python_version, platform = match.groups()
+    return ['--python-version', python_version, '--platform', platform,
+            '--only-binary', ':all:']
+
+
+def target_filename(filename, target):
+    '''
+    Insert *target* before the extension of *filename*.
+    '''
+    root, ext = op.splitext(filename)
+    return '%s-%s%s' % (root, target, ext)
+
+
+def pip_interpreter(pip_bin):
+    '''
+    Guess the path of the Python interpreter running *pip_bin* from its
+    shebang, falling back to the current interpreter.
+    '''
+    path = shutil.which(pip_bin) or pip_bin
+    try:
+        with open(path, 'rb') as fp:
+            lines = [fp.readline(1024), fp.readline(1024)]
+    except (IOError, OSError):
+        return sys.executable
+    if not lines[0].startswith(b'#!'):
+        return sys.executable
+    words = lines[0][2:].decode('utf-8', 'replace').split()
+    if words and op.basename(words[0]) == 'env':
+        words = words[1:]
+    if words and op.basename(words[0]) == 'sh':
+        # Long shebangs are replaced by a "'''exec' python "$0" "$@"" line
+        words = lines[1].decode('utf-8', 'replace').split()[1:]
+    if not words:
+        return sys.executable
+    return words[0]
+
+
+_interpreter_tags = {}
+
+
+def interpreter_tag(pip_bin):
+    '''
+    Return a tag identifying the implementation, version, ABI and platform of
+    the Python interpreter running *pip_bin*, e.g.
+    ``cpython-311-cpython-311-x86_64-linux-gnu-linux-x86_64``.
+    '''
+    if pip_bin not in _interpreter_tags:
+        import sh
+        python = sh.Command(pip_interpreter(pip_bin))
+        output = python(
+            '-c',
+            "import platform, sysconfig;"
+            "print('-'.join([platform.python_implementation().lower(), "
+            "''.join(platform.python_version_tuple()[:2]), "
+            "sysconfig.get_config_var('SOABI') or 'none', "
+            "sysconfig.get_platform()]))"
+        )
+        tag = str(output).strip()
+        _interpreter_tags[pip_bin] = re.sub(r'[^\w.]+', '-', tag).lower()
+    return _interpreter_tags[pip_bin]
+
+
 def cache_dir():
     '''
     Return the application's cache directory.
@@ -83,11 +256,30 @@ def cache_dir():
     return op.join(cache_dir, 'freeze-requirements')
 
 
-def cache_path(filename):
+def merge_packages(packages_lists):
+    '''
+    Merge *packages_lists*, removing duplicates but keeping order.
+    '''
+    ret = []
+    seen = set()
+    for packages in packages_lists:
+        for package in packages:
+            if package not in seen:
+                seen.add(package)
+                ret.append(package)
+    return ret
+
+
+def has_versions_conflicts(packages):
     '''
-    Get cache path for *filename*.
+    Test if *packages* filenames contain multiple versions of a distribution.
     '''
-    return op.join(cache_dir(), file_hash(filename))
+    versions = {}
+    for package in packages:
+        distro = parse_package_filename(package)
+        if versions.setdefault(distro.key, distro.version) != distro.version:
+            return True
+    return False
 
 
 def group_and_select_packages(packages_groups):
@@ -115,31 +307,60 @@ def group_and_select_packages(packages_groups):
             ]
         }
 
-    Versions are sorted in ascending order, so the last item is always the
-    highest version.
+    Versions are sorted in ascending order according to PEP 440, so the last
+    item is always the highest version (see :func:`version_sort_key`).
+    Versions that compare equal (e.g. ``1.0`` and ``1.0.0``) are grouped
+    under the first one found.
     '''
-    # Create a dict with sorted versions
-    grouped_packages = defaultdict(
-        lambda: {'versions': [], 'reqs_files': defaultdict(list)}
-    )
+    # Index versions by sort key, so each package is grouped in constant time
+    # and sort keys are computed once per distinct version
+    grouped_packages = defaultdict(dict)
     for reqs_file, packages in packages_groups:
         for package in packages:
-            distro = likely_distro(package)
-            entry = grouped_packages[distro.key]
-            version = LooseVersion(distro.version)
-            if version not in entry['versions']:
-                bisect.insort(entry['versions'], version)
-            entry['reqs_files'][str(version)].append(reqs_file)
-    # Unwrap dict to its final form
-    ret = defaultdict(list)
-    for distro, entry in grouped_packages.items():
-        for version in entry['versions']:
-            version = str(version)
-            ret[distro].append((version, entry['reqs_files'][version]))
-    return dict(ret)
-
-
-class StringWithAttrs(six.text_type):
+            distro = parse_package_filename(package)
+            versions = grouped_packages[distro.key]
+            sort_key = version_sort_key(distro.version)
+            entry = versions.get(sort_key)
+            if entry is None:
+                entry = versions[sort_key] = (distro.version, [])
+            entry[1].append(reqs_file)
+    # Sort versions of each distro
+    return dict(
+        (distro, [versions[k] for k in sorted(versions)])
+        for distro, versions in grouped_packages.items()
+    )
+
+
+_legacy_version_component_regex = re.compile(r'(\d+|[a-z]+|\.|-)')
+
+
+@lru_cache(maxsize=65536)
+def version_sort_key(version):
+    '''
+    Get a key to sort *version* strings according to PEP 440.
+
+    Versions that are not valid PEP 440 versions (e.g. dates like
+    ``2013-01-29-16-44-48.878536``) sort before all valid versions, their
+    numeric and alphabetic parts being compared like
+    :class:`distutils.version.LooseVersion` does.
+    '''
+    from packaging.version import Version, InvalidVersion
+
+    try:
+        return (1, Version(version))
+    except InvalidVersion:
+        components = []
+        for part in _legacy_version_component_regex.split(version.lower()):
+            if not part or part in '.-':
+                continue
+            if part.isdigit():
+                components.append((0, int(part), ''))
+            else:
+                components.append((1, 0, part))
+        return (0, tuple(components))
+
+
+class StringWithAttrs(str):
     '''
     An unicode subclass, to be able to add attributes.
     '''
@@ -147,50 +368,279 @@ class StringWithAttrs(six.text_type):
     pass
 
 
-def create_work_dir():
+# Work directories created by create_work_dir() and not removed yet
+_work_dirs = []
+
+
+def create_work_dir(parent_dir=None):
     '''
-    Create a temporary work directory, automatically cleaned at exit.
+    Create a temporary work directory, automatically cleaned at exit or by
+    :func:`clean_work_dirs`.
+
+    The directory is hidden in *parent_dir* if given (e.g. to create it on
+    the same filesystem as the files it will be moved to), or created in the
+    default temporary directory.
     '''
-    path = tempfile.mkdtemp(prefix='freeze-requirements-')
-    atexit.register(shutil.rmtree, path)
+    if parent_dir is None:
+        path = tempfile.mkdtemp(prefix='freeze-requirements-')
+    else:
+        path = tempfile.mkdtemp(prefix='.freeze-requirements-',
+                                dir=parent_dir)
+    _work_dirs.append(path)
     return path
 
 
-def run_setup_with_setuptools(*commands):
+def clean_work_dirs():
+    '''
+    Remove the work directories created so far, for long-running processes
+    that can't wait until exit.
+    '''
+    while _work_dirs:
+        shutil.rmtree(_work_dirs.pop(), True)
+
+
+atexit.register(clean_work_dirs)
+
+
+def copy_file(src, dst, digest=None):
+    '''
+    Copy *src* contents and metadata to *dst*, updating the :mod:`hashlib`
+    object *digest* with the contents if given.
+    '''
+    with open(src, 'rb') as src_fp, open(dst, 'wb') as dst_fp:
+        for chunk in iter(lambda: src_fp.read(1024 * 1024), b''):
+            dst_fp.write(chunk)
+            if digest is not None:
+                digest.update(chunk)
+    shutil.copystat(src, dst)
+
+
+def place_files(paths, dst_dir, stats=None, hash_cache=None):
+    '''
+    Move the files at *paths* to *dst_dir*, replacing existing files.
+
+    Files are renamed when possible, and copied when *dst_dir* is on another
+    filesystem; copies are written to a temporary file first, so files
+    appear atomically in *dst_dir*. If *stats* is given, its ``renamed``,
+    ``copied`` and ``copied_bytes`` counts are updated.
+
+    If *hash_cache* is given, the digests of the placed files are stored in
+    this :class:`~freezerequirements.hash_cache.HashCache`: renamed files
+    keep the digest cached for their source path, without being read, and
+    copied files are hashed while being copied.
+    '''
+    if stats is None:
+        stats = Counter()
+    if not op.isdir(dst_dir):
+        try:
+            os.makedirs(dst_dir)
+        except OSError:
+            if not op.isdir(dst_dir):
+                raise
+    for path in paths:
+        dst_path = op.join(dst_dir, op.basename(path))
+        try:
+            os.replace(path, dst_path)
+        except OSError as exc:
+            if exc.errno != errno.EXDEV:
+                raise
+        else:
+            stats['renamed'] += 1
+            # Renames keep the size and modification time of files
+            if hash_cache is not None:
+                hash_cache.rename(path, dst_path)
+            continue
+        fd, temp_path = tempfile.mkstemp(prefix='.tmp-', dir=dst_dir)
+        os.close(fd)
+        digest = hashlib.sha256() if hash_cache is not None else None
+        try:
+            copy_file(path, temp_path, digest)
+            os.replace(temp_path, dst_path)
+        except Exception:
+            os.unlink(temp_path)
+            raise
+        os.unlink(path)
+        if hash_cache is not None:
+            hash_cache.set(dst_path, digest.hexdigest())
+        stats['copied'] += 1
+        stats['copied_bytes'] += op.getsize(dst_path)
+
+
+def run_setup_with_setuptools(*commands, **kwargs):
     '''
     Run setup.py in the current directory, ensuring setuptools is activated.
 
-    Return command stdout.
+    Extra *kwargs* are passed to the :mod:`sh` command (e.g. ``_cwd`` or
+    ``_out``). Return command stdout.
     '''
+    import sh
     python = sh.Command(sys.executable)
     return python(
         '-c',
         "import setuptools;__file__='setup.py';"
         "exec(compile(open(__file__).read().replace('\\r\\n', '\\n'), "
         "__file__, 'exec'))",
-        *commands
+        *commands,
+        **kwargs
     )
 
 
-def get_wheel_name(package_filename):
+def get_wheel_name(package_filename, interpreter=None):
     '''
     Get wheel archive name from a source package filename.
+
+    The name is computed from the package metadata when possible, see
+    :func:`get_pure_wheel_name`, and by running the package setup.py
+    otherwise, see :func:`get_setup_wheel_name`.
     '''
-    archive = Archive(package_filename)
+    with tracer.span('get_wheel_name', PACKAGE,
+                     package=op.basename(package_filename)):
+        wheel_name = get_pure_wheel_name(package_filename, interpreter)
+        if wheel_name is None:
+            wheel_name = get_setup_wheel_name(package_filename)
+    return wheel_name
 
-    # Extract package to a temp directory
-    temp_dir = create_work_dir()
-    archive.extract_all(temp_dir)
 
-    # Find where packages have been extracted
-    extracted_package_dir = commonprefix(
-        op.realpath(op.join(temp_dir, p)) for p in archive.get_names()
+def get_setup_wheel_name(package_filename):
+    '''
+    Get wheel archive name from a source package filename, by extracting it
+    and running its setup.py.
+    '''
+    # Extract package to a temp directory
+    with Archive(package_filename) as archive:
+        extracted_package_dir = archive.extract_root(create_work_dir())
+
+    # Run setup.py wheel_name, making sure our command can be found even if
+    # its entry point is not registered
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        p for p in [op.dirname(op.dirname(op.abspath(__file__))),
+                    env.get('PYTHONPATH')] if p
+    )
+    output = run_setup_with_setuptools(
+        '--command-packages', 'freezerequirements', 'wheel_name',
+        _cwd=extracted_package_dir, _env=env
     )
+    return str(output).splitlines()[-1]
+
+
+def get_pure_wheel_name(package_filename, interpreter=None):
+    '''
+    Compute the wheel archive name of a pure python source package, reading
+    its PKG-INFO, setup.py, setup.cfg and pyproject.toml straight from the
+    archive. *interpreter* is the :func:`interpreter_tag` of the Python
+    building wheels, the current interpreter if None.
+
+    Return None if the package has no PKG-INFO, may contain compiled
+    extensions or customizes its wheel tags.
+    '''
+    # Read the metadata files at the root of the package and list all its
+    # members, in a single pass over the archive
+    with Archive(package_filename) as archive:
+        names, contents = archive.scan(
+            lambda name: op.basename(name) in PACKAGE_METADATA_FILES and
+            name.count('/') <= 1
+        )
+        root = archive.root
+
+    def member(name):
+        return '%s/%s' % (root, name) if root else name
+
+    def read(name):
+        return contents[member(name)].decode('utf-8', 'replace')
+
+    members = set(contents)
+    if member('PKG-INFO') not in members:
+        return None
+    for name in names:
+        if (name.lower().endswith(EXTENSION_SOURCE_SUFFIXES) or
+                op.basename(name) == 'Cargo.toml'):
+            return None
+
+    if interpreter is None:
+        python_tag = 'py%s' % sys.version_info[0]
+    else:
+        python_tag = 'py%s' % interpreter.split('-')[1][0]
+    normalize_name = False
+    if member('pyproject.toml') in members:
+        pyproject = read('pyproject.toml')
+        match = re.search(r'^\s*build-backend\s*=\s*["\']([^"\']+)["\']',
+                          pyproject, re.MULTILINE)
+        backend = match.group(1) if match else None
+        if 'ext-modules' in pyproject:
+            return None
+        if backend is not None and backend not in SETUPTOOLS_BUILD_BACKENDS:
+            if (backend not in PURE_BUILD_BACKENDS or
+                    _build_hooks_regex.search(pyproject) or
+                    member('build.py') in names):
+                return None
+            python_tag = 'py3'
+            normalize_name = True
+    if member('setup.py') in members:
+        setup_py = read('setup.py')
+        if any(marker in setup_py for marker in SETUP_PY_NON_PURE_MARKERS):
+            return None
+    if member('setup.cfg') in members:
+        config = configparser.RawConfigParser()
+        try:
+            config.read_string(read('setup.cfg'))
+        except configparser.Error:
+            return None
+        for section in ('bdist_wheel', 'wheel'):
+            if not config.has_section(section):
+                continue
+            options = dict((k.replace('-', '_'), v.strip().lower())
+                           for k, v in config.items(section))
+            if ('py_limited_api' in options or 'plat_name' in options or
+                    'build_number' in options):
+                return None
+            if options.get('universal') in ('1', 'true', 'yes'):
+                python_tag = 'py2.py3'
+            if 'python_tag' in options:
+                python_tag = options['python_tag']
+
+    from email.parser import HeaderParser
+    metadata = HeaderParser().parsestr(read('PKG-INFO'))
+    name, version = metadata['Name'], metadata['Version']
+    if not name or not version:
+        return None
+    return '%s-%s-%s-none-any.whl' % (
+        wheel_name_component(name, normalize_name),
+        wheel_version_component(version), python_tag)
+
+
+def wheel_name_component(name, normalize=False):
+    '''
+    Escape a distribution name for a wheel filename, like setuptools
+    bdist_wheel does, keeping its case and dots, or *normalize* it like
+    backends following the binary distribution format specification.
+    '''
+    if normalize:
+        return re.sub(r'[-_.]+', '_', name).lower()
+    return re.sub(r'[^A-Za-z0-9.]+', '_', name)
 
-    # Run setup.py wheel_name
-    with cd(extracted_package_dir):
-        output = run_setup_with_setuptools('wheel_name')
-    return output.splitlines()[-1]
+
+def wheel_name_variants(wheel_name):
+    '''
+    Return the names a wheel computed as *wheel_name* may have once built.
+
+    Builds run in isolated environments with the latest setuptools, which
+    normalizes project names like other backends, while older versions keep
+    their case and dots.
+    '''
+    name, rest = wheel_name.split('-', 1)
+    normalized = '%s-%s' % (wheel_name_component(name, True), rest)
+    if normalized == wheel_name:
+        return [wheel_name]
+    return [wheel_name, normalized]
+
+
+def wheel_version_component(version):
+    '''
+    Normalize and escape a version for a wheel filename, like setuptools
+    bdist_wheel does.
+    '''
+    return safe_version(version).replace('-', '_')
 
 
 def allnamesequal(name):
@@ -208,43 +658,206 @@ def commonprefix(paths, sep=None):
     return sep.join(x[0] for x in takewhile(allnamesequal, bydirectorylevels))
 
 
-def build_wheel(pip, source_archive):
+def build_wheel(pip, source_archive, log_path=None, wheel_dir=None,
+                build_dir=None, wheel_cache=None, digest=None):
     '''
     Build a wheel package from source_archive, in a temp directory.
 
-    Return the wheel package filename.
+    *pip* is a pip :class:`sh.Command` or the path to the pip executable. If
+    *log_path* is given, the output of the build commands is appended to it
+    instead of being captured. *wheel_dir* and *build_dir* default to new work
+    directories.
+
+    If *wheel_cache* is given, the wheel is taken from this
+    :class:`~freezerequirements.wheel_cache.WheelCache` when it has already
+    been built, and stored in it otherwise. *digest* is the sha256 digest of
+    *source_archive* if already known.
+
+    Return the wheel package filename, raise :class:`WheelBuildError` if no
+    wheel could be built.
+    '''
+    import sh
+    if isinstance(pip, str):
+        pip = sh.Command(pip)
+    if wheel_dir is None:
+        wheel_dir = create_work_dir()
+    if wheel_cache is not None:
+        if digest is None:
+            digest = file_sha256(source_archive)
+        wheel_path = wheel_cache.get(source_archive, wheel_dir, digest)
+        if wheel_path is not None:
+            return wheel_path
+        wheel_path = build_wheel(pip, source_archive, log_path, wheel_dir,
+                                 build_dir)
+        wheel_cache.put(source_archive, wheel_path, digest)
+        return wheel_path
+    log = open(log_path, 'ab') if log_path else None
+    output = {'_out': log, '_err': log} if log else {}
+
+    try:
+        # On newer versions of pip, we get a traceback when running "pip
+        # wheel" on unittest2, we need to ignore the error to trigger the
+        # workaround below.
+        try:
+            pip.wheel('--no-deps', source_archive, wheel_dir=wheel_dir,
+                      **output)
+        except sh.ErrorReturnCode:
+            pass
+
+        # "pip wheel" fails on unittest2 because they use a stupid custom
+        # class instead of a string for the version number in setup.py; pip
+        # does not set a non-zero return code in this case, the error is just
+        # printed and no wheel is built, so we have to check if the wheel dir
+        # is empty.
+        #
+        # The workaround is to run "setup.py sdist bdist_wheel", sdist
+        # converts the version to string somewhere in the process...
+        wheel_dir_content = os.listdir(wheel_dir)
+        if wheel_dir_content:
+            return op.join(wheel_dir, wheel_dir_content[0])
+
+        # Engage WTF mode
+        if build_dir is None:
+            build_dir = create_work_dir()
+        with Archive(source_archive) as archive:
+            source_dir = archive.extract_root(build_dir)
+        try:
+            run_setup_with_setuptools('sdist', 'bdist_wheel', _cwd=source_dir,
+                                      **output)
+        except sh.ErrorReturnCode:
+            raise WheelBuildError(source_archive, log_path)
+        dist_dir = op.join(source_dir, 'dist')
+        wheel_filename = glob.glob(op.join(dist_dir, '*.whl'))
+        if not wheel_filename:
+            raise WheelBuildError(source_archive, log_path)
+        return wheel_filename[0]
+    finally:
+        if log is not None:
+            log.close()
+
+
+def available_cpus():
+    '''
+    Return the number of CPUs the current process can run on.
+    '''
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        import multiprocessing
+        return multiprocessing.cpu_count()
+
+
+def timed_call(func, *args):
+    '''
+    Call ``func(*args)``, and return its result with a ``(start, end, pid)``
+    tuple: the timestamps of the call and the id of the process running it.
+
+    Exceptions raised by *func* get this tuple in a ``timing`` attribute.
+    '''
+    start = time.time()
+    try:
+        result = func(*args)
+    except Exception as exc:
+        exc.timing = (start, time.time(), os.getpid())
+        raise
+    return result, (start, time.time(), os.getpid())
+
+
+def build_wheels_pool(pip_bin, source_archives, jobs, logs_dir,
+                      wheel_cache=None, staging_dir=None, on_built=None,
+                      digests=None):
+    '''
+    Build wheels for *source_archives* on a pool of *jobs* processes.
+
+    Each build runs in its own work directories, and writes the output of its
+    build commands to ``<logs_dir>/<source archive filename>.log``. Wheels
+    already in *wheel_cache* are not rebuilt; they are looked up with the
+    sha256 digests of source archives found in the *digests* dict, or
+    computed by the builds otherwise. Wheels are written to work
+    directories in *staging_dir* if given. If *on_built* is given, it is
+    called with the source archive and the wheel path of each successful
+    build, as soon as it completes.
+
+    Return a ``(wheels, failures)`` tuple: *wheels* maps source archives to
+    the path of their wheel, *failures* maps the source archives that could
+    not be built to their log file. A failed build does not stop the others.
     '''
-    wheel_dir = create_work_dir()
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    wheels = {}
+    failures = {}
+    executor = ProcessPoolExecutor(max_workers=jobs)
+    try:
+        futures = {}
+        for source_archive in source_archives:
+            log_path = op.join(logs_dir, op.basename(source_archive) + '.log')
+            future = executor.submit(timed_call, build_wheel, pip_bin,
+                                     source_archive, log_path,
+                                     create_work_dir(staging_dir),
+                                     create_work_dir(), wheel_cache,
+                                     (digests or {}).get(source_archive))
+            futures[future] = (source_archive, log_path)
+        for future in as_completed(futures):
+            source_archive, log_path = futures[future]
+            try:
+                wheels[source_archive], timing = future.result()
+            except Exception as exc:
+                timing = getattr(exc, 'timing', None)
+                if not isinstance(exc, WheelBuildError):
+                    with open(log_path, 'a') as fp:
+                        fp.write('\n%s: %s\n' % (type(exc).__name__, exc))
+                failures[source_archive] = log_path
+                print(colored('fail', '  %s: build failed, see %s' %
+                              (op.basename(source_archive), log_path)),
+                      file=sys.stderr)
+            else:
+                print('  %s' % op.basename(wheels[source_archive]),
+                      file=sys.stderr)
+                if on_built is not None:
+                    on_built(source_archive, wheels[source_archive])
+            if timing is not None:
+                start, end, pid = timing
+                tracer.add('build_wheel', PACKAGE, start, end, pid,
+                           package=op.basename(source_archive))
+    finally:
+        executor.shutdown(wait=True)
+    return wheels, failures
+
+
+def parallel_map(func, items, jobs, cancel=None):
+    '''
+    Yield ``func(item)`` for each of *items*, in *items* order, running up to
+    *jobs* calls concurrently in threads.
 
-    # On newer versions of pip, we get a traceback when running "pip wheel" on
-    # unittest2, we need to ignore the error to trigger the workaround below.
+    If a call raises, calls that did not start yet are cancelled, *cancel* is
+    called to interrupt the running ones, and the exception is re-raised once
+    they all returned.
+    '''
+    items = list(items)
+    if jobs <= 1 or len(items) <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    executor = ThreadPoolExecutor(max_workers=jobs)
+    futures = dict((executor.submit(func, item), i)
+                   for i, item in enumerate(items))
+    results = {}
+    next_index = 0
     try:
-        pip.wheel('--no-deps', source_archive, wheel_dir=wheel_dir)
-    except sh.ErrorReturnCode:
-        pass
-
-    # "pip wheel" fails on unittest2 because they use a stupid custom class
-    # instead of a string for the version number in setup.py; pip does not set
-    # a non-zero return code in this case, the error is just printed and no
-    # wheel is built, so we have to check if the wheel dir is empty.
-    #
-    # The workaround is to run "setup.py sdist bdist_wheel", sdist converts the
-    # version to string somewhere in the process...
-    wheel_dir_content = os.listdir(wheel_dir)
-    if wheel_dir_content:
-        return op.join(wheel_dir, wheel_dir_content[0])
-
-    # Engage WTF mode
-    build_dir = create_work_dir()
-    archive = Archive(source_archive)
-    archive.extract_all(build_dir)
-    source_dir = commonprefix(
-        op.realpath(op.join(build_dir, p)) for p in archive.get_names())
-    with cd(source_dir):
-        run_setup_with_setuptools('sdist', 'bdist_wheel')
-    dist_dir = op.join(source_dir, 'dist')
-    wheel_filename = glob.glob(op.join(dist_dir, '*.whl'))
-    return wheel_filename[0]
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+            while next_index in results:
+                yield results.pop(next_index)
+                next_index += 1
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        if cancel is not None:
+            cancel()
+        raise
+    finally:
+        executor.shutdown(wait=True)
 
 
 def canonicalize_distro_name(name):
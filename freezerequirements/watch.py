@@ -0,0 +1,174 @@
+'''
+Watch files for changes, with inotify on Linux, or by polling their status
+elsewhere.
+'''
+import ctypes
+import ctypes.util
+import os
+import os.path as op
+import select
+import struct
+import time
+
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_CLOEXEC = 0o2000000
+# Editors either rewrite files in place, or replace them by renaming a
+# temporary file
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+              IN_DELETE)
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class InotifyWatcher(object):
+    '''
+    Watch *paths* with inotify. The directories containing the files are
+    watched, so files replaced by renames are still watched.
+
+    Raise :class:`OSError` if inotify is not available.
+    '''
+
+    def __init__(self, paths):
+        libc_name = ctypes.util.find_library('c')
+        if libc_name is None:
+            raise OSError('libc not found')
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError('inotify not available')
+        self.fd = self._libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.paths = set(op.abspath(p) for p in paths)
+        self._directories = {}
+        try:
+            for directory in sorted(set(op.dirname(p) for p in self.paths)):
+                wd = self._libc.inotify_add_watch(
+                    self.fd, os.fsencode(directory), WATCH_MASK)
+                if wd < 0:
+                    raise OSError(ctypes.get_errno(),
+                                  'inotify_add_watch failed: %s' % directory)
+                self._directories[wd] = directory
+        except Exception:
+            self.close()
+            raise
+
+    def wait(self, timeout=None):
+        '''
+        Wait up to *timeout* seconds (forever if None) for changes, and
+        return the set of watched paths that changed.
+        '''
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            if deadline is None:
+                remaining = None
+            else:
+                remaining = max(0, deadline - time.time())
+            readable, _, _ = select.select([self.fd], [], [], remaining)
+            if not readable:
+                return set()
+            # Other files of the watched directories may change too
+            changed = self._read_events()
+            if changed:
+                return changed
+
+    def _read_events(self):
+        data = os.read(self.fd, 64 * 1024)
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            directory = self._directories.get(wd)
+            if directory is None or not name:
+                continue
+            path = op.join(directory, os.fsdecode(name))
+            if path in self.paths:
+                changed.add(path)
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingWatcher(object):
+    '''
+    Watch *paths* by checking their status every *interval* seconds.
+    '''
+
+    def __init__(self, paths, interval=0.5):
+        self.paths = set(op.abspath(p) for p in paths)
+        self.interval = interval
+        self._status = self._stat_all()
+
+    def _stat_all(self):
+        status = {}
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                status[path] = None
+            else:
+                status[path] = (st.st_mtime_ns, st.st_size, st.st_ino)
+        return status
+
+    def wait(self, timeout=None):
+        '''
+        Wait up to *timeout* seconds (forever if None) for changes, and
+        return the set of watched paths that changed.
+        '''
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            status = self._stat_all()
+            changed = set(p for p in self.paths
+                          if status[p] != self._status[p])
+            self._status = status
+            if changed:
+                return changed
+            if deadline is None:
+                delay = self.interval
+            else:
+                delay = min(self.interval, deadline - time.time())
+                if delay <= 0:
+                    return changed
+            time.sleep(delay)
+
+    def close(self):
+        pass
+
+
+def open_watcher(paths, polling=False):
+    '''
+    Watch *paths* with inotify if available, by polling otherwise or if
+    *polling* is true.
+    '''
+    if not polling:
+        try:
+            return InotifyWatcher(paths)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(paths)
+
+
+def wait_for_changes(watcher, debounce=0.5):
+    '''
+    Wait for changes to the paths of *watcher*, until they stop changing for
+    *debounce* seconds, so bursts of writes (e.g. editors saving files, or
+    version control checkouts) are only reported once.
+
+    Return the set of paths that changed.
+    '''
+    changed = watcher.wait()
+    while True:
+        more = watcher.wait(debounce)
+        if not more:
+            return changed
+        changed.update(more)
@@ -0,0 +1,119 @@
+import os
+import os.path as op
+import shutil
+import tempfile
+
+from .utils import file_sha256, link_or_copy
+
+
+class WheelCache(object):
+    '''
+    A persistent store of built wheels, shared by all output directories.
+
+    Wheels are keyed by the sha256 digest of the source archive they were
+    built from and by the tag of the interpreter that built them, and stored
+    in ``<path>/<digest[:2]>/<digest>-<tag>/``. When the store grows over
+    *max_size* bytes, the least recently used wheels are evicted.
+    '''
+
+    def __init__(self, path, tag, max_size=None):
+        self.path = path
+        self.tag = tag
+        self.max_size = max_size
+
+    def entry_path(self, source_archive, digest=None):
+        '''
+        Get the directory holding the wheel built from *source_archive*, whose
+        sha256 *digest* is computed if not given.
+        '''
+        if digest is None:
+            digest = file_sha256(source_archive)
+        return op.join(self.path, digest[:2], '%s-%s' % (digest, self.tag))
+
+    def get(self, source_archive, dst_dir, digest=None):
+        '''
+        Place the wheel built from *source_archive* in *dst_dir*.
+
+        Return the path of the placed wheel, or None if it is not in the
+        cache.
+        '''
+        entry_path = self.entry_path(source_archive, digest)
+        try:
+            filenames = os.listdir(entry_path)
+        except OSError:
+            return None
+        for filename in filenames:
+            if filename.endswith('.whl'):
+                # Mark the entry as recently used
+                os.utime(entry_path, None)
+                wheel_path = op.join(dst_dir, filename)
+                link_or_copy(op.join(entry_path, filename), wheel_path)
+                return wheel_path
+        return None
+
+    def put(self, source_archive, wheel_path, digest=None):
+        '''
+        Store *wheel_path*, the wheel built from *source_archive*.
+
+        Entries are created atomically, so concurrent builds of the same
+        source archive on the same host are harmless.
+        '''
+        entry_path = self.entry_path(source_archive, digest)
+        parent_dir = op.dirname(entry_path)
+        if not op.exists(parent_dir):
+            try:
+                os.makedirs(parent_dir)
+            except OSError:
+                if not op.isdir(parent_dir):
+                    raise
+        temp_dir = tempfile.mkdtemp(prefix='.tmp-', dir=parent_dir)
+        try:
+            link_or_copy(wheel_path,
+                         op.join(temp_dir, op.basename(wheel_path)))
+            os.rename(temp_dir, entry_path)
+        except OSError:
+            # Already stored by someone else
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def entries(self):
+        '''
+        List ``(path, size, last_used)`` tuples for all the cache entries.
+        '''
+        ret = []
+        if not op.isdir(self.path):
+            return ret
+        for prefix in os.listdir(self.path):
+            prefix_dir = op.join(self.path, prefix)
+            if not op.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                if name.startswith('.'):
+                    continue
+                entry_path = op.join(prefix_dir, name)
+                try:
+                    last_used = os.stat(entry_path).st_mtime
+                    size = sum(op.getsize(op.join(entry_path, f))
+                               for f in os.listdir(entry_path))
+                except OSError:
+                    continue
+                ret.append((entry_path, size, last_used))
+        return ret
+
+    def evict(self):
+        '''
+        Remove the least recently used entries until the cache fits in
+        *max_size*.
+
+        Return the number of bytes freed.
+        '''
+        if self.max_size is None:
+            return 0
+        entries = self.entries()
+        total_size = sum(size for _, size, _ in entries)
+        freed = 0
+        for entry_path, size, _ in sorted(entries, key=lambda e: e[2]):
+            if total_size - freed <= self.max_size:
+                break
+            shutil.rmtree(entry_path, ignore_errors=True)
+            freed += size
+        return freed
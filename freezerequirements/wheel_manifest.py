@@ -0,0 +1,152 @@
+import json
+import os
+import os.path as op
+import tempfile
+
+from .filenames import parse_package_filename
+from .utils import file_sha256, get_wheel_name, wheel_name_variants
+
+
+MANIFEST_FILENAME = '.freeze-requirements-wheels.json'
+
+
+class WheelManifest(object):
+    '''
+    The wheels built for the source packages of an output directory, stored
+    in a JSON file at the root of *output_dir*.
+
+    Wheels are keyed by the filename and sha256 digest of the source package
+    they were built from, and by the tag of the interpreter that built them,
+    so checking if a wheel was already built doesn't require extracting its
+    source package.
+    '''
+
+    def __init__(self, output_dir, tag):
+        self.output_dir = output_dir
+        self.tag = tag
+        self.path = op.join(output_dir, MANIFEST_FILENAME)
+        self.entries = self._load()
+        # Entries changed since the manifest was loaded, None for removed
+        # entries
+        self._changes = {}
+
+    def _load(self):
+        try:
+            with open(self.path) as fp:
+                data = json.load(fp)
+        except (IOError, OSError, ValueError):
+            return {}
+        return dict(((e['sdist'], e['sha256'], e['tag']), e['wheel'])
+                    for e in data.get('wheels', ()))
+
+    def package_file(self, sdist_filename, filename):
+        '''
+        Get the path of *filename* in the output directory of the package of
+        *sdist_filename*.
+        '''
+        distro = parse_package_filename(sdist_filename)
+        return op.join(self.output_dir, distro.canonical_name, filename)
+
+    def get(self, sdist_filename, digest):
+        '''
+        Get the path of the wheel built for this interpreter from the source
+        package *sdist_filename* having *digest*, or None if it is not in
+        the manifest or missing from the output directory.
+        '''
+        wheel_filename = self.entries.get((sdist_filename, digest, self.tag))
+        if wheel_filename is None:
+            return None
+        path = self.package_file(sdist_filename, wheel_filename)
+        return path if op.exists(path) else None
+
+    def set(self, sdist_filename, digest, wheel_filename):
+        '''
+        Record *wheel_filename*, built for this interpreter from the source
+        package *sdist_filename* having *digest*.
+        '''
+        key = (sdist_filename, digest, self.tag)
+        self.entries[key] = wheel_filename
+        self._changes[key] = wheel_filename
+
+    def remove(self, key):
+        del self.entries[key]
+        self._changes[key] = None
+
+    def save(self):
+        '''
+        Write the changes made since the manifest was loaded, keeping the
+        entries written meanwhile by other processes. The manifest is
+        replaced atomically.
+        '''
+        if not self._changes:
+            return
+        entries = self._load()
+        for key, wheel_filename in self._changes.items():
+            if wheel_filename is None:
+                entries.pop(key, None)
+            else:
+                entries[key] = wheel_filename
+        data = {'wheels': [
+            {'sdist': sdist, 'sha256': digest, 'tag': tag, 'wheel': wheel}
+            for (sdist, digest, tag), wheel in sorted(entries.items())
+        ]}
+        fd, temp_path = tempfile.mkstemp(prefix='.tmp-', dir=self.output_dir)
+        try:
+            with os.fdopen(fd, 'w') as fp:
+                json.dump(data, fp, indent=2, sort_keys=True)
+                fp.write('\n')
+            os.replace(temp_path, self.path)
+        except Exception:
+            os.unlink(temp_path)
+            raise
+        self.entries = entries
+        self._changes = {}
+
+    def verify(self):
+        '''
+        Resync the manifest with the contents of the output directory: remove
+        the entries whose wheel is missing or whose source package changed,
+        and add entries for the source packages having their wheel next to
+        them.
+
+        Return the numbers of removed and added entries.
+        '''
+        removed = 0
+        added = 0
+        for key, wheel_filename in list(self.entries.items()):
+            sdist_filename, digest, _ = key
+            sdist_path = self.package_file(sdist_filename, sdist_filename)
+            wheel_path = self.package_file(sdist_filename, wheel_filename)
+            if (not op.exists(wheel_path) or
+                    (op.exists(sdist_path) and
+                     file_sha256(sdist_path) != digest)):
+                self.remove(key)
+                removed += 1
+        known = set((sdist, digest) for sdist, digest, tag in self.entries
+                    if tag == self.tag)
+        for name in sorted(os.listdir(self.output_dir)):
+            package_dir = op.join(self.output_dir, name)
+            if name.startswith('.') or not op.isdir(package_dir):
+                continue
+            filenames = set(os.listdir(package_dir))
+            for filename in sorted(filenames):
+                try:
+                    distro = parse_package_filename(filename)
+                except ValueError:
+                    continue
+                if distro.kind != 'sdist':
+                    continue
+                sdist_path = op.join(package_dir, filename)
+                digest = file_sha256(sdist_path)
+                if (filename, digest) in known:
+                    continue
+                try:
+                    wheel_filename = get_wheel_name(sdist_path, self.tag)
+                except Exception:
+                    continue
+                for wheel_filename in wheel_name_variants(wheel_filename):
+                    if wheel_filename in filenames:
+                        self.set(filename, digest, wheel_filename)
+                        added += 1
+                        break
+        return removed, added
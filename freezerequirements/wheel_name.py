@@ -2,7 +2,11 @@
 Setuptools extension used to retrieve wheel package name for a distribution.
 '''
 from distutils.core import Command
-from wheel.bdist_wheel import bdist_wheel
+
+try:
+    from setuptools.command.bdist_wheel import bdist_wheel
+except ImportError:
+    from wheel.bdist_wheel import bdist_wheel
 
 
 class wheel_name(Command):
@@ -19,11 +23,18 @@ class wheel_name(Command):
     def run(self):
         # Workaround a very WTF bug if version defined in setup.py is not a
         # string (seen in unittest2)
-        if not isinstance(self.distribution.metadata.version, basestring):
+        if not isinstance(self.distribution.metadata.version,
+                          str):
             self.distribution.metadata.version = \
                 str(self.distribution.metadata.version)
 
         bdist_wheel_obj = bdist_wheel(self.distribution)
         bdist_wheel_obj.ensure_finalized()
-        archive_basename = bdist_wheel_obj.get_archive_basename()
-        print archive_basename + '.whl'
+        if hasattr(bdist_wheel_obj, 'get_archive_basename'):
+            archive_basename = bdist_wheel_obj.get_archive_basename()
+        else:
+            archive_basename = '-'.join(
+                [bdist_wheel_obj.wheel_dist_name] +
+                list(bdist_wheel_obj.get_tag())
+            )
+        print(archive_basename + '.whl')
@@ -11,8 +11,8 @@ version = '0.5.3'
 
 install_requires = [
     'click',
+    'packaging',
     'sh',
-    'six',
 ]
 
 
@@ -27,6 +27,8 @@ setup(
         'Intended Audience :: Developers',
         'Topic :: Software Development :: Build Tools',
         'Topic :: System :: Software Distribution',
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
     ],
     keywords='pip requirements frozen',
     author='Luper Rouch',
@@ -36,6 +38,7 @@ setup(
     packages=find_packages(),
     include_package_data=True,
     zip_safe=False,
+    python_requires='>=3.7',
     install_requires=install_requires,
     entry_points={
         'console_scripts': [